@@ -0,0 +1,129 @@
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict
+import asyncio
+import statistics
+import time
+
+from config import config
+
+class AdmissionRejected(Exception):
+    """The request should be answered without the LLM"""
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+class AdmissionController:
+    """
+    Bounded concurrency for LLM calls with per-client fair queuing.
+
+    At most max_concurrent calls run at once. Waiting requests are queued per
+    client and freed slots go round-robin across clients, so one client's
+    burst cannot starve the others. A request is rejected right away when
+    the queue (or its client's share of it) is full, and after max_wait
+    seconds in the queue, so the caller can answer locally instead.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = config.CHAT_LLM_CONCURRENCY,
+        max_queue: int = config.CHAT_QUEUE_SIZE,
+        max_queue_per_client: int = config.CHAT_QUEUE_PER_CLIENT,
+        max_wait: float = config.CHAT_QUEUE_WAIT_SECONDS
+    ):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_queue_per_client = max_queue_per_client
+        self.max_wait = max_wait
+
+        self.running = 0
+        self._waiting: "OrderedDict[str, Deque[asyncio.Future]]" = OrderedDict()  # Client -> waiters, in turn order
+        self._queued = 0
+        self._waits: Deque[float] = deque(maxlen=512)  # Recent queue times of admitted requests (ms)
+        self.counters = {"admitted": 0, "rejected_queue_full": 0, "rejected_client_full": 0, "rejected_timeout": 0}
+
+    @asynccontextmanager
+    async def slot(self, client_id: str):
+        await self.acquire(client_id)
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def acquire(self, client_id: str):
+        """Wait for a slot; raises AdmissionRejected instead of waiting too long"""
+        if self.running < self.max_concurrent and self._queued == 0:
+            self.running += 1
+            self._admitted(0.0)
+            return
+
+        if self._queued >= self.max_queue:
+            self.counters["rejected_queue_full"] += 1
+            raise AdmissionRejected("queue full")
+        waiters = self._waiting.get(client_id)
+        if waiters is not None and len(waiters) >= self.max_queue_per_client:
+            self.counters["rejected_client_full"] += 1
+            raise AdmissionRejected("too many queued requests from this client")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiting.setdefault(client_id, deque()).append(waiter)
+        self._queued += 1
+        started = time.perf_counter()
+
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout=self.max_wait)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # Granted just as the wait ended: hand the slot on
+                self.release()
+            else:
+                waiter.cancel()
+                self._remove(client_id, waiter)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self.counters["rejected_timeout"] += 1
+            raise AdmissionRejected(f"waited over {self.max_wait:g}s in queue")
+
+        self._admitted((time.perf_counter() - started) * 1000)
+
+    def release(self):
+        """Free a slot, handing it to the next client in turn"""
+        while self._waiting:
+            client_id, waiters = next(iter(self._waiting.items()))
+            waiter = waiters.popleft()
+            self._queued -= 1
+            if waiters:
+                self._waiting.move_to_end(client_id)
+            else:
+                del self._waiting[client_id]
+            if not waiter.done():
+                waiter.set_result(True)  # The slot passes over, running is unchanged
+                return
+        self.running -= 1
+
+    def _remove(self, client_id: str, waiter: asyncio.Future):
+        waiters = self._waiting.get(client_id)
+        if waiters is None or waiter not in waiters:
+            return
+        waiters.remove(waiter)
+        self._queued -= 1
+        if not waiters:
+            del self._waiting[client_id]
+
+    def _admitted(self, waited_ms: float):
+        self.counters["admitted"] += 1
+        self._waits.append(waited_ms)
+
+    def stats(self) -> Dict:
+        waits = sorted(self._waits)
+        return {
+            "running": self.running,
+            "max_concurrent": self.max_concurrent,
+            "queued": self._queued,
+            "queued_by_client": {client: len(w) for client, w in self._waiting.items()},
+            "wait_ms_p50": round(statistics.median(waits), 1) if waits else 0.0,
+            "wait_ms_p95": round(waits[int(len(waits) * 0.95) - 1], 1) if waits else 0.0,
+            "wait_ms_max": round(waits[-1], 1) if waits else 0.0,
+            **self.counters
+        }
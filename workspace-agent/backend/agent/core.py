@@ -1,5 +1,7 @@
+from contextlib import nullcontext
 from datetime import datetime, date
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
+import asyncio
 import json
 import re
 
@@ -7,10 +9,28 @@ from connectors.gmail_connector import GmailConnector
 from connectors.classroom_connector import ClassroomConnector
 from connectors.calendar_connector import CalendarConnector
 from reasoning.gemini_client import GeminiClient
+from reasoning.urgency_scorer import UrgencyScorer, URGENT_THRESHOLD, IMPORTANT_THRESHOLD
+from reasoning.context_builder import ContextBuilder
+from reasoning.summary_hierarchy import SummaryHierarchy
 from memory.db_manager import DatabaseManager
+from memory.retriever import (
+    VectorRetriever, email_document, assignment_document, eod_report_document, chat_document, chat_ref
+)
+from config import config
 from agent.prompts import PromptTemplates
+from agent.sessions import SessionManager, UserSession
+from agent.jobs import JobManager, JobProgress
+from agent.events import EventBroker
+from agent.admission import AdmissionController, AdmissionRejected
+from agent.views import build_dashboard_payload, build_report_payload, calculate_days_until, assignment_due_epoch, normalize_due_dates
 from utils.logger import logger
 
+# Stages of autonomous_observation_cycle, as reported on its jobs
+CYCLE_STAGES = ("observe", "reason", "store", "report")
+
+# Questions answered with SQL counts instead of listing items
+COUNT_PHRASES = ("how many", "number of", "count of")
+
 class WorkspaceAgent:
     """The core autonomous agent"""
     
@@ -20,26 +40,83 @@ class WorkspaceAgent:
         classroom: ClassroomConnector,
         calendar: CalendarConnector,
         gemini: GeminiClient,
-        db: DatabaseManager
-        
-        
+        db: DatabaseManager,
+        sessions: Optional[SessionManager] = None,
+        retriever: Optional[VectorRetriever] = None
     ):
-        self.session_memory = {
-            "last_emails": [],
-            "last_meetings": [],
-            "last_assignments": []
-        }
+        # Workspace connectors, used by the autonomous cycle
         self.gmail = gmail
         self.classroom = classroom
         self.calendar = calendar
         self.gemini = gemini
         self.db = db
         self.prompts = PromptTemplates()
-        self._last_context = None  # Track last mentioned context for follow-ups
+        self.scorer = UrgencyScorer()
+        # Per-user conversation state (session memory, last context)
+        self.sessions = sessions or SessionManager()
+        self._summary_tasks: Dict[str, asyncio.Task] = {}  # Conversation summary refresh per user
+        # Similarity search over older reports, emails, assignments and chat turns
+        self.retriever = retriever
+        # Weekly and monthly digests of EOD reports for the report prompt
+        self.summaries = SummaryHierarchy(db, gemini, self.prompts)
+        self.context_builder = ContextBuilder(db, retriever, self.summaries)
+        # Long-running work triggered over HTTP, polled by job id
+        self.jobs = JobManager(db)
+        # Pushes snapshot and report changes to connected dashboards
+        self.events = EventBroker()
+        # Bounds concurrent Gemini chat calls, fair across users
+        self.chat_admission = AdmissionController()
         logger.success("Agent initialized successfully")
 
-    async def handle_email_query(self, query: str, snapshot: Dict) -> str:
+    def get_session(self, user_id: Optional[str] = None) -> UserSession:
+        """Get (or create) the conversation session for a user"""
+        return self.sessions.get(user_id)
+
+    async def close(self):
+        """Stop background work before the database goes away: jobs, summary refreshes and event streams"""
+        await self.jobs.close()
+        tasks = list(self._summary_tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._summary_tasks = {}
+        self.events.close()
+
+    async def index_history(self):
+        """Fill an empty retrieval index from the database"""
+        if self.retriever is None or len(self.retriever) > 0:
+            return
+        sources = await self.db.load_index_sources()
+        documents = (
+            [eod_report_document(r['date'], r['content']) for r in sources['eod_reports']]
+            + [email_document(e) for e in sources['emails']]
+            + [assignment_document(a) for a in sources['assignments']]
+            + [chat_document(chat_ref(c['user_id'], c['timestamp']), c['timestamp'], c['user'], c['agent']) for c in sources['chat']]
+        )
+        added = await asyncio.to_thread(self.retriever.add_many, documents)
+        logger.info(f"Retrieval index built ({added} documents)")
+
+    async def backfill_report_views(self):
+        """Render the read model of reports stored before it existed"""
+        reports = await self.db.get_reports_missing_views()
+        for r in reports:
+            await self.db.store_report_view(r['date'], build_report_payload(r['date'].isoformat(), r['content'], r['insights']))
+        if reports:
+            logger.info(f"Rendered {len(reports)} EOD report views")
+
+    async def _index_documents(self, documents: List[Dict]):
+        if self.retriever is None:
+            return
+        try:
+            # Embedding, msync and the metadata append stay off the event loop
+            await asyncio.to_thread(self.retriever.add_many, documents)
+        except Exception as e:
+            logger.warning(f"Retrieval indexing failed: {e}")
+
+
+    async def handle_email_query(self, query: str, snapshot: Dict, session: Optional[UserSession] = None) -> str:
         """Handle email-specific queries"""
+        session = session or self.get_session()
         if not snapshot:
             return "📧 **No email data available.**\n\nTry generating a report first to collect your emails."
         
@@ -52,7 +129,7 @@ class WorkspaceAgent:
         query_lower = query.lower()
         
         # Store emails in session memory
-        self.session_memory["last_emails"] = emails
+        session.session_memory["last_emails"] = emails
         
         # Check for LinkedIn specific queries
         if 'linkedin' in query_lower or 'linked' in query_lower:
@@ -72,18 +149,19 @@ class WorkspaceAgent:
                                 for uw in ['urgent', 'important', 'asap'])]
             if urgent_emails:
                 return self._format_email_list(urgent_emails, detailed=True)
-            return f"📧 **All {len(emails)} emails shown.**\n\n" + self._format_email_list(emails[:5], detailed=True)
+            return f"📧 **All {len(emails)} emails shown.**\n\n" + self._view(snapshot, 'email_list')
         
         # Check for "latest" or "last" queries
         if any(word in query_lower for word in ['latest', 'last', 'recent', 'newest']):
             return self._format_email_details(emails[0])
         
         # Default: show email list
-        return self._format_email_list(emails[:5], detailed=True)
+        return self._view(snapshot, 'email_list')
 
 
-    async def handle_meeting_query(self, query: str, snapshot: Dict) -> str:
+    async def handle_meeting_query(self, query: str, snapshot: Dict, session: Optional[UserSession] = None) -> str:
         """Handle meeting/calendar-specific queries"""
+        session = session or self.get_session()
         if not snapshot:
             return "📅 **No calendar data available.**\n\nTry generating a report first to sync your calendar."
         
@@ -96,7 +174,7 @@ class WorkspaceAgent:
         query_lower = query.lower()
         
         # Store meetings in session memory
-        self.session_memory["last_meetings"] = meetings
+        session.session_memory["last_meetings"] = meetings
         
         # Check for specific meeting details
         if any(word in query_lower for word in ['detail', 'about', 'info', 'tell me']):
@@ -111,11 +189,12 @@ class WorkspaceAgent:
             return self._format_meeting_details(meetings[0])
         
         # Default: show meeting list
-        return self._format_meeting_list(meetings)
+        return self._view(snapshot, 'meeting_list')
 
 
-    async def handle_assignment_query(self, query: str, snapshot: Dict) -> str:
+    async def handle_assignment_query(self, query: str, snapshot: Dict, session: Optional[UserSession] = None) -> str:
         """Handle assignment/classroom-specific queries"""
+        session = session or self.get_session()
         if not snapshot:
             return "📚 **No assignment data available.**\n\nTry generating a report first to sync your classroom."
         
@@ -128,30 +207,25 @@ class WorkspaceAgent:
         query_lower = query.lower()
         
         # Store assignments in session memory
-        self.session_memory["last_assignments"] = assignments
+        session.session_memory["last_assignments"] = assignments
         
         # Check for GCR/classroom queries
         if any(word in query_lower for word in ['gcr', 'classroom', 'joined', 'classes']):
-            # Get unique courses
-            courses = list(set([a.get('course', 'Unknown') for a in assignments]))
-            if courses:
-                response = f"📚 **Your Google Classrooms ({len(courses)}):**\n\n"
-                for i, course in enumerate(courses, 1):
-                    course_assignments = [a for a in assignments if a.get('course') == course]
-                    response += f"{i}. **{course}**\n"
-                    response += f"   📝 {len(course_assignments)} assignment(s)\n\n"
-                return response
-            return "📚 **No classrooms found.**"
+            return self._view(snapshot, 'classroom_list')
         
-        # Check for urgency/due date queries
+        # Due-soon lists come from the indexed snapshot_assignments rows, soonest first
         if any(word in query_lower for word in ['urgent', 'soon', 'today', 'tomorrow']):
-            # Sort by due date
-            urgent_assignments = [a for a in assignments 
-                                if self._calculate_days_until(a.get('due', '')) <= 2]
+            urgent_assignments = await self.db.get_assignments_due_within(2, include_overdue=True)
             if urgent_assignments:
                 return self._format_assignment_list(urgent_assignments)
             return "📚 **No urgent assignments.**\n\nNothing due in the next 2 days."
         
+        if 'week' in query_lower:
+            week_assignments = await self.db.get_assignments_due_within(7)
+            if week_assignments:
+                return self._format_assignment_list(week_assignments)
+            return "📚 **Nothing due this week.**\n\nNo assignments due in the next 7 days."
+        
         # Check for specific course
         if any(word in query_lower for word in ['course', 'class', 'subject']):
             # Try to extract course name from query
@@ -160,18 +234,52 @@ class WorkspaceAgent:
                 if course and course in query_lower:
                     course_assignments = [a for a in assignments if a.get('course') == assignment.get('course')]
                     return self._format_assignment_list(course_assignments)
-            return self._format_assignment_list(assignments)
+            return self._view(snapshot, 'assignment_list')
         
         # Default: show all assignments
-        return self._format_assignment_list(assignments)
-    async def autonomous_observation_cycle(self):
+        return self._view(snapshot, 'assignment_list')
+    async def handle_count_query(self, query: str) -> str:
+        """How-many questions, counted in SQL over today's snapshot rows"""
+        counts = await self.db.get_snapshot_counts(date.today())
+        query_lower = query.lower()
+        
+        if any(word in query_lower for word in ['email', 'mail', 'inbox', 'unread']):
+            return f"📧 You have **{counts['emails']} emails** today, **{counts['unread_emails']}** of them unread."
+        if any(word in query_lower for word in ['assignment', 'homework', 'due']):
+            due_soon = await self.db.get_assignments_due_within(7)
+            return f"📚 You have **{counts['assignments']} assignments**, **{len(due_soon)}** due in the next 7 days."
+        if any(word in query_lower for word in ['meeting', 'calendar', 'event']):
+            return f"📅 You have **{counts['meetings']} meetings** today."
+        return (
+            f"I have **{counts['emails']} emails** ({counts['unread_emails']} unread), "
+            f"**{counts['assignments']} assignments**, and **{counts['meetings']} meetings** for today."
+        )
+
+    async def submit_observation_cycle(self) -> Tuple[Dict, bool]:
+        """Run the cycle as a background job, or join the one already running"""
+        async def run(progress: JobProgress) -> Dict:
+            report = await self.autonomous_observation_cycle(progress)
+            return {"report_available": report is not None}
+        
+        return await self.jobs.submit(
+            "observation_cycle",
+            run,
+            dedup_key="observation_cycle",
+            stages=list(CYCLE_STAGES)
+        )
+    
+    async def autonomous_observation_cycle(self, progress: Optional[JobProgress] = None):
         """Main autonomous loop - runs daily"""
         logger.header("🤖 AUTONOMOUS OBSERVATION CYCLE")
         
+        def stage(name: str):
+            return progress.stage(name) if progress else nullcontext()
+        
         try:
             # STEP 1: OBSERVE
             logger.section("Observing Workspace")
-            observations = await self._observe_workspace()
+            async with stage("observe"):
+                observations = await self._observe_workspace()
             
             # Check if we got ANY data
             total_items = (
@@ -186,15 +294,18 @@ class WorkspaceAgent:
             
             # STEP 2: REASON
             logger.section("Reasoning Over Data")
-            insights = await self._reason_over_observations(observations)
+            async with stage("reason"):
+                insights = await self._reason_over_observations(observations)
             
             # STEP 3: STORE
             logger.section("Storing to Memory")
-            await self._store_observations_and_insights(observations, insights)
+            async with stage("store"):
+                await self._store_observations_and_insights(observations, insights)
             
             # STEP 4: GENERATE REPORT
             logger.section("Generating EOD Report")
-            eod_report = await self._generate_eod_report(insights)
+            async with stage("report"):
+                eod_report = await self._generate_eod_report(insights)
             
             logger.header("✅ CYCLE COMPLETE!")
             return eod_report
@@ -220,6 +331,7 @@ class WorkspaceAgent:
             observations["emails"] = [e.to_dict() for e in emails]
             logger.data("Emails", len(emails))
         except Exception as e:
+            emails = []
             logger.error(f"Gmail error: {e}")
         
         # Fetch assignments
@@ -228,6 +340,7 @@ class WorkspaceAgent:
             observations["assignments"] = [a.to_dict() for a in assignments]
             logger.data("Assignments", len(assignments))
         except Exception as e:
+            assignments = []
             logger.warning(f"Classroom error (OK if not using): {e}")
         
         # Fetch meetings
@@ -238,12 +351,28 @@ class WorkspaceAgent:
         except Exception as e:
             logger.warning(f"Calendar error: {e}")
         
+        # Write-through to the indexed caches used for historical lookups
+        email_rows = [e.to_cache_row() for e in emails]
+        assignment_rows = [a.to_cache_row() for a in assignments]
+        try:
+            await self.db.upsert_email_cache(email_rows)
+            await self.db.upsert_assignment_cache(assignment_rows)
+        except Exception as e:
+            logger.warning(f"Cache write-through failed: {e}")
+        await self._index_documents(
+            [email_document(r) for r in email_rows] + [assignment_document(r) for r in assignment_rows]
+        )
+        
         return observations
     
     async def _reason_over_observations(self, observations: Dict) -> Dict:
         """Send to Gemini for analysis"""
+        # Score everything locally first so Gemini only sees the most urgent items
+        self.scorer.annotate(observations)
+        top = self.scorer.top_observations(observations, config.PROMPT_MAX_ITEMS)
+        
         system_prompt = self.prompts.get_system_prompt()
-        prompt = self.prompts.urgency_analysis_prompt(observations)
+        prompt = self.prompts.urgency_analysis_prompt(top)
         
         # Try to get analysis from Gemini
         analysis = await self.gemini.generate_with_json(prompt)
@@ -266,64 +395,109 @@ class WorkspaceAgent:
         return insights
     
     def _create_fallback_analysis(self, observations: Dict) -> Dict:
-        """Create simple analysis when Gemini is unavailable"""
+        """Create rule-based analysis from urgency scores when Gemini is unavailable"""
         emails = observations.get('emails', [])
         assignments = observations.get('assignments', [])
         meetings = observations.get('meetings', [])
         
-        # Simple urgency detection
         urgent = []
         important = []
+        low_priority = []
+        risks = []
         
-        # Mark unread emails as important
-        for email in emails[:3]:
-            if email.get('is_unread'):
-                important.append({
-                    "type": "email",
-                    "title": email.get('subject', 'Email'),
-                    "reason": f"From {email.get('sender', 'unknown')}"
-                })
-        
-        # Mark assignments by due date
-        for assignment in assignments:
-            urgent.append({
-                "type": "assignment",
-                "title": assignment.get('title', 'Assignment'),
-                "reason": f"Due {assignment.get('due', 'soon')}",
-                "action": f"Complete for {assignment.get('course', 'course')}"
-            })
-        
-        # Mark today's meetings
-        for meeting in meetings:
-            important.append({
-                "type": "meeting",
-                "title": meeting.get('title', 'Meeting'),
-                "reason": f"Scheduled for {meeting.get('start', 'today')}"
-            })
+        for entry in self.scorer.rank(observations):
+            item_type, item, score = entry['type'], entry['item'], entry['score']
+            
+            if item_type == "email":
+                title = item.get('subject', 'Email')
+                reason = f"From {item.get('sender', 'unknown')}"
+                action = "Read and reply if needed"
+            elif item_type == "assignment":
+                title = item.get('title', 'Assignment')
+                reason = f"Due {item.get('due', 'soon')}"
+                action = f"Complete for {item.get('course', 'course')}"
+                days = calculate_days_until(assignment_due_epoch(item))
+                if 0 <= days < 1:
+                    risks.append({
+                        "issue": f"{title} is due within 24 hours",
+                        "recommendation": "Finish and submit it today"
+                    })
+            else:
+                title = item.get('title', 'Meeting')
+                reason = f"Scheduled for {item.get('start', 'today')}"
+                action = "Prepare for the meeting"
+            
+            if score >= URGENT_THRESHOLD:
+                urgent.append({"type": item_type, "title": title, "reason": reason, "action": action})
+            elif score >= IMPORTANT_THRESHOLD:
+                important.append({"type": item_type, "title": title, "reason": reason})
+            else:
+                low_priority.append({"type": item_type, "title": title})
         
         return {
             "urgent": urgent,
             "important": important,
-            "low_priority": [],
-            "risks": [],
+            "low_priority": low_priority,
+            "risks": risks,
             "one_sentence_summary": f"You have {len(emails)} emails, {len(assignments)} assignments, and {len(meetings)} meetings today."
         }
     
     async def _store_observations_and_insights(self, observations: Dict, insights: Dict):
-        """Store in database"""
-        await self.db.store_daily_snapshot({
-            "date": date.today(),
+        """Store in database, together with the views rendered from this snapshot"""
+        today = date.today()
+        normalize_due_dates(observations)
+        version = await self.db.store_daily_snapshot({
+            "date": today,
             "observations": observations,
-            "insights": insights
+            "insights": insights,
+            "views": self._render_views(today.isoformat(), observations, insights)
         })
-        logger.success("Data stored in memory")
+        logger.success(f"Data stored in memory (snapshot v{version})")
+        self.events.publish("snapshot", {"date": today.isoformat(), "version": version})
+    
+    def _render_views(self, snapshot_date: str, observations: Dict, insights: Dict) -> Dict:
+        """Render list-style chat answers and the dashboard payload once per snapshot"""
+        emails = observations.get('emails', [])
+        assignments = observations.get('assignments', [])
+        meetings = observations.get('meetings', [])
+        
+        return {
+            "email_list": self._format_email_list(emails[:5], detailed=True),
+            "email_list_brief": self._format_email_list(emails[:5]),
+            "meeting_list": self._format_meeting_list(meetings),
+            "assignment_list": self._format_assignment_list(assignments),
+            "classroom_list": self._format_classroom_list(assignments),
+            "summary": self._format_summary(emails, assignments, meetings),
+            "dashboard": build_dashboard_payload(snapshot_date, observations, insights)
+        }
+    
+    def _view(self, snapshot: Dict, name: str) -> str:
+        """Get a pre-rendered view, rendering it on the fly for snapshots stored without views"""
+        views = snapshot.get('views') or {}
+        if name in views:
+            return views[name]
+        
+        views = self._render_views(
+            snapshot.get('date', ''),
+            snapshot.get('observations', {}),
+            snapshot.get('insights', {})
+        )
+        if snapshot:
+            snapshot['views'] = views
+        return views[name]
     
     async def _generate_eod_report(self, insights: Dict) -> str:
         """Generate End-of-Day summary"""
-        past_summaries = await self.db.get_recent_summaries(days=7)
+        report_context = await self.context_builder.build_report_context(insights)
         
         system_prompt = self.prompts.get_system_prompt()
-        prompt = self.prompts.eod_summary_prompt(insights, past_summaries)
+        sections = report_context['sections']
+        prompt = self.prompts.eod_summary_prompt(
+            insights,
+            sections.get('past_reports', []),
+            sections.get('weekly_digests', []),
+            sections.get('monthly_digests', [])
+        )
         
         report = await self.gemini.generate(prompt, system_prompt)
         
@@ -334,8 +508,11 @@ class WorkspaceAgent:
         
         await self.db.store_eod_report({
             "date": date.today(),
-            "content": report
+            "content": report,
+            "view": build_report_payload(date.today().isoformat(), report, insights)
         })
+        await self._index_documents([eod_report_document(date.today().isoformat(), report)])
+        self.events.publish("report", {"date": date.today().isoformat()})
         
         logger.success("EOD report generated")
         return report
@@ -366,43 +543,74 @@ class WorkspaceAgent:
         report += "\n\n✅ All systems operational. Data collection successful."
         
         return report
-    def _resolve_using_session_memory(self, query: str) -> Optional[str]:
+    def _resolve_using_session_memory(self, query: str, session: UserSession) -> Optional[str]:
         """Resolve follow-up using structured memory"""
         
         query_lower = query.lower()
         
         # Meeting follow-ups
         if any(word in query_lower for word in ["meeting", "that", "it", "event"]):
-            meetings = self.session_memory.get("last_meetings", [])
+            meetings = session.session_memory.get("last_meetings", [])
             if meetings:
                 return self._format_meeting_details(meetings[0])
         
         # Email follow-ups
         if any(word in query_lower for word in ["email", "mail", "those", "them"]):
-            emails = self.session_memory.get("last_emails", [])
+            emails = session.session_memory.get("last_emails", [])
             if emails:
                 return self._format_email_list(emails[:5], detailed=True)
         
         # Assignment follow-ups
         if any(word in query_lower for word in ["assignment", "homework", "due"]):
-            assignments = self.session_memory.get("last_assignments", [])
+            assignments = session.session_memory.get("last_assignments", [])
             if assignments:
                 return self._format_assignment_list(assignments)
         
         return None
 
-    async def chat(self, user_query: str) -> str:
+    async def chat(self, user_query: str, session: Optional[UserSession] = None) -> str:
         """INTELLIGENT CHAT WITH CONTEXT AND ENTITY RESOLUTION"""
+        session = session or self.get_session()
         logger.info(f'User asked: "{user_query}"')
 
-        # Get full context
-        today_snapshot = await self.db.get_snapshot_by_date(date.today())
-        past_summaries = await self.db.get_recent_summaries(days=3)
-        chat_history = await self.db.get_recent_chat_history(limit=10)
+        # Get full context in parallel: older turns come from the rolling summary
+        sources = await self.context_builder.gather_chat_sources(user_query, session.user_id)
+        today_snapshot = sources['today_snapshot']
+        chat_history = sources['chat_history']
+        recent_questions = sources['recent_questions']
 
         # ⭐ ADD REPETITION DETECTION HERE
-        if chat_history:
-            last_5_questions = [h.get('user', '').lower() for h in chat_history[-5:]]
+        response = self._repetition_response(user_query, recent_questions)
+        if response:
+            await self._store_chat_turn(user_query, response, session, index=False)
+            return response
+
+        response, intent, entities = self._answer_deterministic(user_query, sources, session)
+
+        # Everything else goes to Gemini with a token-budgeted context
+        if not response:
+            try:
+                async with self.chat_admission.slot(session.user_id):
+                    prompt = self.prompts.chat_prompt({
+                        "user_query": user_query,
+                        "context": self.context_builder.build_chat_context(user_query, sources)
+                    })
+                    response = await self.gemini.generate(prompt, self.prompts.get_system_prompt())
+            except AdmissionRejected as e:
+                logger.warning(f"Using fallback chat (not admitted to Gemini: {e.reason})")
+                response = self._intelligent_fallback(user_query, intent, entities, today_snapshot)
+
+        if not response:
+            logger.warning("Using fallback chat (Gemini unavailable)")
+            response = self._intelligent_fallback(user_query, intent, entities, today_snapshot)
+
+        await self._record_chat_turn(user_query, response, entities, today_snapshot, session)
+        return response
+
+    def _repetition_response(self, user_query: str, recent_questions: List[str]) -> Optional[str]:
+        """Help text when the question was already asked at least twice recently, else None"""
+        if recent_questions:
+            last_5_questions = [q.lower() for q in recent_questions]
             query_lower = user_query.lower()
 
             similarity_count = sum(
@@ -411,7 +619,7 @@ class WorkspaceAgent:
             )
 
             if similarity_count >= 2:
-                response = """I notice you've asked about this a few times. Let me try to help differently:
+                return """I notice you've asked about this a few times. Let me try to help differently:
 
     **What I can access:**
     ✅ Gmail (unread emails)
@@ -424,23 +632,203 @@ class WorkspaceAgent:
     ❓ Need to refresh data → Click "Generate Report"
 
     **How can I help you specifically?**"""
+        return None
+
+    async def answer_by_keyword(self, query: str, snapshot: Optional[Dict], session: UserSession) -> Optional[str]:
+        """Email, meeting and assignment questions answered from the snapshot; None for anything else"""
+        query = query.lower()
+        if snapshot and any(phrase in query for phrase in COUNT_PHRASES):
+            return await self.handle_count_query(query)
+        if any(word in query for word in ["email", "mail", "inbox"]):
+            return await self.handle_email_query(query, snapshot, session)
+        if any(word in query for word in ["meeting", "calendar", "schedule"]):
+            return await self.handle_meeting_query(query, snapshot, session)
+        if any(word in query for word in ["assignment", "due", "class", "homework"]):
+            return await self.handle_assignment_query(query, snapshot, session)
+        return None
+
+    async def chat_batch(self, queries: List[str], session: Optional[UserSession] = None) -> List[Dict]:
+        """
+        Answer several questions with one context load. Each is answered the way
+        /api/chat would, except that the questions needing Gemini share one
+        structured call. Returns {"query", "response", "source"} per question, in order.
+        """
+        session = session or self.get_session()
+        logger.info(f"Batch of {len(queries)} questions")
+
+        sources = await self.context_builder.gather_chat_sources(" ".join(queries), session.user_id)
+        snapshot = sources['today_snapshot']
+        observations = snapshot.get('observations', {}) if snapshot else {}
+        recent_questions = list(sources['recent_questions'])
+        results: List[Dict] = []
+        turns = []  # (index, entities) of the questions recorded as chat turns; entities None for repeats
+        pending = []  # (index, intent, entities) of questions for Gemini
+
+        # In order: each local answer updates the follow-up context before the next question
+        for i, query in enumerate(queries):
+            response = await self.answer_by_keyword(query, snapshot, session)
+            if response:
+                results.append({"query": query, "response": response, "source": "keyword"})
+                continue
+
+            response = self._repetition_response(query, recent_questions)
+            recent_questions = (recent_questions + [query])[-5:]
+            if response:
+                results.append({"query": query, "response": response, "source": "local"})
+                turns.append((i, None))
+                continue
+
+            response, intent, entities = self._answer_deterministic(query, sources, session)
+            if intent == 'follow_up' and pending:
+                # It may refer to an answer Gemini has not given yet: let Gemini resolve it
+                response = None
+            results.append({"query": query, "response": response, "source": "local"})
+            turns.append((i, entities))
+            if response:
+                self._update_last_context(response, entities, observations, session)
+            else:
+                pending.append((i, intent, entities))
+
+        if pending:
+            answers = await self._batch_llm_answers([queries[i] for i, _, _ in pending], sources, session)
+            for (i, intent, entities), answer in zip(pending, answers):
+                if answer:
+                    results[i].update(response=answer, source="gemini")
+                else:
+                    results[i].update(response=self._intelligent_fallback(queries[i], intent, entities, snapshot), source="fallback")
+
+        # Stored in question order, which also leaves the last answer as the follow-up context
+        for i, entities in turns:
+            if entities is None:
+                await self._store_chat_turn(queries[i], results[i]["response"], session, index=False)
+            else:
+                await self._record_chat_turn(queries[i], results[i]["response"], entities, snapshot, session)
+        return results
+
+    async def _batch_llm_answers(self, queries: List[str], sources: Dict, session: UserSession) -> List[Optional[str]]:
+        """One Gemini call answering every query; None where no answer came back"""
+        try:
+            async with self.chat_admission.slot(session.user_id):
+                prompt = self.prompts.chat_batch_prompt(
+                    queries,
+                    self.context_builder.build_chat_context(" ".join(queries), sources, budget=config.CHAT_BATCH_CONTEXT_TOKENS)
+                )
+                result = await self.gemini.generate_structured(prompt, self.prompts.get_system_prompt())
+        except AdmissionRejected as e:
+            logger.warning(f"Using fallback chat for batch (not admitted to Gemini: {e.reason})")
+            return [None] * len(queries)
+
+        answers: List[Optional[str]] = [None] * len(queries)
+        for item in (result.get("answers") or []) if isinstance(result, dict) else []:
+            try:
+                index = int(item.get("index"))
+            except (AttributeError, TypeError, ValueError):
+                continue
+            if 0 <= index < len(queries) and isinstance(item.get("answer"), str) and item["answer"].strip():
+                answers[index] = item["answer"].strip()
+        if not all(answers):
+            logger.warning(f"Gemini answered {sum(1 for a in answers if a)} of {len(queries)} batched questions")
+        return answers
+
+    def _answer_deterministic(self, user_query: str, sources: Dict, session: UserSession) -> Tuple[Optional[str], str, Dict]:
+        """Answer for intents handled without Gemini (or None), with the detected intent and entities"""
+        today_snapshot = sources['today_snapshot']
+        chat_history = sources['chat_history']
+        observations = today_snapshot.get('observations', {}) if today_snapshot else {}
+        emails = observations.get('emails', [])
+        assignments = observations.get('assignments', [])
+        meetings = observations.get('meetings', [])
+
+        intent = self._detect_intent(user_query, chat_history, session)
+        entities = self._extract_entities(user_query, emails, assignments, meetings)
+
+        response = None
+        if intent == 'last_item':
+            response = self._handle_last_item_query(user_query, emails, assignments, meetings)
+        elif intent == 'search_by_sender':
+            response = self._handle_sender_search(user_query, emails)
+        elif intent == 'follow_up':
+            response = (
+                self._resolve_using_session_memory(user_query, session)
+                or self._handle_follow_up(user_query, chat_history, entities, observations, session)
+            )
+        elif intent == 'detail_request' and entities:
+            response = self._handle_detail_request(entities, observations)
+
+        return response, intent, entities
+
+    async def _record_chat_turn(self, user_query: str, response: str, entities: Dict, snapshot: Optional[Dict], session: UserSession):
+        """After an answer: follow-up context, chat history, retrieval index and summary"""
+        observations = snapshot.get('observations', {}) if snapshot else {}
+        self._update_last_context(response, entities, observations, session)
+        await self._store_chat_turn(user_query, response, session)
 
-                await self.db.store_chat_turn(user_query, response)
-                return response
+    async def _store_chat_turn(self, user_query: str, response: str, session: UserSession, index: bool = True):
+        timestamp = (await self.db.queue_chat_turn(user_query, response, session.user_id)).isoformat()
+        if index:
+            await self._index_documents([chat_document(chat_ref(session.user_id, timestamp), timestamp, user_query, response)])
+        self._schedule_summary_refresh(session.user_id)
 
+    def _schedule_summary_refresh(self, user_id: str):
+        """Refresh a user's conversation summary in the background, one run at a time per user"""
+        task = self._summary_tasks.get(user_id)
+        if task and not task.done():
+            return
+        # Finished tasks of other users are dropped as new ones start
+        self._summary_tasks = {u: t for u, t in self._summary_tasks.items() if not t.done()}
+        self._summary_tasks[user_id] = asyncio.create_task(self._refresh_conversation_summary(user_id))
+
+    async def _refresh_conversation_summary(self, user_id: str):
+        """Fold a user's chat turns into their rolling summary every N turns"""
+        try:
+            await self.db.chat_writer.flush()
+            current = await self.db.get_conversation_summary(user_id) or {}
+            last_chat_id = current.get('last_chat_id', 0)
+
+            pending = await self.db.count_chat_turns_after(last_chat_id, user_id)
+            if pending < config.CHAT_SUMMARY_EVERY_N_TURNS:
+                return
+
+            # The newest raw turns are sent verbatim, so only fold the older ones (at most 50 per run)
+            turns = await self.db.get_chat_turns_after(
+                last_chat_id, limit=min(pending - config.CHAT_RAW_TURNS, 50), user_id=user_id
+            )
+            if not turns:
+                return
 
+            previous = current.get('content', '')
+            prompt = self.prompts.conversation_summary_prompt(previous, turns)
+            summary = await self.gemini.generate(prompt)
+
+            if not summary:
+                summary = self._create_fallback_conversation_summary(previous, turns)
+
+            await self.db.store_conversation_summary(
+                content=summary.strip(),
+                last_chat_id=turns[-1]['id'],
+                turn_count=current.get('turn_count', 0) + len(turns),
+                user_id=user_id
+            )
+        except Exception as e:
+            logger.error(f"Conversation summary refresh failed: {e}")
+
+    def _create_fallback_conversation_summary(self, previous: str, turns: List[Dict]) -> str:
+        """Keep a bounded list of recent topics when Gemini is unavailable"""
+        lines = [line for line in (previous or '').splitlines() if line.startswith('- ')]
+        lines += [f"- User asked: {(t.get('user') or '')[:100]}" for t in turns]
+        return "\n".join(lines[-10:])
     
-    def _update_last_context(self, response: str, entities: Dict, observations: Dict):
+    def _update_last_context(self, response: str, entities: Dict, observations: Dict, session: UserSession):
         """Track what was last mentioned for better follow-up handling"""
         # Determine what type of content was in the response
         if 'meeting' in response.lower():
-            self._last_context = {'type': 'meeting', 'data': entities.get('meeting') or observations.get('meetings', [])}
+            session.last_context = {'type': 'meeting', 'data': entities.get('meeting') or observations.get('meetings', [])}
         elif 'email' in response.lower() or '📧' in response:
-            self._last_context = {'type': 'email', 'data': entities.get('emails') or observations.get('emails', [])}
+            session.last_context = {'type': 'email', 'data': entities.get('emails') or observations.get('emails', [])}
         elif 'assignment' in response.lower():
-            self._last_context = {'type': 'assignment', 'data': entities.get('assignments') or observations.get('assignments', [])}
+            session.last_context = {'type': 'assignment', 'data': entities.get('assignments') or observations.get('assignments', [])}
     
-    def _detect_intent(self, query: str, history: List[Dict]) -> str:
+    def _detect_intent(self, query: str, history: List[Dict], session: UserSession) -> str:
         """Detect user intent from query and history"""
         query_lower = query.lower()
         
@@ -459,7 +847,7 @@ class WorkspaceAgent:
         has_follow_up_word = any(word in query_lower for word in follow_up_words)
         
         # If we have recent context and user asks about "that" or "it"
-        if has_follow_up_word and (history or self._last_context):
+        if has_follow_up_word and (history or session.last_context):
             # Check if it's asking about details of last mentioned item
             if any(word in query_lower for word in ['detail', 'more', 'about', 'tell me', 'info']):
                 return 'follow_up'
@@ -611,14 +999,14 @@ class WorkspaceAgent:
         
         return f"📧 **No emails found from '{search_name.title()}'.**"
     
-    def _handle_follow_up(self, query: str, history: List, entities: Dict, observations: Dict) -> str:
+    def _handle_follow_up(self, query: str, history: List, entities: Dict, observations: Dict, session: UserSession) -> str:
         """Handle follow-up questions using conversation context - CRITICAL FIX"""
         query_lower = query.lower()
         
         # Use stored last context if available
-        if self._last_context:
-            context_type = self._last_context['type']
-            context_data = self._last_context['data']
+        if session.last_context:
+            context_type = session.last_context['type']
+            context_data = session.last_context['data']
             
             # Check if asking about details of last mentioned item
             if any(word in query_lower for word in ['detail', 'more', 'about', 'that', 'it', 'tell me']):
@@ -692,8 +1080,10 @@ class WorkspaceAgent:
         
         return self._format_summary(emails, assignments, meetings)
     
-    def _intelligent_fallback(self, query: str, intent: str, entities: Dict, observations: Dict) -> str:
+    def _intelligent_fallback(self, query: str, intent: str, entities: Dict, snapshot: Optional[Dict]) -> str:
         """Intelligent rule-based fallback when Gemini unavailable"""
+        snapshot = snapshot or {}
+        observations = snapshot.get('observations', {})
         emails = observations.get('emails', [])
         assignments = observations.get('assignments', [])
         meetings = observations.get('meetings', [])
@@ -708,7 +1098,7 @@ class WorkspaceAgent:
             if any(word in query_lower for word in ['detail', 'about', 'tell', 'what']):
                 return self._format_meeting_details(meetings[0])
             
-            return self._format_meeting_list(meetings)
+            return self._view(snapshot, 'meeting_list')
         
         # EMAIL QUERIES
         if any(word in query_lower for word in ['email', 'mail', 'inbox']):
@@ -734,18 +1124,18 @@ class WorkspaceAgent:
                 return self._format_email_list(emails[:3], detailed=True)
             
             # General email list
-            return self._format_email_list(emails[:5])
+            return self._view(snapshot, 'email_list_brief')
         
         # ASSIGNMENT QUERIES
         if any(word in query_lower for word in ['assignment', 'homework', 'due', 'classroom']):
             if not assignments:
                 return "📚 **No assignments due.**\n\nYou're all caught up with coursework!"
             
-            return self._format_assignment_list(assignments)
+            return self._view(snapshot, 'assignment_list')
         
         # SUMMARY QUERIES
         if any(word in query_lower for word in ['summary', 'overview', 'today', 'status']):
-            return self._format_summary(emails, assignments, meetings)
+            return self._view(snapshot, 'summary')
         
         # DEFAULT
         return f"I have **{len(emails)} emails**, **{len(assignments)} assignments**, and **{len(meetings)} meetings**.\n\n**Try asking:**\n• Show my emails\n• Any meetings today?\n• What's due this week?"
@@ -858,6 +1248,20 @@ class WorkspaceAgent:
         
         return response
     
+    def _format_classroom_list(self, assignments: List[Dict]) -> str:
+        """Format the classrooms the assignments belong to"""
+        # Get unique courses
+        courses = list(set([a.get('course', 'Unknown') for a in assignments]))
+        if not courses:
+            return "📚 **No classrooms found.**"
+        
+        response = f"📚 **Your Google Classrooms ({len(courses)}):**\n\n"
+        for i, course in enumerate(courses, 1):
+            course_assignments = [a for a in assignments if a.get('course') == course]
+            response += f"{i}. **{course}**\n"
+            response += f"   📝 {len(course_assignments)} assignment(s)\n\n"
+        return response
+    
     def _format_summary(self, emails: List, assignments: List, meetings: List) -> str:
         """Format overall summary"""
         response = "## 📊 Today's Summary\n\n"
@@ -0,0 +1,133 @@
+from collections import deque
+from datetime import datetime
+from typing import AsyncIterator, Deque, Dict, List, Optional, Set
+import asyncio
+import json
+import time
+
+from config import config
+
+class Subscriber:
+    """One connected client: a bounded queue of events waiting to be sent"""
+
+    def __init__(self, max_queue: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.overflows = 0
+        self.closed = False
+
+class EventBroker:
+    """
+    Fan-out of change notifications (snapshot versions, finished reports)
+    to connected clients.
+
+    Publishing never waits on a client. When a subscriber's queue is full,
+    its pending events are replaced by a single "resync" event that tells
+    the client to refetch everything; a subscriber that keeps falling behind
+    is disconnected. Recent events are kept so a reconnecting client can
+    resume after the last event id it saw.
+    """
+
+    def __init__(
+        self,
+        max_queue: int = config.EVENT_QUEUE_SIZE,
+        replay_size: int = config.EVENT_REPLAY_SIZE,
+        max_overflows: int = config.EVENT_MAX_OVERFLOWS
+    ):
+        self.max_queue = max_queue
+        self.max_overflows = max_overflows
+        self._subscribers: Set[Subscriber] = set()
+        self._recent: Deque[Dict] = deque(maxlen=replay_size)
+        self._latest: Dict[str, Dict] = {}  # Last event of each type, sent to new subscribers
+        # Ids start from the clock so they keep increasing across restarts, and an
+        # id from before a restart is recognized as too old to resume from
+        self._next_id = int(time.time() * 1000)
+        self._closed = False
+
+    def publish(self, event_type: str, data: Dict) -> Dict:
+        event = {
+            "id": self._next_id,
+            "event": event_type,
+            "data": {**data, "published_at": datetime.utcnow().isoformat()}
+        }
+        self._next_id += 1
+        self._recent.append(event)
+        self._latest[event_type] = event
+
+        for subscriber in list(self._subscribers):
+            self._deliver(subscriber, event)
+        return event
+
+    def _deliver(self, subscriber: Subscriber, event: Dict):
+        try:
+            subscriber.queue.put_nowait(event)
+            return
+        except asyncio.QueueFull:
+            pass
+
+        subscriber.overflows += 1
+        while not subscriber.queue.empty():
+            subscriber.queue.get_nowait()
+        if subscriber.overflows > self.max_overflows:
+            print(f"[EVENTS] Disconnecting slow subscriber after {subscriber.overflows} overflows")
+            self._close(subscriber)
+        else:
+            subscriber.queue.put_nowait({"id": event["id"], "event": "resync", "data": {"reason": "client fell behind"}})
+
+    def _close(self, subscriber: Subscriber):
+        subscriber.closed = True
+        self._subscribers.discard(subscriber)
+        # Wake the stream so it notices
+        while not subscriber.queue.empty():
+            subscriber.queue.get_nowait()
+        subscriber.queue.put_nowait(None)
+
+    def close(self):
+        """End every stream (on shutdown); streams opened afterwards end at once"""
+        self._closed = True
+        for subscriber in list(self._subscribers):
+            self._close(subscriber)
+
+    def _backlog(self, last_event_id: Optional[int]) -> List[Dict]:
+        """Events to send before live ones: missed events on resume, else the latest state"""
+        if last_event_id is None:
+            return sorted(self._latest.values(), key=lambda e: e["id"])
+        last_id = self._next_id - 1
+        oldest = self._recent[0]["id"] if self._recent else self._next_id
+        if last_event_id > last_id or (last_event_id < last_id and oldest > last_event_id + 1):
+            # Missed events are no longer kept (or were sent before a restart)
+            return [{"id": last_id, "event": "resync", "data": {"reason": "missed events expired"}}]
+        return [e for e in self._recent if e["id"] > last_event_id]
+
+    async def stream(
+        self,
+        last_event_id: Optional[int] = None,
+        heartbeat: float = config.EVENT_HEARTBEAT_SECONDS
+    ) -> AsyncIterator[str]:
+        """Server-sent events for one client, with a comment line as heartbeat while idle"""
+        if self._closed:
+            return
+        subscriber = Subscriber(self.max_queue)
+        for event in self._backlog(last_event_id)[-self.max_queue:]:
+            subscriber.queue.put_nowait(event)
+        self._subscribers.add(subscriber)
+
+        try:
+            yield f"retry: {int(config.EVENT_RETRY_MS)}\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscriber.queue.get(), timeout=heartbeat)
+                except asyncio.TimeoutError:
+                    yield ": heartbeat\n\n"
+                    continue
+                if event is None or subscriber.closed:
+                    break
+                yield self.format(event)
+        finally:
+            self._subscribers.discard(subscriber)
+
+    @staticmethod
+    def format(event: Dict) -> str:
+        return f"id: {event['id']}\nevent: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
+
+    def stats(self) -> Dict:
+        return {"subscribers": len(self._subscribers), "last_event_id": self._next_id - 1}
@@ -0,0 +1,171 @@
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+import asyncio
+import time
+import uuid
+
+from memory.db_manager import DatabaseManager
+from config import config
+
+class JobProgress:
+    """Stages of a running job, persisted whenever one starts or ends"""
+
+    def __init__(self, db: DatabaseManager, job: Dict, planned: List[str]):
+        self.db = db
+        self.job = job
+        self.error: Optional[str] = None
+        job["stages"] = [
+            {"name": name, "status": "pending", "started_at": None, "finished_at": None, "duration_ms": None}
+            for name in planned
+        ]
+
+    @asynccontextmanager
+    async def stage(self, name: str):
+        entry = next((s for s in self.job["stages"] if s["name"] == name), None)
+        if entry is None:
+            entry = {"name": name}
+            self.job["stages"].append(entry)
+        entry.update(status="running", started_at=datetime.utcnow().isoformat(), finished_at=None, duration_ms=None)
+        await self.save()
+
+        started = time.perf_counter()
+        try:
+            yield
+            entry["status"] = "succeeded"
+        except asyncio.CancelledError:
+            entry["status"] = "interrupted"
+            raise
+        except Exception as e:
+            entry["status"] = "failed"
+            self.error = f"{name}: {e}"
+            raise
+        finally:
+            entry["finished_at"] = datetime.utcnow().isoformat()
+            entry["duration_ms"] = round((time.perf_counter() - started) * 1000)
+            await self.save()
+
+    async def save(self):
+        # Progress is informational: a failed write must not fail the job
+        try:
+            await self.db.update_job(self.job["id"], stages=[dict(s) for s in self.job["stages"]])
+        except Exception as e:
+            print(f"[JOBS ERROR] Could not save progress of {self.job['id']}: {e}")
+
+class JobManager:
+    """
+    Runs long operations as background tasks that clients poll by id.
+    Job records are stored in the database, so status survives restarts
+    (jobs cut off by a restart are marked interrupted). Submitting with the
+    dedup key of an active job returns that job instead of starting another.
+    """
+
+    def __init__(self, db: DatabaseManager, retention_days: int = config.JOB_RETENTION_DAYS):
+        self.db = db
+        self.retention_days = retention_days
+        self._jobs: Dict[str, Dict] = {}  # Active jobs by id
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._active: Dict[str, str] = {}  # Dedup key -> active job id
+
+    async def recover(self):
+        """Close out jobs of a previous process and drop old records"""
+        interrupted = await self.db.interrupt_unfinished_jobs()
+        pruned = await self.db.delete_jobs_before(datetime.utcnow() - timedelta(days=self.retention_days))
+        if interrupted or pruned:
+            print(f"[JOBS] Marked {interrupted} unfinished jobs interrupted, pruned {pruned} old jobs")
+
+    async def submit(
+        self,
+        kind: str,
+        run: Callable[[JobProgress], Awaitable[Any]],
+        dedup_key: Optional[str] = None,
+        stages: Optional[List[str]] = None
+    ) -> Tuple[Dict, bool]:
+        """
+        Start run(progress) in the background. Returns the job and whether it
+        was an already active job with the same dedup key.
+        """
+        if dedup_key and dedup_key in self._active:
+            return self._jobs[self._active[dedup_key]], True
+
+        # Registered before the first await so concurrent submissions see it
+        job_id = uuid.uuid4().hex
+        job = {"id": job_id, "kind": kind, "status": "queued", "stages": [], "result": None, "error": None,
+               "created_at": datetime.utcnow().isoformat(), "started_at": None, "finished_at": None}
+        self._jobs[job_id] = job
+        if dedup_key:
+            self._active[dedup_key] = job_id
+
+        try:
+            await self.db.create_job(job_id, kind, dedup_key)
+        except Exception:
+            self._forget(job_id, dedup_key)
+            raise
+
+        progress = JobProgress(self.db, job, stages or [])
+        self._tasks[job_id] = asyncio.create_task(self._run(job, run, progress, dedup_key))
+        print(f"[JOBS] Started {kind} job {job_id}")
+        return job, False
+
+    async def _run(self, job: Dict, run: Callable[[JobProgress], Awaitable[Any]], progress: JobProgress, dedup_key: Optional[str]):
+        started_at = datetime.utcnow()
+        job.update(status="running", started_at=started_at.isoformat())
+        try:
+            await self.db.update_job(job["id"], status="running", started_at=started_at, stages=job["stages"])
+            result = await run(progress)
+            job.update(status="failed" if progress.error else "succeeded", result=result, error=progress.error)
+        except asyncio.CancelledError:
+            job.update(status="interrupted", error="Server shut down before the job finished")
+            raise
+        except Exception as e:
+            job.update(status="failed", error=progress.error or str(e))
+        finally:
+            finished_at = datetime.utcnow()
+            job["finished_at"] = finished_at.isoformat()
+            try:
+                await self.db.update_job(
+                    job["id"],
+                    status=job["status"],
+                    stages=job["stages"],
+                    result=job["result"],
+                    error=job["error"],
+                    finished_at=finished_at
+                )
+            except Exception as e:
+                print(f"[JOBS ERROR] Could not save result of {job['id']}: {e}")
+            self._forget(job["id"], dedup_key)
+            print(f"[JOBS] {job['kind']} job {job['id']} {job['status']} in {(finished_at - started_at).total_seconds():.1f}s")
+
+    def _forget(self, job_id: str, dedup_key: Optional[str]):
+        self._jobs.pop(job_id, None)
+        self._tasks.pop(job_id, None)
+        if dedup_key and self._active.get(dedup_key) == job_id:
+            del self._active[dedup_key]
+
+    async def get(self, job_id: str) -> Optional[Dict]:
+        """Live state of an active job, otherwise the stored record"""
+        job = self._jobs.get(job_id)
+        if job is not None:
+            return self._with_elapsed(job)
+        job = await self.db.get_job(job_id)
+        return self._with_elapsed(job) if job else None
+
+    @staticmethod
+    def _with_elapsed(job: Dict) -> Dict:
+        job = {**job, "stages": [dict(s) for s in job["stages"]]}
+        if job.get("started_at"):
+            end = datetime.fromisoformat(job["finished_at"]) if job.get("finished_at") else datetime.utcnow()
+            job["elapsed_ms"] = round((end - datetime.fromisoformat(job["started_at"])).total_seconds() * 1000)
+        return job
+
+    async def wait(self, job_id: str):
+        task = self._tasks.get(job_id)
+        if task is not None:
+            await asyncio.shield(task)
+
+    async def close(self):
+        """Cancel active jobs; they are recorded as interrupted"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -1,52 +1,23 @@
 import json
-from typing import Dict, List
+from typing import Dict, List, Optional, Tuple
 from datetime import datetime
 
 class PromptTemplates:
 
     @staticmethod
     def chat_prompt(context: Dict) -> str:
-        """Generate chat prompt WITH conversation history"""
+        """Generate chat prompt from the token-budgeted context (see reasoning/context_builder.py)"""
         user_query = context.get('user_query', '')
-        today = context.get('today_snapshot', {})
-        summaries = context.get('past_summaries', [])
-        history = context.get('chat_history', [])
-
-        # Extract actual data
-        observations = today.get('observations', {}) if today else {}
-        emails = observations.get('emails', [])
-        assignments = observations.get('assignments', [])
-        meetings = observations.get('meetings', [])
-
-        # BUILD CONVERSATION HISTORY
-        conversation_context = ""
-        if history:
-            conversation_context = "\n**PREVIOUS CONVERSATION:**\n"
-            for i, msg in enumerate(history[-5:]):  # Last 5 messages
-                user_msg = msg.get('user', '')
-                agent_msg = msg.get('agent', '')
-                if user_msg:
-                    conversation_context += f"User: {user_msg}\n"
-                if agent_msg:
-                    conversation_context += f"Assistant: {agent_msg[:200]}...\n"
-            conversation_context += "\n"
+        history, data = PromptTemplates._chat_context(context.get('context', {}))
 
         return f"""You are a helpful workspace assistant. Answer the user's question using their data and conversation history.
 
-{conversation_context}
+{history}
 
 **CURRENT QUESTION:**
 "{user_query}"
 
-**TODAY'S DATA:**
-Emails ({len(emails)}):
-{json.dumps(emails[:5], indent=2) if emails else "No emails"}
-
-Assignments ({len(assignments)}):
-{json.dumps(assignments, indent=2) if assignments else "No assignments"}
-
-Meetings ({len(meetings)}):
-{json.dumps(meetings, indent=2) if meetings else "No meetings"}
+{data}
 
 **INSTRUCTIONS:**
 1. If this is a follow-up question (uses "that", "it", "them"), refer to the previous conversation
@@ -66,11 +37,84 @@ Current date: {datetime.now().strftime("%B %d, %Y")}
 
 Remember: The user trusts you to help them stay organized and productive."""
 
+    @staticmethod
+    def chat_batch_prompt(queries: List[str], packed: Dict) -> str:
+        """Several questions against one shared context, answered in one JSON reply"""
+        history, data = PromptTemplates._chat_context(packed)
+        questions = "\n".join(f'{i}. "{q}"' for i, q in enumerate(queries))
+
+        return f"""You are a helpful workspace assistant. Answer each of the user's questions using their data and conversation history.
+
+{history}
+
+**QUESTIONS:**
+{questions}
+
+{data}
+
+**INSTRUCTIONS:**
+1. Answer every question on its own; a later question may refer to an earlier one or to the previous conversation
+2. Answer each concisely (under 150 words)
+3. Reference specific items by name/subject/title
+4. If asking about something not in the data, say "I don't have that information" and suggest what you CAN help with
+5. Use markdown formatting (**, ##) inside the answers
+
+Current date: {datetime.now().strftime("%B %d, %Y")}
+
+Return ONLY valid JSON, one entry per question, using the question numbers above:
+{{
+    "answers": [
+        {{"index": 0, "answer": "..."}}
+    ]
+}}"""
+
+    @staticmethod
+    def _chat_context(packed: Dict) -> Tuple[str, str]:
+        """Conversation/history block and today's data block of a packed chat context"""
+        sections = packed.get('sections', {})
+        counts = packed.get('total_counts', {})
+
+        def items(name: str, label: str) -> str:
+            shown = sections.get(name, [])
+            total = counts.get(name, len(shown))
+            header = f"{label} ({total})" if len(shown) == total else f"{label} (most relevant {len(shown)} of {total})"
+            return f"{header}:\n" + ("\n".join(shown) if shown else f"No {label.lower()}")
+
+        # BUILD CONVERSATION HISTORY
+        conversation_context = ""
+        if sections.get('conversation_summary'):
+            conversation_context = f"\n**CONVERSATION SO FAR (summary):**\n{sections['conversation_summary'][0]}\n"
+        if sections.get('recent_turns'):
+            conversation_context += "\n**PREVIOUS CONVERSATION:**\n" + "\n".join(sections['recent_turns']) + "\n"
+
+        history_context = ""
+        if sections.get('past_reports'):
+            history_context += "\n**RECENT DAILY REPORTS:**\n" + "\n".join(f"- {r}" for r in sections['past_reports']) + "\n"
+        # Older items found by similarity search
+        if sections.get('related_history'):
+            history_context += "\n**RELATED HISTORY (older, may be relevant):**\n" + "\n".join(f"- {r}" for r in sections['related_history']) + "\n"
+
+        data = f"""**TODAY'S DATA:**
+{items('emails', 'Emails')}
+
+{items('assignments', 'Assignments')}
+
+{items('meetings', 'Meetings')}"""
+        return conversation_context + history_context, data
+
     @staticmethod
     def urgency_analysis_prompt(observations: Dict) -> str:
-        email_count = len(observations.get('emails', []))
-        assignment_count = len(observations.get('assignments', []))
-        meeting_count = len(observations.get('meetings', []))
+        # Observations may be pre-ranked down to the most urgent items
+        totals = observations.get('total_counts', {})
+        email_count = totals.get('emails', len(observations.get('emails', [])))
+        assignment_count = totals.get('assignments', len(observations.get('assignments', [])))
+        meeting_count = totals.get('meetings', len(observations.get('meetings', [])))
+        shown_count = sum(len(observations.get(k, [])) for k in ('emails', 'assignments', 'meetings'))
+        omitted_note = (
+            f"\nOnly the {shown_count} most urgent items are listed (ranked by urgency_score); "
+            f"the rest are lower priority.\n"
+            if shown_count < email_count + assignment_count + meeting_count else ""
+        )
 
         return f"""Analyze this workspace data and categorize items by urgency.
 
@@ -78,7 +122,7 @@ Remember: The user trusts you to help them stay organized and productive."""
 - {email_count} emails
 - {assignment_count} assignments
 - {meeting_count} meetings
-
+{omitted_note}
 **EMAILS:**
 {json.dumps(observations.get('emails', []), indent=2)}
 
@@ -128,14 +172,21 @@ Criteria:
 - LOW PRIORITY: Social media, newsletters, distant deadlines"""
 
     @staticmethod
-    def eod_summary_prompt(insights: Dict, past_summaries: List[Dict]) -> str:
+    def eod_summary_prompt(
+        insights: Dict,
+        past_reports: List[str],
+        weekly_digests: Optional[List[str]] = None,
+        monthly_digests: Optional[List[str]] = None
+    ) -> str:
+        """past_reports and digests: "period: content" lines packed by the context builder"""
         analysis = insights.get('analysis', {})
         counts = insights.get('counts', {})
 
-        past_context = "\n".join([
-            f"- {s['date']}: {s['content'][:100]}..."
-            for s in past_summaries[:3]
-        ]) if past_summaries else "No previous summaries"
+        past_context = "\n".join(f"- {r}" for r in past_reports) if past_reports else "No previous summaries"
+        if weekly_digests:
+            past_context += "\n\n**PREVIOUS WEEKS:**\n" + "\n".join(f"- {d}" for d in weekly_digests)
+        if monthly_digests:
+            past_context += "\n\n**PREVIOUS MONTHS:**\n" + "\n".join(f"- {d}" for d in monthly_digests)
 
         return f"""Generate a professional End-of-Day summary for the user.
 
@@ -162,6 +213,46 @@ Tone: Professional but warm, like a helpful colleague.
 Style: Use "you" and "your". Be specific (mention actual emails/assignments by name).
 Focus: Action-oriented, not just reporting data."""
 
+    @staticmethod
+    def period_summary_prompt(level: str, start: str, end: str, entries: List[str]) -> str:
+        """Digest of a week (from daily reports) or a month (from weekly digests)"""
+        source = "daily End-of-Day reports" if level == "week" else "weekly digests"
+        return f"""Summarize the user's {level} from {start} to {end} using these {source}.
+
+**{source.upper()}:**
+{chr(10).join(f"- {e}" for e in entries)}
+
+**YOUR TASK:**
+Write a digest of the {level} (under {80 if level == "week" else 120} words).
+- Keep recurring themes, deadlines that were met or missed, and workload trends
+- Keep specific names (courses, assignments, senders, meetings) that mattered for more than a day
+- Drop day-by-day detail, greetings and encouragement
+
+Return only the digest text."""
+
+    @staticmethod
+    def conversation_summary_prompt(previous_summary: str, turns: List[Dict]) -> str:
+        transcript = "\n".join([
+            f"User: {t.get('user', '')}\nAssistant: {(t.get('agent') or '')[:300]}"
+            for t in turns
+        ])
+
+        return f"""Update the running summary of a conversation between a user and their workspace assistant.
+
+**CURRENT SUMMARY:**
+{previous_summary or "No summary yet"}
+
+**NEW TURNS:**
+{transcript}
+
+**YOUR TASK:**
+Rewrite the summary so it covers the whole conversation (under 120 words).
+- Keep the topics the user asked about and the specific items mentioned (email subjects, assignment titles, meeting names)
+- Keep open questions and anything the user asked to follow up on
+- Drop greetings, repetition and formatting
+
+Return only the summary text."""
+
     @staticmethod
     def get_system_prompt() -> str:
         return """You are an intelligent personal workspace assistant with conversational memory.
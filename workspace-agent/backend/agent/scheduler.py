@@ -1,6 +1,7 @@
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
 from agent.core import WorkspaceAgent
+from memory.retention import RetentionManager
 from config import config
 
 class AgentScheduler:
@@ -13,6 +14,7 @@ class AgentScheduler:
         self.scheduler = AsyncIOScheduler()
         self.eod_hour = config.EOD_REPORT_HOUR
         self.eod_minute = config.EOD_REPORT_MINUTE
+        self.retention = RetentionManager(agent.db, retriever=agent.retriever)
         print("[SCHEDULER] Initialized")
     
     def start(self):
@@ -34,6 +36,31 @@ class AgentScheduler:
             name='Data Refresh'
         )
         
+        # Fold finished days down to a single base shortly after midnight (today is capped on every store)
+        self.scheduler.add_job(
+            self._compact_snapshot_history,
+            trigger=CronTrigger(hour=0, minute=5),
+            id='snapshot_compaction',
+            name='Snapshot History Compaction'
+        )
+        
+        # Compress and archive old history at night
+        self.scheduler.add_job(
+            self._apply_retention,
+            trigger=CronTrigger(hour=3, minute=30),
+            id='retention',
+            name='Retention And Archival'
+        )
+        
+        # Drop idle chat sessions every 10 minutes
+        self.scheduler.add_job(
+            self._evict_idle_sessions,
+            trigger='interval',
+            minutes=10,
+            id='session_cleanup',
+            name='Session Cleanup'
+        )
+        
         self.scheduler.start()
         print(f"[SCHEDULER] Started! EOD at {self.eod_hour}:{self.eod_minute:02d}, Data refresh every 30min")
     
@@ -41,8 +68,10 @@ class AgentScheduler:
         """Run the EOD report generation"""
         print("[SCHEDULER] Running scheduled EOD report...")
         try:
-            await self.agent.autonomous_observation_cycle()
-            print("[SCHEDULER] EOD report completed successfully")
+            # Same job as a manual trigger, so the two never run concurrently
+            job, attached = await self.agent.submit_observation_cycle()
+            await self.agent.jobs.wait(job["id"])
+            print(f"[SCHEDULER] EOD report job {job['id']} finished" + (" (joined running job)" if attached else ""))
         except Exception as e:
             print(f"[SCHEDULER ERROR] EOD report failed: {e}")
     
@@ -60,6 +89,27 @@ class AgentScheduler:
         except Exception as e:
             print(f"[SCHEDULER ERROR] Data refresh failed: {e}")
     
+    async def _compact_snapshot_history(self):
+        """Collapse past days' refresh deltas into a single base"""
+        try:
+            await self.agent.db.compact_snapshot_history()
+        except Exception as e:
+            print(f"[SCHEDULER ERROR] Snapshot compaction failed: {e}")
+    
+    async def _apply_retention(self):
+        """Compress old snapshots, archive expired rows and vacuum"""
+        try:
+            await self.retention.run()
+        except Exception as e:
+            print(f"[SCHEDULER ERROR] Retention failed: {e}")
+    
+    async def _evict_idle_sessions(self):
+        """Evict chat sessions that have been idle too long"""
+        try:
+            self.agent.sessions.evict_idle()
+        except Exception as e:
+            print(f"[SCHEDULER ERROR] Session cleanup failed: {e}")
+    
     def stop(self):
         """Stop the scheduler"""
         self.scheduler.shutdown()
@@ -0,0 +1,80 @@
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+from config import config
+
+class UserSession:
+    """Conversation state for a single user"""
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.session_memory = {
+            "last_emails": [],
+            "last_meetings": [],
+            "last_assignments": []
+        }
+        self.last_context = None  # Track last mentioned context for follow-ups
+        self.last_seen = datetime.now()
+
+    def touch(self):
+        self.last_seen = datetime.now()
+
+class SessionManager:
+    """
+    Keeps one UserSession per request identity.
+    Least recently used sessions are evicted once the cap is reached,
+    and sessions idle for longer than the timeout are dropped.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = config.MAX_SESSIONS,
+        idle_timeout_minutes: int = config.SESSION_IDLE_MINUTES
+    ):
+        self.max_sessions = max(1, max_sessions)
+        self.idle_timeout = timedelta(minutes=idle_timeout_minutes)
+        self._sessions: "OrderedDict[str, UserSession]" = OrderedDict()
+
+    def get(self, user_id: Optional[str] = None) -> UserSession:
+        """Return the session for user_id, creating it if needed"""
+        user_id = user_id or config.DEFAULT_USER_ID
+
+        session = self._sessions.get(user_id)
+        if session:
+            self._sessions.move_to_end(user_id)
+            session.touch()
+            return session
+
+        self.evict_idle()
+        while len(self._sessions) >= self.max_sessions:
+            evicted_id, _ = self._sessions.popitem(last=False)
+            print(f"[SESSIONS] Evicted least recently used session '{evicted_id}'")
+
+        session = UserSession(user_id)
+        self._sessions[user_id] = session
+        return session
+
+    def evict_idle(self) -> int:
+        """Drop sessions that have not been used within the idle timeout"""
+        cutoff = datetime.now() - self.idle_timeout
+        idle = [
+            user_id for user_id, session in self._sessions.items()
+            if session.last_seen < cutoff and user_id != config.DEFAULT_USER_ID
+        ]
+        for user_id in idle:
+            del self._sessions[user_id]
+
+        if idle:
+            print(f"[SESSIONS] Evicted {len(idle)} idle session(s)")
+        return len(idle)
+
+    def stats(self) -> Dict:
+        return {
+            "active_sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "idle_timeout_minutes": int(self.idle_timeout.total_seconds() // 60)
+        }
+
+    def __len__(self) -> int:
+        return len(self._sessions)
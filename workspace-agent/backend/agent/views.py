@@ -0,0 +1,125 @@
+from typing import Dict, List, Optional
+import time
+
+from utils.dates import parse_iso_epoch
+
+SECONDS_PER_DAY = 86400
+NO_DUE_DATE_DAYS = 999
+
+def assignment_due_epoch(assignment: Dict) -> Optional[int]:
+    """Due date of an assignment dict, normalized at ingestion or parsed for older snapshots"""
+    if 'due_epoch' in assignment:
+        return assignment['due_epoch']
+    return parse_iso_epoch(assignment.get('due', ''))
+
+def normalize_due_dates(observations: Dict) -> Dict:
+    """Add due_epoch to every assignment that does not have one yet"""
+    for assignment in observations.get('assignments', []):
+        if 'due_epoch' not in assignment:
+            assignment['due_epoch'] = parse_iso_epoch(assignment.get('due', ''))
+    return observations
+
+def calculate_days_until(due_epoch: Optional[int], now: Optional[float] = None) -> int:
+    """Whole days until the due date (negative when overdue)"""
+    if due_epoch is None:
+        return NO_DUE_DATE_DAYS
+    if now is None:
+        now = time.time()
+    return int((due_epoch - now) // SECONDS_PER_DAY)
+
+def calculate_urgency_from_due(days: int) -> str:
+    """Calculate urgency level from days until due"""
+    if days == 0:
+        return "critical"
+    elif days <= 2:
+        return "high"
+    elif days <= 7:
+        return "normal"
+    else:
+        return "low"
+
+def refresh_due_fields(assignments: List[Dict], now: Optional[float] = None) -> List[Dict]:
+    """Re-derive days_until_due and urgency of dashboard assignments for the current time"""
+    if now is None:
+        now = time.time()
+    for a in assignments:
+        if 'due_epoch' not in a:
+            a['due_epoch'] = parse_iso_epoch(a.get('due_date', ''))
+        days = calculate_days_until(a['due_epoch'], now)
+        a['days_until_due'] = days
+        a['urgency'] = calculate_urgency_from_due(days)
+    return assignments
+
+def build_report_payload(report_date: str, content: str, insights: Dict) -> Dict:
+    """Build the /eod-report payload (EODReportResponse shape) from a report and the insights it was written from"""
+    analysis = insights.get('analysis', {})
+    counts = insights.get('counts', {})
+    urgent = analysis.get('urgent', [])
+
+    return {
+        "date": report_date,
+        "content": content or '',
+        "highlights": [
+            f"{item.get('title', 'Item')}: {item.get('reason', 'Needs attention')}"
+            for item in urgent[:3]
+        ],
+        "urgent_items": [
+            {
+                "type": item.get('type', 'item'),
+                "title": item.get('title', 'Unknown'),
+                "action": item.get('action', item.get('reason', ''))
+            }
+            for item in urgent
+        ],
+        "stats": {
+            "emails": counts.get('emails', 0),
+            "assignments": counts.get('assignments', 0),
+            "meetings": counts.get('meetings', 0)
+        }
+    }
+
+def build_dashboard_payload(snapshot_date: str, observations: Dict, insights: Dict) -> Dict:
+    """Build the /snapshot/today payload (WorkspaceSnapshot shape) as plain data"""
+    analysis = insights.get('analysis', {})
+
+    emails = [
+        {
+            "sender": e.get('sender', 'Unknown'),
+            "subject": e.get('subject', 'No subject'),
+            "snippet": e.get('snippet', '')[:150],
+            "received": e.get('received', ''),
+            "urgency": "high" if e.get('is_unread') else "normal"
+        }
+        for e in observations.get('emails', [])[:10]
+    ]
+
+    assignments = refresh_due_fields([
+        {
+            "course": a.get('course', 'Unknown'),
+            "title": a.get('title', 'Untitled'),
+            "due_date": a.get('due', ''),
+            "due_epoch": assignment_due_epoch(a),
+            "points": a.get('points', 0)
+        }
+        for a in observations.get('assignments', [])
+    ])
+
+    meetings = [
+        {
+            "title": m.get('title', 'No title'),
+            "start_time": m.get('start', ''),
+            "duration_minutes": m.get('duration_minutes', 0),
+            "attendees_count": m.get('attendees_count', 0)
+        }
+        for m in observations.get('meetings', [])
+    ]
+
+    return {
+        "date": snapshot_date,
+        "emails": emails,
+        "assignments": assignments,
+        "meetings": meetings,
+        "summary": analysis.get('one_sentence_summary', 'Data collected successfully'),
+        "urgent_count": len(analysis.get('urgent', [])),
+        "important_count": len(analysis.get('important', []))
+    }
@@ -0,0 +1,37 @@
+from typing import Optional
+import hashlib
+import json
+
+from fastapi import Response
+
+from config import config
+
+def make_etag(*parts) -> str:
+    """Strong ETag from the versions a response is built from"""
+    digest = hashlib.blake2b(json.dumps(parts, default=str).encode(), digest_size=12).hexdigest()
+    return f'"{digest}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match check (weak comparison, as RFC 9110 requires for it)"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag == etag:
+            return True
+    return False
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": config.HTTP_CACHE_CONTROL})
+
+def cached_json(body: bytes, etag: str) -> Response:
+    """Pre-encoded JSON body with its validators"""
+    return Response(
+        content=body,
+        media_type="application/json",
+        headers={"ETag": etag, "Cache-Control": config.HTTP_CACHE_CONTROL}
+    )
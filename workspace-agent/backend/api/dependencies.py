@@ -0,0 +1,12 @@
+from fastapi import Header
+from typing import Optional
+
+from config import config
+
+async def get_user_id(
+    x_user_id: Optional[str] = Header(default=None),
+    x_session_id: Optional[str] = Header(default=None)
+) -> str:
+    """Resolve the request identity used to key per-user agent sessions"""
+    user_id = (x_user_id or x_session_id or "").strip()
+    return user_id or config.DEFAULT_USER_ID
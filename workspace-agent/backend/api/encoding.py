@@ -0,0 +1,53 @@
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+import json
+
+from fastapi import Response
+
+from config import config
+
+try:
+    import orjson
+except ImportError:  # Optional: the stdlib encoder is always available
+    orjson = None
+
+def dumps(data: Any) -> bytes:
+    """JSON bytes; orjson when installed (several times faster), else the stdlib"""
+    if orjson is not None:
+        return orjson.dumps(data, default=str, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, default=str, separators=(",", ":"), ensure_ascii=False).encode()
+
+class FastJSONResponse(Response):
+    """
+    JSON response for payloads the server built itself. Returning it from a
+    route skips response_model validation; the model still documents the shape.
+    """
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content  # Already encoded
+        return dumps(content)
+
+class EncodedBodyCache:
+    """Encoded response bodies by ETag, so unchanged data is serialized once per version"""
+
+    def __init__(self, max_entries: int = config.RESPONSE_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self._bodies: "OrderedDict[str, bytes]" = OrderedDict()
+
+    def get(self, etag: str) -> Optional[bytes]:
+        body = self._bodies.get(etag)
+        if body is not None:
+            self._bodies.move_to_end(etag)
+        return body
+
+    def put(self, etag: str, data: Any) -> bytes:
+        body = dumps(data)
+        self._bodies[etag] = body
+        while len(self._bodies) > self.max_entries:
+            self._bodies.popitem(last=False)
+        return body
+
+    def stats(self) -> Dict:
+        return {"entries": len(self._bodies), "bytes": sum(len(b) for b in self._bodies.values())}
@@ -1,15 +1,28 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Depends, Header
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Dict, Optional, List
 from datetime import datetime, date
+import time
 from schemas.responses import (
     WorkspaceSnapshot, EODReportResponse, ChatResponse, ChatMessage,
     EmailSummary, AssignmentSummary, MeetingSummary
 )
+from api.dependencies import get_user_id
+from api.caching import make_etag, etag_matches, not_modified, cached_json
+from api.encoding import FastJSONResponse, EncodedBodyCache
+from config import config
+from agent.views import build_dashboard_payload, refresh_due_fields, calculate_days_until, assignment_due_epoch
+from utils.dates import parse_iso_utc
 
 router = APIRouter()
 agent = None
 
+# Encoded bodies of the cacheable GETs, by ETag
+snapshot_bodies = EncodedBodyCache()
+report_bodies = EncodedBodyCache()
+history_bodies = EncodedBodyCache()
+
 def set_agent(agent_instance):
     global agent
     agent = agent_instance
@@ -17,177 +30,216 @@ def set_agent(agent_instance):
 class ChatRequest(BaseModel):
     query: str
 
+class ChatBatchRequest(BaseModel):
+    queries: List[str]
+
 @router.get("/health")
 async def health_check():
     return {
         "status": "healthy",
         "message": "Workspace Agent is running",
-        "timestamp": datetime.now().isoformat()
+        "timestamp": datetime.now().isoformat(),
+        "sessions": agent.sessions.stats() if agent else {},
+        "events": agent.events.stats() if agent else {},
+        "chat_admission": agent.chat_admission.stats() if agent else {}
     }
 
+@router.get("/events")
+async def stream_events(last_event_id: Optional[str] = Header(default=None)):
+    """
+    Server-sent events: "snapshot" (new snapshot version), "report" (EOD report
+    ready) and "resync" (refetch everything). Clients fetch data only when told
+    it changed; EventSource reconnects with Last-Event-ID to resume.
+    """
+    try:
+        resume_from = int(last_event_id) if last_event_id else None
+    except ValueError:
+        resume_from = None
+    
+    return StreamingResponse(
+        agent.events.stream(resume_from),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def _snapshot_etag(snapshot: Optional[Dict]) -> str:
+    """Tag of the dashboard: snapshot version plus the due-date day counts, which change with time alone"""
+    if not snapshot:
+        return make_etag("snapshot", date.today().isoformat(), None)
+    now = time.time()
+    days = [
+        calculate_days_until(assignment_due_epoch(a), now)
+        for a in snapshot.get('observations', {}).get('assignments', [])
+    ]
+    return make_etag("snapshot", snapshot.get('date'), snapshot.get('version'), days)
+
 @router.get("/snapshot/today", response_model=WorkspaceSnapshot)
-async def get_today_snapshot():
+async def get_today_snapshot(if_none_match: Optional[str] = Header(default=None)):
     """Get today's workspace snapshot with structured data"""
     try:
-        snapshot = await agent.db.get_snapshot_by_date(date.today())
-        
-        if not snapshot:
-            return WorkspaceSnapshot(
-                date=date.today().isoformat(),
-                emails=[],
-                assignments=[],
-                meetings=[],
-                summary="No data collected yet. Click 'Generate Report' to start.",
-                urgent_count=0,
-                important_count=0
-            )
+        # Revalidation of a cached snapshot is answered without the database
+        snapshot = agent.db.cached_snapshot(date.today())
+        if snapshot is None:
+            snapshot = await agent.db.get_snapshot_by_date(date.today())
         
-        observations = snapshot.get('observations', {})
-        insights = snapshot.get('insights', {})
-        analysis = insights.get('analysis', {})
+        etag = _snapshot_etag(snapshot)
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
         
-        # Structure emails
-        emails = [
-            EmailSummary(
-                sender=e.get('sender', 'Unknown'),
-                subject=e.get('subject', 'No subject'),
-                snippet=e.get('snippet', '')[:150],
-                received=e.get('received', ''),
-                urgency="high" if e.get('is_unread') else "normal"
-            )
-            for e in observations.get('emails', [])[:10]
-        ]
+        # The payload is built by the server: encoded once per version, never re-validated
+        body = snapshot_bodies.get(etag)
+        if body is None:
+            body = snapshot_bodies.put(etag, _dashboard(snapshot))
+        return cached_json(body, etag)
         
-        # Structure assignments
-        assignments = [
-            AssignmentSummary(
-                course=a.get('course', 'Unknown'),
-                title=a.get('title', 'Untitled'),
-                due_date=a.get('due', ''),
-                days_until_due=_calculate_days_until(a.get('due', '')),
-                points=a.get('points', 0),
-                urgency=_calculate_urgency_from_due(a.get('due', ''))
-            )
-            for a in observations.get('assignments', [])
-        ]
-        
-        # Structure meetings
-        meetings = [
-            MeetingSummary(
-                title=m.get('title', 'No title'),
-                start_time=m.get('start', ''),
-                duration_minutes=m.get('duration_minutes', 0),
-                attendees_count=m.get('attendees_count', 0)
-            )
-            for m in observations.get('meetings', [])
-        ]
-        
-        return WorkspaceSnapshot(
-            date=snapshot.get('date', date.today().isoformat()),
-            emails=emails,
-            assignments=assignments,
-            meetings=meetings,
-            summary=analysis.get('one_sentence_summary', 'Data collected successfully'),
-            urgent_count=len(analysis.get('urgent', [])),
-            important_count=len(analysis.get('important', []))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def _dashboard(snapshot: Optional[Dict]) -> Dict:
+    if not snapshot:
+        return {
+            "date": date.today().isoformat(),
+            "emails": [],
+            "assignments": [],
+            "meetings": [],
+            "summary": "No data collected yet. Click 'Generate Report' to start.",
+            "urgent_count": 0,
+            "important_count": 0
+        }
+    
+    # Served from the view rendered when the snapshot was stored
+    dashboard = snapshot.get('views', {}).get('dashboard')
+    if not dashboard:
+        dashboard = build_dashboard_payload(
+            snapshot.get('date', date.today().isoformat()),
+            snapshot.get('observations', {}),
+            snapshot.get('insights', {})
         )
+    
+    # Days-until and urgency depend on the current time: plain arithmetic on due_epoch.
+    # Refreshed on copies, the rendered view is shared through the snapshot cache
+    assignments = refresh_due_fields([dict(a) for a in dashboard['assignments']])
+    # due_epoch is internal (not in AssignmentSummary)
+    return {
+        **dashboard,
+        "assignments": [{k: v for k, v in a.items() if k != 'due_epoch'} for a in assignments]
+    }
+
+@router.get("/snapshot/changes")
+async def get_snapshot_changes(since: Optional[str] = None):
+    """What changed in today's snapshot since a point in time (default: start of the day)"""
+    try:
+        since_at = parse_iso_utc(since) if since else datetime.min
+        if since_at is None:
+            raise HTTPException(status_code=400, detail=f"Invalid 'since' timestamp: {since}")
         
+        return await agent.db.get_snapshot_changes(since_at)
+    
+    except HTTPException:
+        raise
+    except ValueError as e:
+        # `since` falls in history that was compacted
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/snapshot/at")
+async def get_snapshot_at(at: str, day: Optional[str] = None):
+    """A day's observations (default: today) as they were at a point in time"""
+    try:
+        at_time = parse_iso_utc(at)
+        if at_time is None:
+            raise HTTPException(status_code=400, detail=f"Invalid 'at' timestamp: {at}")
+        try:
+            snapshot_date = date.fromisoformat(day) if day else date.today()
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Invalid 'day': {day}")
+        
+        observations = await agent.db.get_snapshot_at(snapshot_date, at_time)
+        if observations is None:
+            raise HTTPException(status_code=404, detail=f"No snapshot of {snapshot_date.isoformat()} at {at}")
+        return {"date": snapshot_date.isoformat(), "at": at, "observations": observations}
+    
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/eod-report", response_model=EODReportResponse)
-async def get_eod_report():
+async def get_eod_report(if_none_match: Optional[str] = Header(default=None)):
     """Get latest EOD report with structured highlights"""
     try:
-        report = await agent.db.get_latest_eod_report()
-        snapshot = await agent.db.get_snapshot_by_date(date.today())
-        
-        if not report or not report.get('content'):
-            return EODReportResponse(
-                date=date.today().isoformat(),
-                content="No report generated yet. Click 'Generate Report Now' to create one.",
-                highlights=[],
-                urgent_items=[],
-                stats={"emails": 0, "assignments": 0, "meetings": 0}
-            )
+        etag = make_etag("eod_report", date.today().isoformat(), agent.db.resource_version("eod_report"))
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
         
-        # Extract insights
-        insights = snapshot.get('insights', {}) if snapshot else {}
-        analysis = insights.get('analysis', {})
-        counts = insights.get('counts', {})
-        
-        # Extract highlights from analysis
-        highlights = []
-        urgent_items_list = analysis.get('urgent', [])
-        
-        for item in urgent_items_list[:3]:
-            highlights.append(f"{item.get('title', 'Item')}: {item.get('reason', 'Needs attention')}")
-        
-        return EODReportResponse(
-            date=report.get('date', date.today().isoformat()),
-            content=report.get('content', ''),
-            highlights=highlights,
-            urgent_items=[
-                {
-                    "type": item.get('type', 'item'),
-                    "title": item.get('title', 'Unknown'),
-                    "action": item.get('action', item.get('reason', ''))
+        body = report_bodies.get(etag)
+        if body is None:
+            # Rendered together with the report, from the insights it was written from
+            view = await agent.db.get_latest_report_view()
+            if not view or not view.get('content'):
+                view = {
+                    "date": date.today().isoformat(),
+                    "content": "No report generated yet. Click 'Generate Report Now' to create one.",
+                    "highlights": [],
+                    "urgent_items": [],
+                    "stats": {"emails": 0, "assignments": 0, "meetings": 0}
                 }
-                for item in urgent_items_list
-            ],
-            stats={
-                "emails": counts.get('emails', 0),
-                "assignments": counts.get('assignments', 0),
-                "meetings": counts.get('meetings', 0)
-            }
-        )
+            body = report_bodies.put(etag, view)
+        return cached_json(body, etag)
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.post("/eod-report/generate")
+@router.post("/eod-report/generate", status_code=202)
 async def trigger_eod_report():
-    """Manually trigger EOD report generation"""
+    """Start EOD report generation in the background; poll /jobs/{job_id} for progress"""
     try:
-        report = await agent.autonomous_observation_cycle()
+        job, attached = await agent.submit_observation_cycle()
         return {
-            "status": "success",
-            "message": "Report generated successfully",
-            "report_available": report is not None
+            "job_id": job["id"],
+            "status": job["status"],
+            "deduplicated": attached,
+            "message": "Report generation already running" if attached else "Report generation started",
+            "status_url": f"/api/jobs/{job['id']}"
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/jobs/{job_id}")
+async def get_job_status(job_id: str):
+    """Status, per-stage progress and timings of a background job"""
+    job = await agent.jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return job
+
 @router.post("/chat", response_model=ChatResponse)
-async def chat_with_agent(request: ChatRequest):
+async def chat_with_agent(request: ChatRequest, user_id: str = Depends(get_user_id)):
+    """Answer one question. Both outcomes are FastJSONResponse bodies; response_model only documents the shape"""
     try:
         query = request.query.lower()
+        session = agent.get_session(user_id)
         snapshot = await agent.db.get_snapshot_by_date(date.today())
 
         # ----- INTENT ROUTING -----
-        if any(word in query for word in ["email", "mail", "inbox"]):
-            response = await agent.handle_email_query(query, snapshot)
-
-        elif any(word in query for word in ["meeting", "calendar", "schedule"]):
-            response = await agent.handle_meeting_query(query, snapshot)
-
-        elif any(word in query for word in ["assignment", "due", "class", "homework"]):
-            response = await agent.handle_assignment_query(query, snapshot)
-
-        else:
+        response = await agent.answer_by_keyword(query, snapshot, session)
+        if not response:
             # Use the existing chat method which has Gemini + fallback logic
             try:
-                response = await agent.chat(query)
+                response = await agent.chat(query, session)
             except Exception as e:
                 print(f"[AGENT] Chat method failed: {e}")
                 response = "I'm having trouble processing your request. Try asking about your emails, meetings, or assignments."
 
-        return ChatResponse(
-            response=response,
-            context_used=snapshot is not None,
-            sources=["Gmail", "Calendar", "Classroom"] if snapshot else [],
-            suggestions=[]
-        )
+        return FastJSONResponse({
+            "response": response,
+            "context_used": snapshot is not None,
+            "sources": ["Gmail", "Calendar", "Classroom"] if snapshot else [],
+            "suggestions": []
+        })
 
     except Exception as e:
         print(f"[API ERROR] /chat: {e}")
@@ -195,85 +247,107 @@ async def chat_with_agent(request: ChatRequest):
         traceback.print_exc()
         
         # Return a user-friendly error instead of 500
-        return ChatResponse(
-            response="I encountered an error processing your request. Please try again or rephrase your question.",
-            context_used=False,
-            sources=[],
-            suggestions=["Show my emails", "Any meetings today?", "What's due this week?"]
-        )
+        return FastJSONResponse({
+            "response": "I encountered an error processing your request. Please try again or rephrase your question.",
+            "context_used": False,
+            "sources": [],
+            "suggestions": ["Show my emails", "Any meetings today?", "What's due this week?"]
+        })
 
+@router.post("/chat/batch")
+async def chat_batch(request: ChatBatchRequest, user_id: str = Depends(get_user_id)):
+    """
+    Several questions in one request, answered in order as /chat would answer
+    each. Context is loaded once and the questions that need Gemini share a
+    single call. `answered_by` is keyword, local, gemini or fallback.
+    """
+    queries = [q.strip() for q in request.queries]
+    if not queries or not all(queries):
+        raise HTTPException(status_code=400, detail="queries must be a non-empty list of non-empty strings")
+    if len(queries) > config.CHAT_BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=400, detail=f"At most {config.CHAT_BATCH_MAX_QUERIES} queries per batch")
+    
+    try:
+        results = await agent.chat_batch([q.lower() for q in queries], agent.get_session(user_id))
+        context_used = agent.db.cached_snapshot(date.today()) is not None
+        return FastJSONResponse({
+            "results": [
+                {
+                    "query": query,
+                    "response": r["response"],
+                    "answered_by": r["source"],
+                    "context_used": context_used,
+                    "sources": ["Gmail", "Calendar", "Classroom"] if context_used else [],
+                    "suggestions": []
+                }
+                for query, r in zip(queries, results)
+            ]
+        })
+    
+    except Exception as e:
+        print(f"[API ERROR] /chat/batch: {e}")
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail="I encountered an error processing your questions. Please try again.")
 
 @router.get("/chat/history")
-async def get_chat_history():
-    """Get recent chat history - FIXED"""
+async def get_chat_history(
+    limit: int = config.CHAT_HISTORY_PAGE_SIZE,
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    fields: Optional[str] = None,
+    if_none_match: Optional[str] = Header(default=None),
+    user_id: str = Depends(get_user_id)
+):
+    """
+    Paginated chat history of the requesting user (oldest first). Pass the returned `before` cursor to
+    load older turns and `after` to load newer ones. `fields` is a comma
+    separated subset of user,agent,timestamp.
+    """
     try:
-        history_raw = await agent.db.get_recent_chat_history(limit=50)
+        etag = make_etag("chat_history", agent.db.resource_version("chat_history"), user_id, limit, before, after, fields)
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+        body = history_bodies.get(etag)
+        if body is not None:
+            return cached_json(body, etag)
+        
+        wanted = [f.strip() for f in fields.split(",") if f.strip()] if fields else ["user", "agent", "timestamp"]
+        page = await agent.db.get_chat_history_page(
+            limit=limit,
+            before=before,
+            after=after,
+            fields=wanted,
+            user_id=user_id
+        )
         
         # Properly format for frontend
         messages = []
-        for item in history_raw:
+        for item in page["turns"]:
             # Each item has both user and agent
             if item.get('user'):
                 messages.append({
                     "role": "user",
                     "content": item['user'],
-                    "timestamp": item.get('timestamp', datetime.now().isoformat())
+                    "timestamp": item.get('timestamp', '')
                 })
             if item.get('agent'):
                 messages.append({
                     "role": "agent",
                     "content": item['agent'],
-                    "timestamp": item.get('timestamp', datetime.now().isoformat())
+                    "timestamp": item.get('timestamp', '')
                 })
         
-        return {"history": messages}
+        body = history_bodies.put(etag, {
+            "history": messages,
+            "before": page["before"],
+            "after": page["after"],
+            "has_more": page["has_more"]
+        })
+        return cached_json(body, etag)
     
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         print(f"[API ERROR] Chat history: {e}")
         return {"history": []}
-
-# Helper functions
-def _calculate_days_until(due_date_str: str) -> int:
-    """Calculate days until due date - FIXED VERSION"""
-    if not due_date_str:
-        return 999
-    
-    try:
-        # Try parsing ISO format first
-        from dateutil import parser
-        due = parser.parse(due_date_str)
-        
-        # Make timezone-aware if needed
-        from datetime import timezone
-        now = datetime.now(timezone.utc)
-        
-        # If due date has timezone info, use it; otherwise assume UTC
-        if due.tzinfo is None:
-            due = due.replace(tzinfo=timezone.utc)
-        
-        delta = due - now
-        return delta.days
-        
-    except Exception as e:
-        print(f"[ROUTES] Date parse error for '{due_date_str}': {e}")
-        # Try alternative format
-        try:
-            # Handle format like "2026-02-09 18:59"
-            from datetime import datetime as dt
-            due = dt.strptime(due_date_str.split('+')[0].strip(), '%Y-%m-%d %H:%M')
-            delta = due - dt.now()
-            return delta.days
-        except:
-            return 999
-
-def _calculate_urgency_from_due(due_date_str: str) -> str:
-    """Calculate urgency level from due date"""
-    days = _calculate_days_until(due_date_str)
-    if days == 0:
-        return "critical"
-    elif days <= 2:
-        return "high"
-    elif days <= 7:
-        return "normal"
-    else:
-        return "low"
\ No newline at end of file
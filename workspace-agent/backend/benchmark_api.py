@@ -0,0 +1,140 @@
+"""
+Benchmark: /api/snapshot/today throughput per response path.
+
+Requests are driven straight through the ASGI app (no network, no HTTP
+client) so the numbers show the cost of the route itself:
+
+- validated: the previous path, the dashboard dict validated into
+  WorkspaceSnapshot and encoded with the stdlib json by FastAPI
+- cached: the current path, bytes encoded once per snapshot version
+- revalidated: the same request with a matching If-None-Match (304)
+
+    python benchmark_api.py [--requests 5000] [--emails 50] [--assignments 30] [--meetings 8]
+"""
+from datetime import date
+from types import SimpleNamespace
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+from config import config
+from benchmark_db import make_observations
+
+async def call(app, path: str, headers: dict = None) -> tuple:
+    """One GET through the ASGI app. Returns (status, body size)"""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()],
+        "client": ("127.0.0.1", 1),
+        "server": ("bench", 80)
+    }
+    status, size = 0, 0
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status, size
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body":
+            size += len(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return status, size
+
+async def run(app, name: str, path: str, requests: int, headers: dict = None) -> dict:
+    for _ in range(50):  # Warm up caches
+        await call(app, path, headers)
+
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(requests):
+        t = time.perf_counter()
+        status, size = await call(app, path, headers)
+        latencies.append((time.perf_counter() - t) * 1000)
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "path": name,
+        "status": status,
+        "bytes": size,
+        "req_per_sec": requests / elapsed,
+        "p50_ms": statistics.median(latencies),
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1]
+    }
+
+async def main():
+    parser = argparse.ArgumentParser(description="/snapshot/today response path benchmark")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--emails", type=int, default=50)
+    parser.add_argument("--assignments", type=int, default=30)
+    parser.add_argument("--meetings", type=int, default=8)
+    args = parser.parse_args()
+
+    config.DATABASE_URL = f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    config.DB_ECHO = False
+
+    from fastapi import APIRouter, FastAPI
+    from memory.db_manager import DatabaseManager
+    from agent.views import build_dashboard_payload, normalize_due_dates
+    from schemas.responses import WorkspaceSnapshot
+    from api import routes
+    from api.encoding import orjson
+
+    db = DatabaseManager()
+    await db.init_db()
+    observations = normalize_due_dates(make_observations(args.emails, args.assignments, args.meetings))
+    insights = {"analysis": {"one_sentence_summary": "Busy day", "urgent": [], "important": []}, "counts": {}}
+    await db.store_daily_snapshot({
+        "date": date.today(),
+        "observations": observations,
+        "insights": insights,
+        "views": {"dashboard": build_dashboard_payload(date.today().isoformat(), observations, insights)}
+    })
+    routes.set_agent(SimpleNamespace(db=db))
+
+    legacy = APIRouter()
+
+    @legacy.get("/snapshot/today", response_model=WorkspaceSnapshot)
+    async def validated_snapshot():
+        return routes._dashboard(db.cached_snapshot(date.today()))
+
+    app = FastAPI()
+    app.include_router(routes.router, prefix="/api")
+    app.include_router(legacy, prefix="/legacy")
+
+    status, _ = await call(app, "/api/snapshot/today")
+    etag = routes._snapshot_etag(db.cached_snapshot(date.today()))
+
+    results = [
+        await run(app, "validated", "/legacy/snapshot/today", args.requests),
+        await run(app, "cached", "/api/snapshot/today", args.requests),
+        await run(app, "revalidated", "/api/snapshot/today", args.requests, {"If-None-Match": etag})
+    ]
+    await db.close()
+
+    print("\n" + "=" * 72)
+    print(f"Encoder: {'orjson' if orjson else 'stdlib json'}; "
+          f"{args.emails} emails (10 shown), {args.assignments} assignments, {args.meetings} meetings")
+    print(f"{'path':<13}{'status':>8}{'bytes':>9}{'req/s':>12}{'p50 ms':>10}{'p99 ms':>10}")
+    print("-" * 72)
+    for r in results:
+        print(f"{r['path']:<13}{r['status']:>8}{r['bytes']:>9}{r['req_per_sec']:>12.0f}"
+              f"{r['p50_ms']:>10.3f}{r['p99_ms']:>10.3f}")
+    print("=" * 72)
+
+if __name__ == "__main__":
+    asyncio.run(main())
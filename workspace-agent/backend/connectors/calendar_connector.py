@@ -2,6 +2,7 @@ from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
 from googleapiclient.discovery import build
+import asyncio
 import os
 import json
 from datetime import datetime, timedelta
@@ -55,6 +56,10 @@ class CalendarConnector:
     
     async def get_todays_meetings(self) -> List[Meeting]:
         """Fetch today's meetings"""
+        # The Google client is blocking: run it off the event loop
+        return await asyncio.to_thread(self._fetch_meetings)
+    
+    def _fetch_meetings(self) -> List[Meeting]:
         if not self.service:
             self.authenticate()
         
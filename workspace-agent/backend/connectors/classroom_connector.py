@@ -2,6 +2,7 @@ from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
 from googleapiclient.discovery import build
+import asyncio
 import os
 import json
 from datetime import datetime, timedelta
@@ -55,6 +56,10 @@ class ClassroomConnector:
     
     async def get_upcoming_assignments(self, days_ahead: int = 30, include_past: bool = True) -> List[Assignment]:
         """Fetch assignments - can include past assignments"""
+        # The Google client is blocking: run it off the event loop
+        return await asyncio.to_thread(self._fetch_assignments, days_ahead, include_past)
+    
+    def _fetch_assignments(self, days_ahead: int, include_past: bool) -> List[Assignment]:
         if not self.service:
             self.authenticate()
         
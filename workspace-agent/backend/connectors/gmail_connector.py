@@ -2,9 +2,10 @@ from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from google.auth.transport.requests import Request
 from googleapiclient.discovery import build
+import asyncio
 import os
 import pickle
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import List
 from schemas.email import Email
 
@@ -53,6 +54,10 @@ class GmailConnector:
     
     async def get_unread_important_emails(self, max_results: int = 10) -> List[Email]:
         """Fetch unread or important emails"""
+        # The Google client is blocking: run it off the event loop
+        return await asyncio.to_thread(self._fetch_emails, max_results)
+    
+    def _fetch_emails(self, max_results: int) -> List[Email]:
         if not self.service:
             self.authenticate()
         
@@ -88,7 +93,7 @@ class GmailConnector:
                 try:
                     received_at = datetime.strptime(date_str, '%a, %d %b %Y %H:%M:%S %z')
                 except:
-                    received_at = datetime.now()
+                    received_at = datetime.now(timezone.utc)
                 
                 email = Email(
                     id=msg['id'],
@@ -8,7 +8,9 @@ from connectors.classroom_connector import ClassroomConnector
 from connectors.calendar_connector import CalendarConnector
 from reasoning.gemini_client import GeminiClient
 from memory.db_manager import DatabaseManager
+from memory.retriever import VectorRetriever
 from agent.core import WorkspaceAgent
+from agent.sessions import SessionManager
 from agent.scheduler import AgentScheduler
 from api.routes import router, set_agent
 
@@ -59,8 +61,13 @@ async def lifespan(app: FastAPI):
         classroom=classroom,
         calendar=calendar,
         gemini=gemini,
-        db=db_manager
+        db=db_manager,
+        sessions=SessionManager(),
+        retriever=VectorRetriever()
     )
+    await agent.index_history()
+    await agent.jobs.recover()
+    await agent.backfill_report_views()
     
     # Set agent in routes
     set_agent(agent)
@@ -78,6 +85,10 @@ async def lifespan(app: FastAPI):
     # SHUTDOWN
     if scheduler:
         scheduler.stop()
+    if agent:
+        await agent.close()
+    if db_manager:
+        await db_manager.close()
     print("\n[SHUTDOWN] Agent stopped")
 
 # Create FastAPI app with lifespan
@@ -104,7 +115,10 @@ async def root():
             "health": "/api/health",
             "eod_report": "/api/eod-report",
             "chat": "/api/chat",
-            "trigger_report": "/api/eod-report/generate"
+            "chat_batch": "/api/chat/batch",
+            "trigger_report": "/api/eod-report/generate",
+            "job_status": "/api/jobs/{job_id}",
+            "events": "/api/events"
         }
     }
 
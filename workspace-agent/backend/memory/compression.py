@@ -0,0 +1,32 @@
+from typing import Any
+import json
+import zlib
+
+try:
+    import zstandard
+except ImportError:  # Optional: zlib is always available
+    zstandard = None
+
+def resolve_codec(preferred: str) -> str:
+    """Codec to write with; falls back to zlib when zstandard is not installed"""
+    if preferred == "zstd" and zstandard is None:
+        print("[DB] zstandard not installed, compressing with zlib")
+        return "zlib"
+    if preferred not in ("zstd", "zlib"):
+        raise ValueError(f"Unknown compression codec: {preferred}")
+    return preferred
+
+def compress_json(data: Any, codec: str) -> bytes:
+    raw = json.dumps(data, separators=(",", ":"), default=str).encode()
+    if codec == "zstd":
+        return zstandard.ZstdCompressor(level=10).compress(raw)
+    return zlib.compress(raw, 9)
+
+def decompress_json(blob: bytes, codec: str) -> Any:
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read zstd-compressed records")
+        raw = zstandard.ZstdDecompressor().decompress(blob)
+    else:
+        raw = zlib.decompress(blob)
+    return json.loads(raw)
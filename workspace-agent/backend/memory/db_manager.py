@@ -1,80 +1,584 @@
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy import select, and_, or_
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
+from sqlalchemy import select, insert, update, and_, or_, func, event, text, delete
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from datetime import datetime, timedelta, date
 from typing import List, Dict, Optional
+import asyncio
+import base64
 import json
+import re
+import uuid
 
-from .models import Base, DailySnapshot, EODReport, ChatHistory, EmailCache, AssignmentCache
+from .models import (
+    DailySnapshot, SnapshotView, SnapshotEmail, SnapshotAssignment, SnapshotMeeting, SnapshotDelta,
+    CompressedSnapshot, ArchivedRecord, EODReport, ReportView, PeriodSummary, Job, ChatHistory, ConversationSummary, EmailCache, AssignmentCache, EMAIL_CACHE_FTS_DDL
+)
+from .snapshot_history import diff_observations, is_empty, item_key, replay, summarize_delta
+from .write_behind import WriteBehindQueue
+from .compression import decompress_json
+from .migrations import run_migrations
 from config import config
+from utils.dates import parse_iso_epoch, from_utc_epoch, to_utc_epoch, week_start, month_start
+
+OBSERVATION_SOURCES = ("emails", "assignments", "meetings")
+
+CHAT_HISTORY_FIELDS = {
+    "id": ChatHistory.id,
+    "timestamp": ChatHistory.timestamp,
+    "user": ChatHistory.user_query,
+    "agent": ChatHistory.agent_response
+}
+
+def encode_chat_cursor(timestamp: datetime, chat_id: int) -> str:
+    """Opaque keyset cursor for a chat turn"""
+    raw = f"{timestamp.isoformat()}|{chat_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_chat_cursor(cursor: str) -> tuple:
+    """Inverse of encode_chat_cursor; raises ValueError on malformed cursors"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        timestamp, chat_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(timestamp), int(chat_id)
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+def _epoch(item: Dict, epoch_key: str, iso_key: str) -> Optional[int]:
+    epoch = item.get(epoch_key)
+    return epoch if epoch is not None else parse_iso_epoch(item.get(iso_key, ''))
+
+def _observation_rows(snapshot_date: date, observations: Dict) -> Dict[str, List[Dict]]:
+    """Split observation items into rows for the snapshot_* child tables"""
+    return {
+        "emails": [
+            {
+                "snapshot_date": snapshot_date,
+                "position": i,
+                "sender": e.get('sender'),
+                "subject": e.get('subject'),
+                "snippet": e.get('snippet'),
+                "received": e.get('received'),
+                "received_at": from_utc_epoch(_epoch(e, 'received_epoch', 'received')),
+                "is_unread": bool(e.get('is_unread')),
+                "urgency_score": e.get('urgency_score')
+            }
+            for i, e in enumerate(observations.get('emails', []))
+        ],
+        "assignments": [
+            {
+                "snapshot_date": snapshot_date,
+                "position": i,
+                "course": a.get('course'),
+                "title": a.get('title'),
+                "due": a.get('due'),
+                "due_at": from_utc_epoch(_epoch(a, 'due_epoch', 'due')),
+                "status": a.get('status'),
+                "points": a.get('points'),
+                "urgency_score": a.get('urgency_score')
+            }
+            for i, a in enumerate(observations.get('assignments', []))
+        ],
+        "meetings": [
+            {
+                "snapshot_date": snapshot_date,
+                "position": i,
+                "title": m.get('title'),
+                "start": m.get('start'),
+                "start_at": from_utc_epoch(_epoch(m, 'start_epoch', 'start')),
+                "duration_minutes": m.get('duration_minutes'),
+                "attendees_count": m.get('attendees_count'),
+                "urgency_score": m.get('urgency_score')
+            }
+            for i, m in enumerate(observations.get('meetings', []))
+        ]
+    }
+
+def _with_score(item: Dict, score: Optional[int]) -> Dict:
+    if score is not None:
+        item["urgency_score"] = score
+    return item
+
+def _email_dict(row: SnapshotEmail) -> Dict:
+    return _with_score({
+        "sender": row.sender,
+        "subject": row.subject,
+        "snippet": row.snippet,
+        "received": row.received,
+        "received_epoch": to_utc_epoch(row.received_at) if row.received_at else None,
+        "is_unread": row.is_unread
+    }, row.urgency_score)
+
+def _assignment_dict(row: SnapshotAssignment) -> Dict:
+    return _with_score({
+        "course": row.course,
+        "title": row.title,
+        "due": row.due,
+        "due_epoch": to_utc_epoch(row.due_at) if row.due_at else None,
+        "status": row.status,
+        "points": row.points
+    }, row.urgency_score)
+
+def _meeting_dict(row: SnapshotMeeting) -> Dict:
+    return _with_score({
+        "title": row.title,
+        "start": row.start,
+        "start_epoch": to_utc_epoch(row.start_at) if row.start_at else None,
+        "duration_minutes": row.duration_minutes,
+        "attendees_count": row.attendees_count
+    }, row.urgency_score)
 
 class DatabaseManager:
     def __init__(self):
         self.engine = create_async_engine(
             config.DATABASE_URL,
-            echo=config.DEBUG
+            **self._engine_options(config.DATABASE_URL)
         )
+        if self.engine.dialect.name == "sqlite":
+            event.listen(self.engine.sync_engine, "connect", self._apply_sqlite_pragmas)
         self.async_session = sessionmaker(
             self.engine,
             class_=AsyncSession,
             expire_on_commit=False
         )
+        # Latest snapshots (with their rendered views) kept in memory by date
+        self._snapshot_cache: Dict[date, Dict] = {}
+        self.fts_enabled = False
+        # Deltas are computed against the previous state, so writes are serialized
+        self._snapshot_write_lock = asyncio.Lock()
+        # Chat turns are persisted off the response path
+        self.chat_writer = WriteBehindQueue(
+            self.store_chat_turns,
+            max_size=config.CHAT_WRITE_QUEUE_SIZE,
+            batch_size=config.CHAT_WRITE_BATCH_SIZE,
+            flush_interval=config.CHAT_WRITE_FLUSH_SECONDS,
+            max_retries=config.CHAT_WRITE_MAX_RETRIES,
+            name="chat history"
+        )
+        # In-process change counters of data served with ETags. The instance id
+        # changes on restart, so tags handed out before it never match again
+        self.instance_id = uuid.uuid4().hex[:8]
+        self._versions: Dict[str, int] = {"eod_report": 0, "chat_history": 0}
+    
+    @staticmethod
+    def _engine_options(database_url: str) -> Dict:
+        """Engine settings: no statement echo by default, sized connection pool"""
+        options = {"echo": config.DB_ECHO}
+        
+        # In-memory SQLite uses a single static connection, there is no pool to size.
+        # aiosqlite defaults to NullPool (a new connection per session), so the
+        # queue pool is requested explicitly to reuse connections and their pragmas
+        if ":memory:" in database_url:
+            return options
+        if config.DB_POOL_SIZE <= 0:
+            options["poolclass"] = NullPool
+        else:
+            options.update(
+                poolclass=AsyncAdaptedQueuePool,
+                pool_size=config.DB_POOL_SIZE,
+                max_overflow=config.DB_MAX_OVERFLOW,
+                pool_timeout=config.DB_POOL_TIMEOUT
+            )
+        
+        # Server connections can be dropped by the server or a proxy: check them
+        # on checkout and replace them before idle timeouts close them
+        if database_url.startswith("postgresql"):
+            if config.DB_POOL_SIZE > 0:
+                options.update(pool_pre_ping=True, pool_recycle=config.DB_POOL_RECYCLE)
+            options["connect_args"] = {
+                "server_settings": config.POSTGRES_SERVER_SETTINGS,
+                "command_timeout": config.DB_POOL_TIMEOUT
+            }
+        return options
+    
+    def dialect_insert(self, model):
+        """INSERT supporting on_conflict_do_update for the configured backend"""
+        if self.engine.dialect.name == "postgresql":
+            return pg_insert(model)
+        return sqlite_insert(model)
+    
+    @staticmethod
+    def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+        """Apply the SQLite performance profile to a new connection"""
+        cursor = dbapi_connection.cursor()
+        for name, value in config.SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
     
     async def init_db(self):
-        """Initialize database tables"""
-        async with self.engine.begin() as conn:
-            await conn.run_sync(Base.metadata.create_all)
-        print("[DB] Database initialized")
+        """Bring the schema up to date with the versioned migrations"""
+        version = await run_migrations(self.engine)
+        
+        if self.engine.dialect.name == "sqlite":
+            await self._init_email_fts()
+        print(f"[DB] Database initialized ({self.engine.dialect.name}, schema v{version})")
+    
+    async def close(self):
+        """Flush queued writes and release pooled connections"""
+        try:
+            await self.chat_writer.close()
+        except Exception as e:
+            print(f"[DB ERROR] Could not flush queued chat turns: {e}")
+        await self.engine.dispose()
     
-    async def store_daily_snapshot(self, snapshot_data: dict):
-        """Store or update daily observations and insights"""
+    async def _init_email_fts(self):
+        """Create the FTS5 email index and its sync triggers, backfilling existing rows"""
+        try:
+            async with self.engine.begin() as conn:
+                result = await conn.execute(text(
+                    "SELECT 1 FROM sqlite_master WHERE type='table' AND name='email_cache_fts'"
+                ))
+                existed = result.first() is not None
+                
+                for ddl in EMAIL_CACHE_FTS_DDL:
+                    await conn.execute(text(ddl))
+                
+                if not existed:
+                    await conn.execute(text("INSERT INTO email_cache_fts(email_cache_fts) VALUES ('rebuild')"))
+            self.fts_enabled = True
+        except Exception as e:
+            # SQLite builds without FTS5 keep the LIKE-based search
+            print(f"[DB] FTS5 unavailable, using LIKE search: {e}")
+            self.fts_enabled = False
+    
+    async def store_daily_snapshot(self, snapshot_data: dict) -> int:
+        """Upsert daily observations, insights and rendered views in one transaction. Returns the snapshot version"""
+        async with self._snapshot_write_lock:
+            return await self._store_daily_snapshot(snapshot_data)
+    
+    async def _store_daily_snapshot(self, snapshot_data: dict) -> int:
+        snapshot_date = snapshot_data["date"]
+        observations = snapshot_data["observations"]
+        previous = await self.get_snapshot_by_date(snapshot_date)
+        
+        # Items go to the normalized child tables, the row keeps only metadata
+        metadata = {k: v for k, v in observations.items() if k not in OBSERVATION_SOURCES}
+        metadata["normalized"] = True
+        rows = _observation_rows(snapshot_date, observations)
+        
+        snapshot_stmt = self.dialect_insert(DailySnapshot).values(
+            date=snapshot_date,
+            observations=metadata,
+            insights=snapshot_data.get("insights", {})
+        )
+        snapshot_stmt = snapshot_stmt.on_conflict_do_update(
+            index_elements=[DailySnapshot.date],
+            set_={
+                "observations": snapshot_stmt.excluded.observations,
+                "insights": snapshot_stmt.excluded.insights
+            }
+        )
+        
+        # Views are versioned together with the snapshot they were rendered from
+        view_stmt = self.dialect_insert(SnapshotView).values(
+            snapshot_date=snapshot_data["date"],
+            version=1,
+            views=snapshot_data.get("views", {})
+        )
+        view_stmt = view_stmt.on_conflict_do_update(
+            index_elements=[SnapshotView.snapshot_date],
+            set_={
+                "version": SnapshotView.version + 1,
+                "views": view_stmt.excluded.views,
+                "rendered_at": datetime.utcnow()
+            }
+        ).returning(SnapshotView.version)
+        
         async with self.async_session() as session:
-            # Check if snapshot already exists for this date
-            result = await session.execute(
-                select(DailySnapshot).where(DailySnapshot.date == snapshot_data["date"])
-            )
-            existing = result.scalar_one_or_none()
-            
-            if existing:
-                # Update existing snapshot
-                existing.observations = snapshot_data["observations"]
-                existing.insights = snapshot_data.get("insights", {})
-                print(f"[DB] Updated snapshot for {snapshot_data['date']}")
-            else:
-                # Create new snapshot
-                snapshot = DailySnapshot(
-                    date=snapshot_data["date"],
-                    observations=snapshot_data["observations"],
-                    insights=snapshot_data.get("insights", {})
+            async with session.begin():
+                await session.execute(snapshot_stmt)
+                
+                # Append this refresh to the day's history: a full base first, then deltas
+                result = await session.execute(
+                    select(func.max(SnapshotDelta.seq)).where(SnapshotDelta.snapshot_date == snapshot_date)
                 )
-                session.add(snapshot)
-                print(f"[DB] Stored new snapshot for {snapshot_data['date']}")
-            
-            await session.commit()
+                last_seq = result.scalar_one()
+                if last_seq is None:
+                    seq, delta = 0, diff_observations(None, observations)
+                else:
+                    seq, delta = last_seq + 1, diff_observations(previous["observations"] if previous else None, observations)
+                
+                changed = seq == 0 or not is_empty(delta)
+                if changed:
+                    session.add(SnapshotDelta(snapshot_date=snapshot_date, seq=seq, delta=delta))
+                    
+                    # Keep the day within its delta cap as it grows, not only at night
+                    if seq >= config.SNAPSHOT_MAX_DELTAS:
+                        result = await session.execute(
+                            select(func.count(SnapshotDelta.id)).where(SnapshotDelta.snapshot_date == snapshot_date)
+                        )
+                        count = result.scalar_one()
+                        await self._fold_deltas(session, snapshot_date, count - config.SNAPSHOT_MAX_DELTAS + 1)
+                    
+                    # Unchanged refreshes leave the item rows alone, changed ones only touch what differs
+                    for model, key in ((SnapshotEmail, "emails"), (SnapshotAssignment, "assignments"), (SnapshotMeeting, "meetings")):
+                        await self._sync_item_rows(session, model, key, snapshot_date, rows[key])
+                
+                result = await session.execute(view_stmt)
+                version = result.scalar_one()
+        
+        print(f"[DB] Upserted snapshot for {snapshot_data['date']} (v{version}, {'delta #' + str(seq) if changed else 'no item changes'})")
+        
+        # Concurrent writers may finish out of order: keep the newest version cached
+        cached = self._snapshot_cache.get(snapshot_data["date"])
+        if cached and cached.get("version", 0) > version:
+            return version
+        
+        self._cache_snapshot(snapshot_data["date"], {
+            "date": snapshot_data["date"].isoformat(),
+            "observations": snapshot_data["observations"],
+            "insights": snapshot_data.get("insights", {}),
+            "views": snapshot_data.get("views", {}),
+            "version": version
+        })
+        return version
+    
+    def cached_snapshot(self, snapshot_date: date) -> Optional[Dict]:
+        """Snapshot held in memory, without touching the database"""
+        return self._snapshot_cache.get(snapshot_date)
+    
+    def resource_version(self, resource: str) -> str:
+        """Current version of "eod_report" or "chat_history" in this process"""
+        return f"{self.instance_id}.{self._versions[resource]}"
+    
+    def bump_version(self, resource: str):
+        self._versions[resource] += 1
+    
+    def _cache_snapshot(self, snapshot_date: date, snapshot: Dict):
+        """Keep the last week of snapshots in memory"""
+        self._snapshot_cache[snapshot_date] = snapshot
+        while len(self._snapshot_cache) > 7:
+            self._snapshot_cache.pop(min(self._snapshot_cache))
     
     async def store_eod_report(self, report_data: dict):
-        """Store or update end-of-day report"""
+        """Upsert end-of-day report, and its rendered view ("view") when given, in one transaction"""
+        stmt = self.dialect_insert(EODReport).values(
+            date=report_data["date"],
+            content=report_data["content"]
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[EODReport.date],
+            set_={"content": stmt.excluded.content}
+        )
+        
+        # Digests covering this day are rebuilt the next time they are needed. A month
+        # is built from the weeks starting in it, so its week's month is affected too
+        week = week_start(report_data["date"])
+        months = {month_start(report_data["date"]), month_start(week)}
+        invalidate = (
+            update(PeriodSummary)
+            .where(or_(
+                and_(PeriodSummary.level == "week", PeriodSummary.period_start == week),
+                and_(PeriodSummary.level == "month", PeriodSummary.period_start.in_(months))
+            ))
+            .values(stale=True)
+        )
+        
+        async with self.async_session() as session:
+            async with session.begin():
+                await session.execute(stmt)
+                await session.execute(invalidate)
+                if report_data.get("view") is not None:
+                    await session.execute(self._report_view_upsert(report_data["date"], report_data["view"]))
+        self.bump_version("eod_report")
+        
+        print(f"[DB] Upserted EOD report for {report_data['date']}")
+    
+    def _report_view_upsert(self, report_date: date, payload: Dict):
+        stmt = self.dialect_insert(ReportView).values(report_date=report_date, payload=payload)
+        return stmt.on_conflict_do_update(
+            index_elements=[ReportView.report_date],
+            set_={"payload": stmt.excluded.payload, "rendered_at": datetime.utcnow()}
+        )
+    
+    async def store_report_view(self, report_date: date, payload: Dict):
+        async with self.async_session() as session:
+            async with session.begin():
+                await session.execute(self._report_view_upsert(report_date, payload))
+        self.bump_version("eod_report")
+    
+    async def get_latest_report_view(self) -> Optional[Dict]:
+        """The /eod-report payload of the most recent report, in one indexed read"""
         async with self.async_session() as session:
-            # Check if report already exists for this date
             result = await session.execute(
-                select(EODReport).where(EODReport.date == report_data["date"])
+                select(ReportView.payload).order_by(ReportView.report_date.desc()).limit(1)
             )
-            existing = result.scalar_one_or_none()
-            
-            if existing:
-                # Update existing report
-                existing.content = report_data["content"]
-                print(f"[DB] Updated EOD report for {report_data['date']}")
-            else:
-                # Create new report
-                report = EODReport(
-                    date=report_data["date"],
-                    content=report_data["content"]
+            return result.scalar_one_or_none()
+    
+    async def get_reports_missing_views(self, limit: int = 30) -> List[Dict]:
+        """Latest reports stored without a view, with the insights of their own day"""
+        async with self.async_session() as session:
+            result = await session.execute(
+                select(EODReport.date, EODReport.content, DailySnapshot.insights)
+                .outerjoin(ReportView, ReportView.report_date == EODReport.date)
+                .outerjoin(DailySnapshot, DailySnapshot.date == EODReport.date)
+                .where(ReportView.id.is_(None))
+                .order_by(EODReport.date.desc())
+                .limit(limit)
+            )
+            return [
+                {"date": r.date, "content": r.content, "insights": r.insights or {}}
+                for r in result.all()
+            ]
+    
+    async def get_eod_reports_between(self, start: date, end: date) -> List[Dict]:
+        """EOD reports from start to end (inclusive), oldest first"""
+        async with self.async_session() as session:
+            result = await session.execute(
+                select(EODReport.date, EODReport.content)
+                .where(and_(EODReport.date >= start, EODReport.date <= end))
+                .order_by(EODReport.date)
+            )
+            return [{"date": r.date.isoformat(), "content": r.content} for r in result.all()]
+    
+    async def get_period_summaries(self, level: str, since: date) -> Dict[date, Dict]:
+        """Cached digests of a level starting on or after since, keyed by period start"""
+        async with self.async_session() as session:
+            result = await session.execute(
+                select(PeriodSummary)
+                .where(and_(PeriodSummary.level == level, PeriodSummary.period_start >= since))
+                .order_by(PeriodSummary.period_start)
+            )
+            return {
+                s.period_start: {
+                    "level": s.level,
+                    "start": s.period_start.isoformat(),
+                    "end": s.period_end.isoformat(),
+                    "content": s.content,
+                    "source_count": s.source_count,
+                    "stale": s.stale
+                }
+                for s in result.scalars().all()
+            }
+    
+    async def store_period_summary(self, level: str, start: date, end: date, content: str, source_count: int, stale: bool = False):
+        """Upsert a weekly or monthly digest; stale ones (local fallbacks) are rebuilt on next use"""
+        stmt = self.dialect_insert(PeriodSummary).values(
+            level=level,
+            period_start=start,
+            period_end=end,
+            content=content,
+            source_count=source_count,
+            stale=stale
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[PeriodSummary.level, PeriodSummary.period_start],
+            set_={
+                "period_end": stmt.excluded.period_end,
+                "content": stmt.excluded.content,
+                "source_count": stmt.excluded.source_count,
+                "stale": stmt.excluded.stale,
+                "updated_at": datetime.utcnow()
+            }
+        )
+        async with self.async_session() as session:
+            async with session.begin():
+                await session.execute(stmt)
+    
+    @staticmethod
+    def _job_dict(job: Job) -> Dict:
+        def iso(value: Optional[datetime]) -> Optional[str]:
+            return value.isoformat() if value else None
+        return {
+            "id": job.id,
+            "kind": job.kind,
+            "status": job.status,
+            "stages": job.stages or [],
+            "result": job.result,
+            "error": job.error,
+            "created_at": iso(job.created_at),
+            "started_at": iso(job.started_at),
+            "finished_at": iso(job.finished_at)
+        }
+    
+    async def create_job(self, job_id: str, kind: str, dedup_key: Optional[str] = None) -> Dict:
+        async with self.async_session() as session:
+            async with session.begin():
+                job = Job(id=job_id, kind=kind, dedup_key=dedup_key, status="queued", stages=[])
+                session.add(job)
+        return self._job_dict(job)
+    
+    async def update_job(self, job_id: str, **fields):
+        """Set job columns (status, stages, result, error, started_at, finished_at)"""
+        async with self.async_session() as session:
+            async with session.begin():
+                await session.execute(update(Job).where(Job.id == job_id).values(**fields))
+    
+    async def get_job(self, job_id: str) -> Optional[Dict]:
+        async with self.async_session() as session:
+            job = await session.get(Job, job_id)
+            return self._job_dict(job) if job else None
+    
+    async def interrupt_unfinished_jobs(self) -> int:
+        """Jobs left queued or running by a previous process can never finish"""
+        async with self.async_session() as session:
+            async with session.begin():
+                result = await session.execute(
+                    update(Job)
+                    .where(Job.status.in_(("queued", "running")))
+                    .values(status="interrupted", error="Server restarted before the job finished", finished_at=datetime.utcnow())
                 )
-                session.add(report)
-                print(f"[DB] Stored new EOD report for {report_data['date']}")
-            
-            await session.commit()
+        return result.rowcount
+    
+    async def delete_jobs_before(self, cutoff: datetime) -> int:
+        async with self.async_session() as session:
+            async with session.begin():
+                result = await session.execute(
+                    delete(Job).where(and_(Job.created_at < cutoff, Job.finished_at.isnot(None)))
+                )
+        return result.rowcount
+    
+    async def load_index_sources(self, limit: int = 5000) -> Dict[str, List[Dict]]:
+        """Most recent rows of everything the retrieval index covers"""
+        await self.chat_writer.flush()
+        async with self.async_session() as session:
+            reports = (await session.execute(
+                select(EODReport.date, EODReport.content).order_by(EODReport.date.desc()).limit(limit)
+            )).all()
+            emails = (await session.execute(
+                select(EmailCache).order_by(EmailCache.received_at.desc()).limit(limit)
+            )).scalars().all()
+            assignments = (await session.execute(
+                select(AssignmentCache).order_by(AssignmentCache.due_date.desc()).limit(limit)
+            )).scalars().all()
+            chats = (await session.execute(
+                select(ChatHistory).order_by(ChatHistory.timestamp.desc()).limit(limit)
+            )).scalars().all()
+        
+        return {
+            "eod_reports": [{"date": r.date.isoformat(), "content": r.content} for r in reports],
+            "emails": [
+                {
+                    "email_id": e.email_id,
+                    "sender": e.sender,
+                    "subject": e.subject,
+                    "snippet": e.snippet,
+                    "received_at": e.received_at
+                }
+                for e in emails
+            ],
+            "assignments": [
+                {
+                    "assignment_id": a.assignment_id,
+                    "course_name": a.course_name,
+                    "title": a.title,
+                    "description": a.description,
+                    "due_date": a.due_date
+                }
+                for a in assignments
+            ],
+            "chat": [
+                {
+                    "timestamp": c.timestamp.isoformat(),
+                    "user": c.user_query,
+                    "agent": c.agent_response,
+                    "user_id": c.user_id
+                }
+                for c in chats
+            ]
+        }
     
     async def get_latest_eod_report(self) -> Optional[Dict]:
         """Get most recent EOD report"""
@@ -91,22 +595,237 @@ class DatabaseManager:
                 }
             return None
     
+    async def _sync_item_rows(self, session: AsyncSession, model, source: str, snapshot_date: date, rows: List[Dict]):
+        """Bring a day's rows of one snapshot_* table in line with the new items: insert, update or delete per item"""
+        result = await session.execute(
+            select(model).where(model.snapshot_date == snapshot_date).order_by(model.position)
+        )
+        columns = [c.name for c in model.__table__.columns]
+        existing: Dict[str, List] = {}
+        for row in result.scalars().all():
+            existing.setdefault(item_key(source, {c: getattr(row, c) for c in columns}), []).append(row)
+        
+        inserts = []
+        for values in rows:
+            matches = existing.get(item_key(source, values))
+            if not matches:
+                inserts.append(values)
+                continue
+            row = matches.pop(0)
+            # Assigning an equal value leaves the row clean: only real changes are UPDATEd
+            for column, value in values.items():
+                setattr(row, column, value)
+        
+        stale = [row.id for matches in existing.values() for row in matches]
+        if stale:
+            await session.execute(delete(model).where(model.id.in_(stale)))
+        if inserts:
+            await session.execute(self.dialect_insert(model), inserts)
+    
     async def get_snapshot_by_date(self, target_date: date) -> Optional[Dict]:
-        """Get snapshot for specific date"""
+        """Get snapshot for specific date, with its rendered views and version"""
+        cached = self._snapshot_cache.get(target_date)
+        if cached:
+            return cached
+        
         async with self.async_session() as session:
             result = await session.execute(
-                select(DailySnapshot).where(DailySnapshot.date == target_date)
+                select(DailySnapshot, SnapshotView)
+                .outerjoin(SnapshotView, SnapshotView.snapshot_date == DailySnapshot.date)
+                .where(DailySnapshot.date == target_date)
             )
-            snapshot = result.scalar_one_or_none()
+            row = result.first()
             
-            if snapshot:
-                return {
+            if row:
+                snapshot, view = row
+                observations = snapshot.observations or {}
+                if observations.get("normalized"):
+                    observations = await self._load_observations(session, target_date, observations)
+                elif observations.get("compressed"):
+                    observations = await self._load_compressed_observations(session, target_date, observations)
+                
+                data = {
                     "date": snapshot.date.isoformat(),
-                    "observations": snapshot.observations,
-                    "insights": snapshot.insights
+                    "observations": observations,
+                    "insights": snapshot.insights,
+                    "views": view.views if view and view.views else {},
+                    "version": view.version if view else 0
                 }
+                self._cache_snapshot(target_date, data)
+                return data
+            
+            # Days past the retention window only exist in the archive
+            archived = await self.get_archived_record("snapshot", target_date, session)
+            if archived:
+                return {**archived, "views": {}, "version": 0}
             return None
     
+    async def _load_compressed_observations(self, session: AsyncSession, target_date: date, metadata: Dict) -> Dict:
+        result = await session.execute(
+            select(CompressedSnapshot).where(CompressedSnapshot.snapshot_date == target_date)
+        )
+        row = result.scalar_one_or_none()
+        observations = {k: v for k, v in metadata.items() if k != "compressed"}
+        if row:
+            observations.update(decompress_json(row.observations, row.codec))
+        return observations
+    
+    async def get_archived_record(self, kind: str, record_date: date, session: Optional[AsyncSession] = None):
+        """Decompressed payload of an archived day, or None"""
+        query = select(ArchivedRecord).where(and_(
+            ArchivedRecord.kind == kind,
+            ArchivedRecord.record_date == record_date
+        ))
+        if session is None:
+            async with self.async_session() as session:
+                result = await session.execute(query)
+        else:
+            result = await session.execute(query)
+        
+        row = result.scalar_one_or_none()
+        return decompress_json(row.payload, row.codec) if row else None
+    
+    async def _load_observations(self, session: AsyncSession, target_date: date, metadata: Dict) -> Dict:
+        """Rebuild the observations dict of a snapshot from its child tables"""
+        observations = {k: v for k, v in metadata.items() if k != "normalized"}
+        for model, key, to_dict in (
+            (SnapshotEmail, "emails", _email_dict),
+            (SnapshotAssignment, "assignments", _assignment_dict),
+            (SnapshotMeeting, "meetings", _meeting_dict)
+        ):
+            result = await session.execute(
+                select(model).where(model.snapshot_date == target_date).order_by(model.position)
+            )
+            observations[key] = [to_dict(r) for r in result.scalars().all()]
+        return observations
+    
+    async def _load_deltas(self, session: AsyncSession, target_date: date) -> List[SnapshotDelta]:
+        query = select(SnapshotDelta).where(SnapshotDelta.snapshot_date == target_date)
+        result = await session.execute(query.order_by(SnapshotDelta.seq))
+        return result.scalars().all()
+    
+    @staticmethod
+    def _check_history_kept(deltas: List[SnapshotDelta], at: datetime):
+        """Raise ValueError when `at` falls inside a span folded into the day's base"""
+        base = deltas[0] if deltas else None
+        if base and base.folded_until and base.created_at <= at < base.folded_until:
+            raise ValueError(
+                f"Snapshot history of {base.snapshot_date.isoformat()} before "
+                f"{base.folded_until.isoformat()} was compacted"
+            )
+    
+    async def get_snapshot_at(self, target_date: date, at: datetime) -> Optional[Dict]:
+        """
+        Observations of a day as they were at a point in time (naive UTC), None before
+        the first refresh. Raises ValueError inside a span that was compacted.
+        """
+        async with self.async_session() as session:
+            deltas = await self._load_deltas(session, target_date)
+        self._check_history_kept(deltas, at)
+        
+        kept = [d.delta for d in deltas if d.created_at <= at]
+        return replay(kept) if kept else None
+    
+    async def get_snapshot_changes(self, since: datetime, target_date: Optional[date] = None) -> Dict:
+        """
+        What was added, removed or changed in a day's snapshot since a point in time
+        (naive UTC). Raises ValueError inside a span that was compacted.
+        """
+        target_date = target_date or date.today()
+        async with self.async_session() as session:
+            deltas = await self._load_deltas(session, target_date)
+        self._check_history_kept(deltas, since)
+        
+        before = replay([d.delta for d in deltas if d.created_at <= since])
+        current = replay([d.delta for d in deltas])
+        delta = diff_observations(before, current)
+        
+        return {
+            "date": target_date.isoformat(),
+            "since": since.isoformat(),
+            "refreshes": sum(1 for d in deltas if d.created_at > since),
+            "summary": summarize_delta(delta),
+            "changes": delta
+        }
+    
+    async def compact_snapshot_history(self, max_deltas: int = config.SNAPSHOT_MAX_DELTAS) -> int:
+        """
+        Fold old deltas into the day's base: past days keep a single base,
+        today keeps at most max_deltas refreshes (also enforced on every store).
+        Returns the number of deltas removed.
+        """
+        removed = 0
+        async with self._snapshot_write_lock:
+            async with self.async_session() as session:
+                async with session.begin():
+                    result = await session.execute(
+                        select(SnapshotDelta.snapshot_date, func.count(SnapshotDelta.id))
+                        .group_by(SnapshotDelta.snapshot_date)
+                    )
+                    for snapshot_date, count in result.all():
+                        fold = count if snapshot_date < date.today() else count - max_deltas + 1
+                        removed += await self._fold_deltas(session, snapshot_date, fold)
+        
+        if removed:
+            print(f"[DB] Compacted snapshot history ({removed} deltas folded)")
+        return removed
+    
+    async def _fold_deltas(self, session: AsyncSession, snapshot_date: date, fold: int) -> int:
+        """Replace a day's first `fold` deltas with one base. Returns the number of deltas removed"""
+        if fold <= 1:
+            return 0
+        deltas = await self._load_deltas(session, snapshot_date)
+        folded = deltas[:fold]
+        base = replay([d.delta for d in folded])
+        
+        for d in folded[1:]:
+            await session.delete(d)
+        # Remaining deltas keep their order; the base stays at seq 0 and keeps the time of
+        # the day's first refresh. Instants up to the last folded refresh can no longer be
+        # told apart, which folded_until records so reads inside that span are refused
+        folded[0].delta = diff_observations(None, base)
+        folded[0].folded_until = folded[-1].created_at
+        return len(folded) - 1
+    
+    async def get_snapshot_counts(self, target_date: date) -> Dict[str, int]:
+        """Item counts of a snapshot, computed in SQL"""
+        async with self.async_session() as session:
+            counts = {}
+            for model, key in ((SnapshotEmail, "emails"), (SnapshotAssignment, "assignments"), (SnapshotMeeting, "meetings")):
+                result = await session.execute(
+                    select(func.count(model.id)).where(model.snapshot_date == target_date)
+                )
+                counts[key] = result.scalar_one()
+            
+            result = await session.execute(
+                select(func.count(SnapshotEmail.id)).where(and_(
+                    SnapshotEmail.snapshot_date == target_date,
+                    SnapshotEmail.is_unread.is_(True)
+                ))
+            )
+            counts["unread_emails"] = result.scalar_one()
+            return counts
+    
+    async def get_assignments_due_within(self, days: int, target_date: Optional[date] = None, include_overdue: bool = False) -> List[Dict]:
+        """Assignments of a snapshot due between now (or any time before, with include_overdue) and N days from now, soonest first"""
+        target_date = target_date or date.today()
+        now = datetime.utcnow()
+        
+        conditions = [
+            SnapshotAssignment.snapshot_date == target_date,
+            SnapshotAssignment.due_at <= now + timedelta(days=days)
+        ]
+        if not include_overdue:
+            conditions.append(SnapshotAssignment.due_at >= now)
+        
+        async with self.async_session() as session:
+            result = await session.execute(
+                select(SnapshotAssignment)
+                .where(and_(*conditions))
+                .order_by(SnapshotAssignment.due_at)
+            )
+            return [_assignment_dict(r) for r in result.scalars().all()]
+    
     async def get_recent_summaries(self, days: int = 7) -> List[Dict]:
         """Get EOD summaries for past N days"""
         end_date = date.today()
@@ -131,43 +850,337 @@ class DatabaseManager:
                 for r in reports
             ]
     
-    async def store_chat_turn(self, user_query: str, agent_response: str):
+    async def store_chat_turn(self, user_query: str, agent_response: str, user_id: str = config.DEFAULT_USER_ID):
         """Store chat interaction"""
         async with self.async_session() as session:
             chat = ChatHistory(
                 user_query=user_query,
-                agent_response=agent_response
+                agent_response=agent_response,
+                user_id=user_id
             )
             session.add(chat)
             await session.commit()
+        self.bump_version("chat_history")
+    
+    async def queue_chat_turn(self, user_query: str, agent_response: str, user_id: str = config.DEFAULT_USER_ID) -> datetime:
+        """Store chat interaction through the write-behind queue. Returns its timestamp"""
+        turn = {
+            "timestamp": datetime.utcnow(),
+            "user_query": user_query,
+            "agent_response": agent_response,
+            "user_id": user_id
+        }
+        await self.chat_writer.put(turn)
+        # Pages include queued turns, so they change now rather than when written
+        self.bump_version("chat_history")
+        return turn["timestamp"]
+    
+    async def store_chat_turns(self, turns: List[Dict]):
+        """Insert a batch of chat turns in one statement"""
+        if not turns:
+            return
+        async with self.async_session() as session:
+            async with session.begin():
+                await session.execute(insert(ChatHistory), turns)
     
-    async def get_recent_chat_history(self, limit: int = 10) -> List[Dict]:
-        """Get recent chat history"""
+    async def get_recent_chat_history(self, limit: int = 10, user_id: Optional[str] = None) -> List[Dict]:
+        """Get recent chat history (of one user if given), including turns not yet written (id None)"""
+        pending = self._pending_turns(user_id)
         async with self.async_session() as session:
             result = await session.execute(
-                select(ChatHistory)
-                .order_by(ChatHistory.timestamp.desc())
+                self._for_user(select(ChatHistory), user_id)
+                .order_by(ChatHistory.timestamp.desc(), ChatHistory.id.desc())
                 .limit(limit)
             )
             chats = result.scalars().all()
             
-            return [
+            history = [
                 {
+                    "id": c.id,
                     "timestamp": c.timestamp.isoformat(),
                     "user": c.user_query,
                     "agent": c.agent_response
                 }
                 for c in reversed(chats)  # Reverse to show oldest first
             ]
+            written = {c.timestamp for c in chats}
+        
+        history += [
+            {
+                "id": None,
+                "timestamp": t["timestamp"].isoformat(),
+                "user": t["user_query"],
+                "agent": t["agent_response"]
+            }
+            for t in pending
+            if t["timestamp"] not in written
+        ]
+        return history[-limit:]
+    
+    @staticmethod
+    def _for_user(query, user_id: Optional[str]):
+        return query.where(ChatHistory.user_id == user_id) if user_id else query
+    
+    def _pending_turns(self, user_id: Optional[str]) -> List[Dict]:
+        # Taken before reading the table: a turn committed in between is then listed
+        # twice (deduplicated by timestamp) rather than not at all
+        return [t for t in self.chat_writer.pending() if not user_id or t.get("user_id") == user_id]
+    
+    async def get_chat_history_page(
+        self,
+        limit: int = config.CHAT_HISTORY_PAGE_SIZE,
+        before: Optional[str] = None,
+        after: Optional[str] = None,
+        fields: Optional[List[str]] = None,
+        user_id: Optional[str] = None
+    ) -> Dict:
+        """
+        One page of chat turns (oldest first, of one user if given) using keyset pagination on (timestamp, id).
+        Without cursors the latest page is returned; `before` pages back in time,
+        `after` pages forward. `fields` limits the columns loaded per turn.
+        """
+        if before and after:
+            raise ValueError("Use either 'before' or 'after', not both")
+        await self.chat_writer.flush()
+        
+        fields = fields or list(CHAT_HISTORY_FIELDS)
+        unknown = [f for f in fields if f not in CHAT_HISTORY_FIELDS]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+        
+        limit = max(1, min(limit, config.CHAT_HISTORY_MAX_PAGE_SIZE))
+        columns = [ChatHistory.id, ChatHistory.timestamp] + [
+            CHAT_HISTORY_FIELDS[f] for f in fields if f not in ("id", "timestamp")
+        ]
+        query = self._for_user(select(*columns), user_id)
+        
+        if after:
+            ts, chat_id = decode_chat_cursor(after)
+            query = query.where(or_(
+                ChatHistory.timestamp > ts,
+                and_(ChatHistory.timestamp == ts, ChatHistory.id > chat_id)
+            )).order_by(ChatHistory.timestamp.asc(), ChatHistory.id.asc())
+        else:
+            if before:
+                ts, chat_id = decode_chat_cursor(before)
+                query = query.where(or_(
+                    ChatHistory.timestamp < ts,
+                    and_(ChatHistory.timestamp == ts, ChatHistory.id < chat_id)
+                ))
+            query = query.order_by(ChatHistory.timestamp.desc(), ChatHistory.id.desc())
+        
+        # One extra row tells whether another page exists
+        async with self.async_session() as session:
+            result = await session.execute(query.limit(limit + 1))
+            rows = result.all()
+        
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if not after:
+            rows.reverse()
+        
+        turns = []
+        for row in rows:
+            turn = {}
+            for f in fields:
+                value = getattr(row, CHAT_HISTORY_FIELDS[f].key)
+                turn[f] = value.isoformat() if f == "timestamp" else value
+            turns.append(turn)
+        
+        first, last = (rows[0], rows[-1]) if rows else (None, None)
+        return {
+            "turns": turns,
+            "before": encode_chat_cursor(first.timestamp, first.id) if first and (after or has_more) else None,
+            "after": encode_chat_cursor(last.timestamp, last.id) if last else after,
+            "has_more": has_more
+        }
+    
+    async def get_recent_user_queries(self, limit: int = 5, user_id: Optional[str] = None) -> List[str]:
+        """Get only the user side of the most recent turns (oldest first)"""
+        pending = self._pending_turns(user_id)
+        async with self.async_session() as session:
+            result = await session.execute(
+                self._for_user(select(ChatHistory.timestamp, ChatHistory.user_query), user_id)
+                .order_by(ChatHistory.timestamp.desc(), ChatHistory.id.desc())
+                .limit(limit)
+            )
+            rows = list(reversed(result.all()))
+        queries = [q or "" for _, q in rows]
+        
+        # Turns still waiting in the write-behind queue are the most recent ones
+        written = {ts for ts, _ in rows}
+        queries += [t["user_query"] or "" for t in pending if t["timestamp"] not in written]
+        return queries[-limit:]
+    
+    async def get_chat_turns_after(self, chat_id: int, limit: int = 50, user_id: Optional[str] = None) -> List[Dict]:
+        """Get chat turns newer than chat_id (oldest first)"""
+        async with self.async_session() as session:
+            result = await session.execute(
+                self._for_user(select(ChatHistory), user_id)
+                .where(ChatHistory.id > chat_id)
+                .order_by(ChatHistory.id.asc())
+                .limit(limit)
+            )
+            return [
+                {
+                    "id": c.id,
+                    "timestamp": c.timestamp.isoformat(),
+                    "user": c.user_query,
+                    "agent": c.agent_response
+                }
+                for c in result.scalars().all()
+            ]
+    
+    async def count_chat_turns_after(self, chat_id: int, user_id: Optional[str] = None) -> int:
+        """Count chat turns not yet folded into the conversation summary"""
+        async with self.async_session() as session:
+            result = await session.execute(
+                self._for_user(select(func.count(ChatHistory.id)), user_id).where(ChatHistory.id > chat_id)
+            )
+            return result.scalar_one()
+    
+    async def get_conversation_summary(self, user_id: str = config.DEFAULT_USER_ID) -> Optional[Dict]:
+        """Get a user's rolling conversation summary"""
+        async with self.async_session() as session:
+            result = await session.execute(
+                select(ConversationSummary).where(ConversationSummary.user_id == user_id)
+            )
+            summary = result.scalar_one_or_none()
+            
+            if summary:
+                return {
+                    "content": summary.content,
+                    "last_chat_id": summary.last_chat_id,
+                    "turn_count": summary.turn_count,
+                    "updated_at": summary.updated_at.isoformat() if summary.updated_at else None
+                }
+            return None
+    
+    async def store_conversation_summary(self, content: str, last_chat_id: int, turn_count: int, user_id: str = config.DEFAULT_USER_ID):
+        """Store or update a user's rolling conversation summary"""
+        async with self.async_session() as session:
+            result = await session.execute(
+                select(ConversationSummary).where(ConversationSummary.user_id == user_id)
+            )
+            existing = result.scalar_one_or_none()
+            
+            if existing:
+                existing.content = content
+                existing.last_chat_id = last_chat_id
+                existing.turn_count = turn_count
+            else:
+                session.add(ConversationSummary(
+                    user_id=user_id,
+                    content=content,
+                    last_chat_id=last_chat_id,
+                    turn_count=turn_count
+                ))
+            
+            await session.commit()
+            print(f"[DB] Conversation summary of '{user_id}' updated through turn {last_chat_id}")
+    
+    async def upsert_email_cache(self, rows: List[Dict]) -> int:
+        """Bulk upsert fetched emails into email_cache (one executemany statement)"""
+        # Deduplicate on email_id, last occurrence wins
+        rows = list({r["email_id"]: r for r in rows}.values())
+        if not rows:
+            return 0
+        
+        stmt = self.dialect_insert(EmailCache)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[EmailCache.email_id],
+            set_={
+                "sender": stmt.excluded.sender,
+                "subject": stmt.excluded.subject,
+                "snippet": stmt.excluded.snippet,
+                "received_at": stmt.excluded.received_at,
+                "labels": stmt.excluded.labels,
+                "stored_at": datetime.utcnow()
+            }
+        )
+        
+        async with self.async_session() as session:
+            async with session.begin():
+                await session.execute(stmt, rows)
+        return len(rows)
+    
+    async def upsert_assignment_cache(self, rows: List[Dict]) -> int:
+        """Bulk upsert fetched assignments into assignment_cache (one executemany statement)"""
+        # Deduplicate on assignment_id, last occurrence wins
+        rows = list({r["assignment_id"]: r for r in rows}.values())
+        if not rows:
+            return 0
+        
+        stmt = self.dialect_insert(AssignmentCache)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[AssignmentCache.assignment_id],
+            set_={
+                "course_name": stmt.excluded.course_name,
+                "title": stmt.excluded.title,
+                "description": stmt.excluded.description,
+                "due_date": stmt.excluded.due_date,
+                "status": stmt.excluded.status,
+                "points_possible": stmt.excluded.points_possible,
+                "stored_at": datetime.utcnow()
+            }
+        )
+        
+        async with self.async_session() as session:
+            async with session.begin():
+                await session.execute(stmt, rows)
+        return len(rows)
+    
+    @staticmethod
+    def _fts_query(keywords: List[str]) -> str:
+        """Turn keywords into an FTS5 prefix query: "term"* OR "other"*"""
+        terms = []
+        for keyword in keywords:
+            for token in re.findall(r"\w+", keyword.lower()):
+                terms.append(f'"{token}"*')
+        return " OR ".join(terms)
     
     async def search_emails(self, keywords: List[str], limit: int = 5) -> List[Dict]:
+        """Keyword search in cached emails, BM25-ranked with prefix matching"""
+        match = self._fts_query(keywords)
+        if not match:
+            return []
+        
+        if not self.fts_enabled:
+            return await self._search_emails_like(keywords, limit)
+        
+        async with self.async_session() as session:
+            # Subject matches weigh most, then sender, then snippet
+            result = await session.execute(
+                select(EmailCache).from_statement(text(
+                    "SELECT email_cache.* FROM email_cache_fts "
+                    "JOIN email_cache ON email_cache.id = email_cache_fts.rowid "
+                    "WHERE email_cache_fts MATCH :match "
+                    "ORDER BY bm25(email_cache_fts, 2.0, 3.0, 1.0), email_cache.received_at DESC "
+                    "LIMIT :limit"
+                )),
+                {"match": match, "limit": limit}
+            )
+            emails = result.scalars().all()
+            
+            return [
+                {
+                    "sender": e.sender,
+                    "subject": e.subject,
+                    "snippet": e.snippet[:200],
+                    "received": e.received_at.isoformat()
+                }
+                for e in emails
+            ]
+    
+    async def _search_emails_like(self, keywords: List[str], limit: int = 5) -> List[Dict]:
         """Simple keyword search in cached emails"""
         async with self.async_session() as session:
             # Build search conditions
             conditions = []
             for keyword in keywords:
-                conditions.append(EmailCache.subject.contains(keyword))
-                conditions.append(EmailCache.snippet.contains(keyword))
+                # Case-insensitive on every backend (LIKE is case-sensitive on PostgreSQL)
+                conditions.append(EmailCache.subject.icontains(keyword))
+                conditions.append(EmailCache.snippet.icontains(keyword))
             
             result = await session.execute(
                 select(EmailCache)
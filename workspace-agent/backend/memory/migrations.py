@@ -0,0 +1,299 @@
+from datetime import datetime
+from typing import Callable, List, Tuple
+
+from sqlalchemy import (
+    Boolean, Column, Date, DateTime, Index, Integer, JSON, LargeBinary, MetaData, String, Table, Text,
+    select, text
+)
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from .models import SchemaMigration
+
+# Arbitrary key for the PostgreSQL advisory lock held while migrating,
+# so several app instances starting together do not race each other
+MIGRATION_LOCK_ID = 720431
+
+# Tables as each migration introduced them. Frozen copies, not the models:
+# later model changes must come with a new migration, never an edit here.
+_JSON = JSON().with_variant(JSONB(), "postgresql")
+
+def _v1_tables(metadata: MetaData):
+    Table(
+        "daily_snapshots", metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("date", Date, unique=True, index=True),
+        Column("observations", _JSON),
+        Column("insights", _JSON),
+        Column("created_at", DateTime)
+    )
+    Table(
+        "snapshot_emails", metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("snapshot_date", Date, nullable=False),
+        Column("position", Integer),
+        Column("sender", String, index=True),
+        Column("subject", String),
+        Column("snippet", Text),
+        Column("received", String),
+        Column("received_at", DateTime, index=True),
+        Column("is_unread", Boolean),
+        Column("urgency_score", Integer),
+        Index("ix_snapshot_emails_date_unread", "snapshot_date", "is_unread")
+    )
+    Table(
+        "snapshot_assignments", metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("snapshot_date", Date, nullable=False),
+        Column("position", Integer),
+        Column("course", String),
+        Column("title", String),
+        Column("due", String),
+        Column("due_at", DateTime),
+        Column("status", String),
+        Column("points", Integer),
+        Column("urgency_score", Integer),
+        Index("ix_snapshot_assignments_date_due", "snapshot_date", "due_at")
+    )
+    Table(
+        "snapshot_meetings", metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("snapshot_date", Date, nullable=False),
+        Column("position", Integer),
+        Column("title", String),
+        Column("start", String),
+        Column("start_at", DateTime),
+        Column("duration_minutes", Integer),
+        Column("attendees_count", Integer),
+        Column("urgency_score", Integer),
+        Index("ix_snapshot_meetings_date_start", "snapshot_date", "start_at")
+    )
+    Table(
+        "snapshot_deltas", metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("snapshot_date", Date, nullable=False),
+        Column("seq", Integer, nullable=False),
+        Column("delta", _JSON),
+        Column("created_at", DateTime),
+        Index("ix_snapshot_deltas_date_seq", "snapshot_date", "seq", unique=True)
+    )
+    Table(
+        "compressed_snapshots", metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("snapshot_date", Date, unique=True, index=True),
+        Column("codec", String),
+        Column("observations", LargeBinary),
+        Column("compressed_at", DateTime)
+    )
+    Table(
+        "archived_records", metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("kind", String, nullable=False),
+        Column("record_date", Date, nullable=False),
+        Column("codec", String),
+        Column("payload", LargeBinary),
+        Column("archived_at", DateTime),
+        Index("ix_archived_records_kind_date", "kind", "record_date", unique=True)
+    )
+    Table(
+        "snapshot_views", metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("snapshot_date", Date, unique=True, index=True),
+        Column("version", Integer),
+        Column("views", _JSON),
+        Column("rendered_at", DateTime)
+    )
+    Table(
+        "eod_reports", metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("date", Date, unique=True, index=True),
+        Column("content", Text),
+        Column("created_at", DateTime)
+    )
+    Table(
+        "chat_history", metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("timestamp", DateTime, index=True),
+        Column("user_query", Text),
+        Column("agent_response", Text)
+    )
+    Table(
+        "conversation_summaries", metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("content", Text),
+        Column("last_chat_id", Integer),
+        Column("turn_count", Integer),
+        Column("updated_at", DateTime)
+    )
+    Table(
+        "email_cache", metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("email_id", String, unique=True, index=True),
+        Column("sender", String),
+        Column("subject", String),
+        Column("snippet", Text),
+        Column("received_at", DateTime),
+        Column("labels", _JSON),
+        Column("stored_at", DateTime)
+    )
+    Table(
+        "assignment_cache", metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("assignment_id", String, unique=True, index=True),
+        Column("course_name", String),
+        Column("title", String),
+        Column("description", Text),
+        Column("due_date", DateTime, index=True),
+        Column("status", String),
+        Column("points_possible", Integer),
+        Column("stored_at", DateTime)
+    )
+
+# JSON columns of the schema that predates migrations (JSONB on PostgreSQL since v1)
+PRE_MIGRATION_JSON_COLUMNS = (
+    ("daily_snapshots", "observations"),
+    ("daily_snapshots", "insights"),
+    ("email_cache", "labels")
+)
+
+def _create(conn: Connection, define: Callable[[MetaData], None]):
+    metadata = MetaData()
+    define(metadata)
+    # checkfirst: databases from before migrations may already have some of these
+    metadata.create_all(conn, checkfirst=True)
+
+def _initial_schema(conn: Connection):
+    """Tables of schema v1; existing ones (databases from before migrations) are left as they are"""
+    _create(conn, _v1_tables)
+
+def _missing_indexes(conn: Connection):
+    """Indexes on tables that predate them (pre-migration databases may already have them)"""
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_chat_history_timestamp_id ON chat_history (timestamp, id)"))
+    if conn.dialect.name == "postgresql":
+        # Pre-migration databases have plain json here, which GIN cannot index
+        for table, column in PRE_MIGRATION_JSON_COLUMNS:
+            data_type = conn.scalar(text(
+                "SELECT data_type FROM information_schema.columns "
+                "WHERE table_schema = current_schema() AND table_name = :table AND column_name = :column"
+            ), {"table": table, "column": column})
+            if data_type == "json":
+                conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN {column} TYPE JSONB USING {column}::jsonb"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_daily_snapshots_observations_gin ON daily_snapshots USING gin (observations)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_daily_snapshots_insights_gin ON daily_snapshots USING gin (insights)"))
+
+def _period_summaries(conn: Connection):
+    _create(conn, lambda metadata: Table(
+        "period_summaries", metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("level", String, nullable=False),
+        Column("period_start", Date, nullable=False),
+        Column("period_end", Date, nullable=False),
+        Column("content", Text),
+        Column("source_count", Integer),
+        Column("stale", Boolean),
+        Column("updated_at", DateTime),
+        Index("ix_period_summaries_level_start", "level", "period_start", unique=True)
+    ))
+
+def _jobs(conn: Connection):
+    _create(conn, lambda metadata: Table(
+        "jobs", metadata,
+        Column("id", String, primary_key=True),
+        Column("kind", String, nullable=False),
+        Column("dedup_key", String, index=True),
+        Column("status", String, nullable=False),
+        Column("stages", _JSON),
+        Column("result", _JSON),
+        Column("error", Text),
+        Column("created_at", DateTime, index=True),
+        Column("started_at", DateTime),
+        Column("finished_at", DateTime)
+    ))
+
+def _report_views(conn: Connection):
+    _create(conn, lambda metadata: Table(
+        "report_views", metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("report_date", Date, unique=True, index=True),
+        Column("payload", _JSON),
+        Column("rendered_at", DateTime)
+    ))
+
+def _per_user_chat(conn: Connection):
+    """Chat turns and conversation summaries keyed by user; existing ones go to the default user"""
+    conn.execute(text("ALTER TABLE chat_history ADD COLUMN user_id VARCHAR"))
+    conn.execute(text("UPDATE chat_history SET user_id = 'default'"))
+    conn.execute(text("CREATE INDEX ix_chat_history_user_id_id ON chat_history (user_id, id)"))
+
+    # There was a single summary row; keep only the newest if there are more
+    conn.execute(text("DELETE FROM conversation_summaries WHERE id < (SELECT MAX(id) FROM conversation_summaries)"))
+    conn.execute(text("ALTER TABLE conversation_summaries ADD COLUMN user_id VARCHAR"))
+    conn.execute(text("UPDATE conversation_summaries SET user_id = 'default'"))
+    conn.execute(text("CREATE UNIQUE INDEX ix_conversation_summaries_user_id ON conversation_summaries (user_id)"))
+
+def _per_user_chat_keyset(conn: Connection):
+    """Per-user chat reads filter on user_id and walk (timestamp, id): index them in that order"""
+    conn.execute(text("DROP INDEX IF EXISTS ix_chat_history_user_id_id"))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_chat_history_user_id_timestamp_id ON chat_history (user_id, timestamp, id)"
+    ))
+
+def _snapshot_fold_time(conn: Connection):
+    """Folded bases record the last refresh they absorbed"""
+    column_type = DateTime().compile(dialect=conn.dialect)
+    conn.execute(text(f"ALTER TABLE snapshot_deltas ADD COLUMN folded_until {column_type}"))
+
+# Append only: never edit or reorder a migration that has shipped. Each one
+# creates exactly what it introduces; changes to existing tables are explicit
+# (ALTER TABLE ...) since create_all never touches a table that exists.
+MIGRATIONS: List[Tuple[int, str, Callable[[Connection], None]]] = [
+    (1, "Initial schema", _initial_schema),
+    (2, "Indexes on existing tables (chat keyset, JSONB GIN)", _missing_indexes),
+    (3, "Weekly and monthly summary cache", _period_summaries),
+    (4, "Background jobs", _jobs),
+    (5, "EOD report read model", _report_views),
+    (6, "Per-user chat history and conversation summaries", _per_user_chat),
+    (7, "Per-user chat keyset index", _per_user_chat_keyset),
+    (8, "Fold time of compacted snapshot history", _snapshot_fold_time),
+]
+
+async def current_version(engine: AsyncEngine) -> int:
+    async with engine.begin() as conn:
+        if engine.dialect.name == "postgresql":
+            # Instances starting together would race to create the table
+            await conn.execute(text(f"SELECT pg_advisory_xact_lock({MIGRATION_LOCK_ID})"))
+        await conn.run_sync(lambda c: SchemaMigration.__table__.create(c, checkfirst=True))
+        result = await conn.execute(select(SchemaMigration.version).order_by(SchemaMigration.version.desc()).limit(1))
+        return result.scalar() or 0
+
+async def run_migrations(engine: AsyncEngine) -> int:
+    """Apply pending migrations in order, one transaction each. Returns the schema version"""
+    version = await current_version(engine)
+
+    for number, description, upgrade in MIGRATIONS:
+        if number <= version:
+            continue
+
+        async with engine.begin() as conn:
+            if engine.dialect.name == "postgresql":
+                await conn.execute(text(f"SELECT pg_advisory_xact_lock({MIGRATION_LOCK_ID})"))
+                # Another instance may have applied it while we waited for the lock
+                applied = await conn.scalar(
+                    select(SchemaMigration.version).where(SchemaMigration.version == number)
+                )
+                if applied:
+                    version = number
+                    continue
+
+            await conn.run_sync(upgrade)
+            await conn.execute(SchemaMigration.__table__.insert().values(
+                version=number,
+                description=description,
+                applied_at=datetime.utcnow()
+            ))
+
+        version = number
+        print(f"[DB] Applied migration {number}: {description}")
+
+    return version
@@ -1,17 +1,133 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, JSON, Date
+from sqlalchemy import Column, Integer, String, DateTime, Text, JSON, Date, Boolean, Index, LargeBinary
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.ext.declarative import declarative_base
 from datetime import datetime
 
 Base = declarative_base()
 
+# JSON text on SQLite, binary JSONB (indexable with GIN) on PostgreSQL
+JSONType = JSON().with_variant(JSONB(), "postgresql")
+
+class SchemaMigration(Base):
+    __tablename__ = "schema_migrations"
+    
+    version = Column(Integer, primary_key=True)
+    description = Column(String)
+    applied_at = Column(DateTime, default=datetime.utcnow)
+
 class DailySnapshot(Base):
     __tablename__ = "daily_snapshots"
     
     id = Column(Integer, primary_key=True, index=True)
     date = Column(Date, unique=True, index=True)
-    observations = Column(JSON)  # Stores emails, assignments, meetings
-    insights = Column(JSON)  # Stores Gemini's analysis
+    observations = Column(JSONType)  # Observation metadata; items live in snapshot_* tables (older rows: full blob)
+    insights = Column(JSONType)  # Stores Gemini's analysis
+    created_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        # Containment queries (observations @> '{...}') on PostgreSQL
+        Index("ix_daily_snapshots_observations_gin", "observations", postgresql_using="gin").ddl_if(dialect="postgresql"),
+        Index("ix_daily_snapshots_insights_gin", "insights", postgresql_using="gin").ddl_if(dialect="postgresql"),
+    )
+
+class SnapshotEmail(Base):
+    __tablename__ = "snapshot_emails"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    snapshot_date = Column(Date, nullable=False)
+    position = Column(Integer)  # Order within the snapshot
+    sender = Column(String, index=True)
+    subject = Column(String)
+    snippet = Column(Text)
+    received = Column(String)  # Original timestamp string
+    received_at = Column(DateTime, index=True)  # Naive UTC
+    is_unread = Column(Boolean)
+    urgency_score = Column(Integer)
+    
+    __table_args__ = (
+        Index("ix_snapshot_emails_date_unread", "snapshot_date", "is_unread"),
+    )
+
+class SnapshotAssignment(Base):
+    __tablename__ = "snapshot_assignments"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    snapshot_date = Column(Date, nullable=False)
+    position = Column(Integer)
+    course = Column(String)
+    title = Column(String)
+    due = Column(String)  # Original timestamp string
+    due_at = Column(DateTime)  # Naive UTC
+    status = Column(String)
+    points = Column(Integer)
+    urgency_score = Column(Integer)
+    
+    __table_args__ = (
+        Index("ix_snapshot_assignments_date_due", "snapshot_date", "due_at"),
+    )
+
+class SnapshotMeeting(Base):
+    __tablename__ = "snapshot_meetings"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    snapshot_date = Column(Date, nullable=False)
+    position = Column(Integer)
+    title = Column(String)
+    start = Column(String)  # Original timestamp string
+    start_at = Column(DateTime)  # Naive UTC
+    duration_minutes = Column(Integer)
+    attendees_count = Column(Integer)
+    urgency_score = Column(Integer)
+    
+    __table_args__ = (
+        Index("ix_snapshot_meetings_date_start", "snapshot_date", "start_at"),
+    )
+
+class SnapshotDelta(Base):
+    __tablename__ = "snapshot_deltas"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    snapshot_date = Column(Date, nullable=False)
+    seq = Column(Integer, nullable=False)  # 0 = base of the day, then one per refresh
+    delta = Column(JSONType)  # Added, removed and changed items per source
     created_at = Column(DateTime, default=datetime.utcnow)
+    folded_until = Column(DateTime)  # Base only: last refresh folded into it, earlier instants are gone
+    
+    __table_args__ = (
+        Index("ix_snapshot_deltas_date_seq", "snapshot_date", "seq", unique=True),
+    )
+
+class CompressedSnapshot(Base):
+    __tablename__ = "compressed_snapshots"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    snapshot_date = Column(Date, unique=True, index=True)
+    codec = Column(String)  # "zlib" or "zstd"
+    observations = Column(LargeBinary)  # Compressed observations JSON, replaces the snapshot_* rows
+    compressed_at = Column(DateTime, default=datetime.utcnow)
+
+class ArchivedRecord(Base):
+    __tablename__ = "archived_records"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    kind = Column(String, nullable=False)  # "snapshot", "eod_report" or "chat"
+    record_date = Column(Date, nullable=False)
+    codec = Column(String)
+    payload = Column(LargeBinary)  # Compressed JSON of everything stored for that day
+    archived_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index("ix_archived_records_kind_date", "kind", "record_date", unique=True),
+    )
+
+class SnapshotView(Base):
+    __tablename__ = "snapshot_views"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    snapshot_date = Column(Date, unique=True, index=True)
+    version = Column(Integer, default=1)  # Bumped on every snapshot write
+    views = Column(JSONType)  # Pre-rendered chat answers and dashboard payload
+    rendered_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 class EODReport(Base):
     __tablename__ = "eod_reports"
@@ -21,6 +137,44 @@ class EODReport(Base):
     content = Column(Text)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+class ReportView(Base):
+    __tablename__ = "report_views"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    report_date = Column(Date, unique=True, index=True)
+    payload = Column(JSONType)  # /eod-report response: content, highlights, urgent items and stats
+    rendered_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+class PeriodSummary(Base):
+    __tablename__ = "period_summaries"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    level = Column(String, nullable=False)  # "week" (from EOD reports) or "month" (from weekly digests)
+    period_start = Column(Date, nullable=False)
+    period_end = Column(Date, nullable=False)
+    content = Column(Text)
+    source_count = Column(Integer, default=0)  # Reports or digests it was built from
+    stale = Column(Boolean, default=False)  # Set when a day inside the period changes
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    __table_args__ = (
+        Index("ix_period_summaries_level_start", "level", "period_start", unique=True),
+    )
+
+class Job(Base):
+    __tablename__ = "jobs"
+    
+    id = Column(String, primary_key=True)  # Random hex, returned to the client
+    kind = Column(String, nullable=False)  # e.g. "observation_cycle"
+    dedup_key = Column(String, index=True)  # Submissions with the same key share one active job
+    status = Column(String, nullable=False, default="queued")  # queued, running, succeeded, failed, interrupted
+    stages = Column(JSONType)  # [{"name", "status", "started_at", "finished_at", "duration_ms"}]
+    result = Column(JSONType)
+    error = Column(Text)
+    created_at = Column(DateTime, default=datetime.utcnow, index=True)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
 class ChatHistory(Base):
     __tablename__ = "chat_history"
     
@@ -28,6 +182,22 @@ class ChatHistory(Base):
     timestamp = Column(DateTime, default=datetime.utcnow, index=True)
     user_query = Column(Text)
     agent_response = Column(Text)
+    user_id = Column(String)  # Session identity the turn belongs to
+    
+    __table_args__ = (
+        Index("ix_chat_history_timestamp_id", "timestamp", "id"),  # Keyset pagination
+        Index("ix_chat_history_user_id_timestamp_id", "user_id", "timestamp", "id"),  # Per-user keyset pagination
+    )
+
+class ConversationSummary(Base):
+    __tablename__ = "conversation_summaries"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    content = Column(Text)  # Rolling summary of older chat turns
+    last_chat_id = Column(Integer, default=0)  # Last ChatHistory.id folded into the summary
+    turn_count = Column(Integer, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    user_id = Column(String, unique=True, index=True)  # One summary per session identity
 
 class EmailCache(Base):
     __tablename__ = "email_cache"
@@ -38,9 +208,32 @@ class EmailCache(Base):
     subject = Column(String)
     snippet = Column(Text)
     received_at = Column(DateTime)
-    labels = Column(JSON)
+    labels = Column(JSONType)
     stored_at = Column(DateTime, default=datetime.utcnow)
 
+# SQLite FTS5 index over email_cache, kept in sync by triggers (external content table)
+EMAIL_CACHE_FTS_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS email_cache_fts USING fts5(
+        sender, subject, snippet,
+        content='email_cache', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS email_cache_fts_ai AFTER INSERT ON email_cache BEGIN
+        INSERT INTO email_cache_fts(rowid, sender, subject, snippet)
+        VALUES (new.id, new.sender, new.subject, new.snippet);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS email_cache_fts_ad AFTER DELETE ON email_cache BEGIN
+        INSERT INTO email_cache_fts(email_cache_fts, rowid, sender, subject, snippet)
+        VALUES ('delete', old.id, old.sender, old.subject, old.snippet);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS email_cache_fts_au AFTER UPDATE ON email_cache BEGIN
+        INSERT INTO email_cache_fts(email_cache_fts, rowid, sender, subject, snippet)
+        VALUES ('delete', old.id, old.sender, old.subject, old.snippet);
+        INSERT INTO email_cache_fts(rowid, sender, subject, snippet)
+        VALUES (new.id, new.sender, new.subject, new.snippet);
+    END"""
+]
+
 class AssignmentCache(Base):
     __tablename__ = "assignment_cache"
     
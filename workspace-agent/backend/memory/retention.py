@@ -0,0 +1,247 @@
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, Optional
+import asyncio
+
+from sqlalchemy import select, delete, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .models import (
+    DailySnapshot, SnapshotView, SnapshotEmail, SnapshotAssignment, SnapshotMeeting, SnapshotDelta,
+    CompressedSnapshot, ArchivedRecord, EODReport, ReportView, ChatHistory
+)
+from .compression import resolve_codec, compress_json, decompress_json
+from config import config
+
+OBSERVATION_SOURCES = ("emails", "assignments", "meetings")
+SNAPSHOT_DETAIL_MODELS = (SnapshotEmail, SnapshotAssignment, SnapshotMeeting, SnapshotDelta, SnapshotView)
+CHAT_ARCHIVE_BATCH = 5000
+
+class RetentionManager:
+    """
+    Keeps the hot tables bounded:
+    - snapshots older than detail_days lose their per-item rows, deltas and
+      views; the observations are kept as one compressed blob
+    - snapshots, EOD reports and chat turns older than archive_days move
+      to archived_records, one compressed row per kind and day
+    - archived reports and chat turns are dropped from the retrieval index,
+      so they stop being offered as related history
+    - freed pages are returned with incremental vacuum
+    """
+
+    def __init__(
+        self,
+        db,
+        detail_days: int = config.RETENTION_DETAIL_DAYS,
+        archive_days: int = config.RETENTION_ARCHIVE_DAYS,
+        codec: str = config.RETENTION_CODEC,
+        vacuum_pages: int = config.RETENTION_VACUUM_PAGES,
+        retriever=None
+    ):
+        self.db = db
+        self.retriever = retriever
+        self.detail_days = detail_days
+        self.archive_days = max(archive_days, detail_days)
+        self.codec = resolve_codec(codec)
+        self.vacuum_pages = vacuum_pages
+
+    async def run(self, today: Optional[date] = None) -> Dict[str, int]:
+        """Apply all policies once. Returns what was done"""
+        today = today or date.today()
+        detail_cutoff = today - timedelta(days=self.detail_days)
+        archive_cutoff = today - timedelta(days=self.archive_days)
+
+        stats = {
+            "snapshots_archived": await self._archive_snapshots(archive_cutoff),
+            "snapshots_compressed": await self._compress_snapshots(detail_cutoff),
+            "eod_reports_archived": await self._archive_eod_reports(archive_cutoff),
+            "chat_turns_archived": await self._archive_chat(archive_cutoff)
+        }
+        stats["documents_unindexed"] = await self._unindex(archive_cutoff)
+        stats["pages_freed"] = await self.vacuum()
+        
+        if stats["eod_reports_archived"]:
+            self.db.bump_version("eod_report")
+        if stats["chat_turns_archived"]:
+            self.db.bump_version("chat_history")
+
+        print(f"[DB] Retention applied: {stats}")
+        return stats
+
+    async def _full_observations(self, session: AsyncSession, snapshot: DailySnapshot) -> Dict:
+        """Observations of a snapshot in whichever form they are stored"""
+        observations = snapshot.observations or {}
+        if observations.get("normalized"):
+            return await self.db._load_observations(session, snapshot.date, observations)
+        if observations.get("compressed"):
+            return await self.db._load_compressed_observations(session, snapshot.date, observations)
+        return observations
+
+    async def _drop_snapshot_detail(self, session: AsyncSession, snapshot_date: date):
+        for model in SNAPSHOT_DETAIL_MODELS:
+            await session.execute(delete(model).where(model.snapshot_date == snapshot_date))
+
+    async def _compress_snapshots(self, cutoff: date) -> int:
+        async with self.db.async_session() as session:
+            result = await session.execute(
+                select(DailySnapshot.date).where(DailySnapshot.date < cutoff).order_by(DailySnapshot.date)
+            )
+            dates = result.scalars().all()
+
+        compressed = 0
+        for snapshot_date in dates:
+            # One day per transaction keeps the write lock short
+            async with self.db._snapshot_write_lock:
+                async with self.db.async_session() as session:
+                    async with session.begin():
+                        snapshot = await session.scalar(
+                            select(DailySnapshot).where(DailySnapshot.date == snapshot_date)
+                        )
+                        if not snapshot or (snapshot.observations or {}).get("compressed"):
+                            continue
+
+                        observations = await self._full_observations(session, snapshot)
+                        items = {k: observations.get(k, []) for k in OBSERVATION_SOURCES}
+                        metadata = {
+                            k: v for k, v in observations.items()
+                            if k not in OBSERVATION_SOURCES and k != "normalized"
+                        }
+
+                        stmt = self.db.dialect_insert(CompressedSnapshot).values(
+                            snapshot_date=snapshot_date,
+                            codec=self.codec,
+                            observations=compress_json(items, self.codec)
+                        )
+                        await session.execute(stmt.on_conflict_do_update(
+                            index_elements=[CompressedSnapshot.snapshot_date],
+                            set_={"codec": stmt.excluded.codec, "observations": stmt.excluded.observations}
+                        ))
+                        snapshot.observations = {**metadata, "compressed": True}
+                        await self._drop_snapshot_detail(session, snapshot_date)
+                        compressed += 1
+
+                self.db._snapshot_cache.pop(snapshot_date, None)
+
+        return compressed
+
+    async def _archive(self, session: AsyncSession, kind: str, record_date: date, payload):
+        stmt = self.db.dialect_insert(ArchivedRecord).values(
+            kind=kind,
+            record_date=record_date,
+            codec=self.codec,
+            payload=compress_json(payload, self.codec)
+        )
+        await session.execute(stmt.on_conflict_do_update(
+            index_elements=[ArchivedRecord.kind, ArchivedRecord.record_date],
+            set_={"codec": stmt.excluded.codec, "payload": stmt.excluded.payload, "archived_at": datetime.utcnow()}
+        ))
+
+    async def _archive_snapshots(self, cutoff: date) -> int:
+        archived = 0
+        async with self.db._snapshot_write_lock:
+            async with self.db.async_session() as session:
+                async with session.begin():
+                    result = await session.execute(
+                        select(DailySnapshot).where(DailySnapshot.date < cutoff).order_by(DailySnapshot.date)
+                    )
+                    for snapshot in result.scalars().all():
+                        await self._archive(session, "snapshot", snapshot.date, {
+                            "date": snapshot.date.isoformat(),
+                            "observations": await self._full_observations(session, snapshot),
+                            "insights": snapshot.insights
+                        })
+                        await self._drop_snapshot_detail(session, snapshot.date)
+                        await session.execute(
+                            delete(CompressedSnapshot).where(CompressedSnapshot.snapshot_date == snapshot.date)
+                        )
+                        await session.delete(snapshot)
+                        self.db._snapshot_cache.pop(snapshot.date, None)
+                        archived += 1
+        return archived
+
+    async def _archive_eod_reports(self, cutoff: date) -> int:
+        async with self.db.async_session() as session:
+            async with session.begin():
+                result = await session.execute(select(EODReport).where(EODReport.date < cutoff))
+                reports = result.scalars().all()
+                for report in reports:
+                    await self._archive(session, "eod_report", report.date, {
+                        "date": report.date.isoformat(),
+                        "content": report.content,
+                        "created_at": report.created_at.isoformat() if report.created_at else None
+                    })
+                    await session.delete(report)
+                await session.execute(delete(ReportView).where(ReportView.report_date < cutoff))
+        return len(reports)
+
+    async def _archive_chat(self, cutoff: date) -> int:
+        cutoff_at = datetime.combine(cutoff, datetime.min.time())
+        archived = 0
+
+        while True:
+            async with self.db.async_session() as session:
+                async with session.begin():
+                    result = await session.execute(
+                        select(ChatHistory)
+                        .where(ChatHistory.timestamp < cutoff_at)
+                        .order_by(ChatHistory.timestamp, ChatHistory.id)
+                        .limit(CHAT_ARCHIVE_BATCH)
+                    )
+                    turns = result.scalars().all()
+                    if not turns:
+                        break
+
+                    by_day = defaultdict(list)
+                    for t in turns:
+                        by_day[t.timestamp.date()].append({
+                            "id": t.id,
+                            "timestamp": t.timestamp.isoformat(),
+                            "user": t.user_query,
+                            "agent": t.agent_response,
+                            "user_id": t.user_id
+                        })
+
+                    # A day can span batches: append to what is already archived
+                    for day, day_turns in by_day.items():
+                        existing = await session.scalar(
+                            select(ArchivedRecord).where(
+                                ArchivedRecord.kind == "chat",
+                                ArchivedRecord.record_date == day
+                            )
+                        )
+                        if existing:
+                            day_turns = decompress_json(existing.payload, existing.codec) + day_turns
+                        await self._archive(session, "chat", day, day_turns)
+
+                    await session.execute(delete(ChatHistory).where(ChatHistory.id.in_([t.id for t in turns])))
+                    archived += len(turns)
+
+        return archived
+
+    async def _unindex(self, cutoff: date) -> int:
+        """Remove archived kinds from the retrieval index by date, which also catches turns archived earlier"""
+        if self.retriever is None:
+            return 0
+        return await asyncio.to_thread(self.retriever.remove_before, cutoff.isoformat(), ("eod_report", "chat"))
+
+    async def vacuum(self) -> int:
+        """Return free pages to the OS; converts older databases to incremental auto-vacuum once"""
+        if self.db.engine.dialect.name != "sqlite":
+            return 0
+
+        async with self.db.engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            mode = (await conn.execute(text("PRAGMA auto_vacuum"))).scalar()
+            if mode != 2:
+                # auto_vacuum can only be switched on an existing file by a full VACUUM
+                print("[DB] Enabling incremental auto-vacuum (one-time full VACUUM)")
+                await conn.execute(text("PRAGMA auto_vacuum=INCREMENTAL"))
+                await conn.execute(text("VACUUM"))
+                return 0
+
+            before = (await conn.execute(text("PRAGMA freelist_count"))).scalar()
+            # Run as a script: a single execute() only steps the pragma once, freeing one page
+            raw = await conn.get_raw_connection()
+            await raw.driver_connection.executescript(f"PRAGMA incremental_vacuum({int(self.vacuum_pages)});")
+            after = (await conn.execute(text("PRAGMA freelist_count"))).scalar()
+            return before - after
@@ -0,0 +1,353 @@
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+import json
+import math
+import os
+import re
+import threading
+import zlib
+
+import numpy as np
+
+from config import config
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have i in is it its me my of on or so that the this "
+    "to was what when where which who will with you your".split()
+)
+INITIAL_CAPACITY = 1024
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase words without stopwords, followed by adjacent word pairs"""
+    words = [w for w in TOKEN_RE.findall((text or "").lower()) if len(w) > 1 and w not in STOPWORDS]
+    return words + [f"{a}_{b}" for a, b in zip(words, words[1:])]
+
+class HashedTfidfEmbedder:
+    """
+    Offline text embedding: words and word pairs hashed into a fixed number
+    of signed buckets with sublinear term frequency. Document frequencies per
+    bucket are tracked so queries can be weighted by IDF.
+    """
+
+    def __init__(self, dim: int):
+        self.dim = dim
+
+    def buckets(self, text: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Bucket indices and signed sublinear TF weights of a text"""
+        counts = Counter(tokenize(text))
+        indices = np.empty(len(counts), dtype=np.int64)
+        weights = np.empty(len(counts), dtype=np.float32)
+        for i, (token, count) in enumerate(counts.items()):
+            h = zlib.crc32(token.encode())  # Stable across processes, unlike hash()
+            indices[i] = h % self.dim
+            weights[i] = (1.0 + math.log(count)) * (1.0 if h & 0x80000000 else -1.0)
+        return indices, weights
+
+    def embed(self, text: str, idf: Optional[np.ndarray] = None) -> np.ndarray:
+        """Unit-length vector; idf reweights buckets (used for queries)"""
+        vector = np.zeros(self.dim, dtype=np.float32)
+        indices, weights = self.buckets(text)
+        np.add.at(vector, indices, weights)
+        if idf is not None:
+            vector *= idf
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+class VectorRetriever:
+    """
+    Similarity search over EOD reports, emails, assignments and chat turns.
+
+    Vectors live in a memory-mapped float32 matrix (vectors.f32) that grows by
+    doubling; metadata is an append-only JSON lines log (meta.jsonl). A
+    document is identified by kind and ref: adding it again replaces its row.
+    Removing it zeroes the row and logs a tombstone; once removed rows make up
+    RETRIEVER_COMPACT_RATIO of the index, both files are rewritten without them.
+
+    Writes are serialized and meant to run in a worker thread; search can run
+    alongside them, since a row is only listed in meta once its vector is written.
+    """
+
+    def __init__(self, index_dir: str = config.RETRIEVER_DIR, dim: int = config.RETRIEVER_DIM):
+        self.index_dir = index_dir
+        self.embedder = HashedTfidfEmbedder(dim)
+        self.dim = dim
+        os.makedirs(index_dir, exist_ok=True)
+
+        self._vectors_path = os.path.join(index_dir, "vectors.f32")
+        self._meta_path = os.path.join(index_dir, "meta.jsonl")
+        self._df_path = os.path.join(index_dir, "df.npy")
+        self._compact_marker = os.path.join(index_dir, "compacting")
+
+        self.meta: List[Dict] = []
+        self._rows: Dict[str, int] = {}
+        self._dead: frozenset = frozenset()  # Removed rows, replaced whole so searches can read it unlocked
+        self._kinds: Optional[Tuple[List[Dict], np.ndarray]] = None
+        self.df = np.zeros(dim, dtype=np.float64)
+        self._matrix: Optional[np.memmap] = None
+        self._write_lock = threading.Lock()
+        self._swap_lock = threading.Lock()  # Held while compaction swaps meta and matrix together
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self.meta) - len(self._dead)
+
+    def _load(self):
+        if os.path.exists(self._compact_marker):
+            # Interrupted compaction: vectors and meta may not match. The index is
+            # derived data, so start empty and let the agent re-index history
+            print("[RETRIEVER] Interrupted compaction, rebuilding the index")
+            for path in (self._vectors_path, self._meta_path, self._df_path, self._compact_marker):
+                if os.path.exists(path):
+                    os.remove(path)
+
+        if os.path.exists(self._meta_path):
+            with open(self._meta_path) as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        break  # Torn last line from an interrupted write
+                    row = entry["row"]
+                    if row == len(self.meta):
+                        self.meta.append(entry)
+                    elif row < len(self.meta):
+                        self.meta[row] = entry
+            self._rows = {self._key(m["kind"], m["ref"]): m["row"] for m in self.meta if not m.get("removed")}
+            self._dead = frozenset(m["row"] for m in self.meta if m.get("removed"))
+
+        if os.path.exists(self._df_path):
+            df = np.load(self._df_path)
+            if df.shape == self.df.shape:
+                self.df = df
+
+        capacity = INITIAL_CAPACITY
+        if os.path.exists(self._vectors_path):
+            capacity = max(capacity, os.path.getsize(self._vectors_path) // (4 * self.dim))
+        self._open(capacity)
+
+    def _open(self, capacity: int):
+        size = capacity * self.dim * 4
+        mode = "r+" if os.path.exists(self._vectors_path) else "w+"
+        if mode == "r+" and os.path.getsize(self._vectors_path) < size:
+            with open(self._vectors_path, "r+b") as f:
+                f.truncate(size)
+        self._matrix = np.memmap(self._vectors_path, dtype=np.float32, mode=mode, shape=(capacity, self.dim))
+
+    def _ensure_capacity(self, rows: int):
+        capacity = self._matrix.shape[0]
+        if rows <= capacity:
+            return
+        while capacity < rows:
+            capacity *= 2
+        self._matrix.flush()
+        self._open(capacity)  # Swapped in whole: concurrent searches keep the old mapping
+
+    @staticmethod
+    def _key(kind: str, ref: str) -> str:
+        return f"{kind}:{ref}"
+
+    def add_many(self, documents: Iterable[Dict]) -> int:
+        """
+        Index documents ({"kind", "ref", "text", "date"}). Unchanged documents
+        are skipped. Returns the number of rows written.
+        """
+        with self._write_lock:
+            written = []
+            for doc in documents:
+                text = (doc.get("text") or "").strip()
+                if not text:
+                    continue
+                key = self._key(doc["kind"], str(doc["ref"]))
+                digest = zlib.crc32(text.encode())
+
+                row = self._rows.get(key)
+                if row is not None and self.meta[row].get("digest") == digest:
+                    continue
+                vector = self.embedder.embed(text)
+                if row is None:
+                    row = len(self.meta)
+                    self._ensure_capacity(row + 1)
+                else:
+                    # Replaced: the old text's buckets no longer count towards df
+                    self.df[np.flatnonzero(self._matrix[row])] -= 1
+                    np.maximum(self.df, 0, out=self.df)
+                self._matrix[row] = vector
+                self.df[np.flatnonzero(vector)] += 1
+
+                entry = {
+                    "row": row,
+                    "kind": doc["kind"],
+                    "ref": str(doc["ref"]),
+                    "date": doc.get("date"),
+                    "text": text[:500],
+                    "digest": digest
+                }
+                if row == len(self.meta):
+                    self.meta.append(entry)
+                    self._rows[key] = row
+                else:
+                    self.meta[row] = entry
+                written.append(entry)
+
+            if written:
+                # Vectors first: a crash before the metadata is appended leaves an unused row
+                self._matrix.flush()
+                with open(self._meta_path, "a") as f:
+                    for entry in written:
+                        f.write(json.dumps(entry) + "\n")
+                np.save(self._df_path, self.df)
+            return len(written)
+
+    def add(self, kind: str, ref: str, text: str, date: Optional[str] = None) -> int:
+        return self.add_many([{"kind": kind, "ref": ref, "text": text, "date": date}])
+
+    def remove_many(self, keys: Iterable[Tuple[str, str]]) -> int:
+        """Drop documents by (kind, ref). Unknown ones are ignored. Returns the number removed"""
+        with self._write_lock:
+            return self._remove(keys)
+
+    def remove_before(self, cutoff: str, kinds: Iterable[str]) -> int:
+        """Drop documents of the given kinds dated before cutoff (ISO date)"""
+        kinds = set(kinds)
+        with self._write_lock:
+            return self._remove([
+                (m["kind"], m["ref"]) for m in self.meta
+                if not m.get("removed") and m["kind"] in kinds and m.get("date") and m["date"] < cutoff
+            ])
+
+    def _remove(self, keys: Iterable[Tuple[str, str]]) -> int:
+        removed = []
+        for kind, ref in keys:
+            row = self._rows.pop(self._key(kind, str(ref)), None)
+            if row is None:
+                continue
+            self.df[np.flatnonzero(self._matrix[row])] -= 1
+            self._matrix[row] = 0
+            entry = {"row": row, "kind": kind, "ref": str(ref), "removed": True}
+            self.meta[row] = entry
+            removed.append(entry)
+        if not removed:
+            return 0
+
+        np.maximum(self.df, 0, out=self.df)
+        self._dead = self._dead | {entry["row"] for entry in removed}
+        self._matrix.flush()
+        with open(self._meta_path, "a") as f:
+            for entry in removed:
+                f.write(json.dumps(entry) + "\n")
+        np.save(self._df_path, self.df)
+
+        if len(self._dead) >= len(self.meta) * config.RETRIEVER_COMPACT_RATIO:
+            self._compact()
+        return len(removed)
+
+    def _compact(self):
+        """Rewrite vectors and meta without removed rows (caller holds the write lock)"""
+        live = [row for row in range(len(self.meta)) if row not in self._dead]
+        capacity = INITIAL_CAPACITY
+        while capacity < len(live):
+            capacity *= 2
+
+        open(self._compact_marker, "w").close()
+        vectors_tmp, meta_tmp = self._vectors_path + ".tmp", self._meta_path + ".tmp"
+        matrix = np.memmap(vectors_tmp, dtype=np.float32, mode="w+", shape=(capacity, self.dim))
+        if live:
+            matrix[:len(live)] = self._matrix[live]
+        matrix.flush()
+        meta = [{**self.meta[old], "row": new} for new, old in enumerate(live)]
+        with open(meta_tmp, "w") as f:
+            for entry in meta:
+                f.write(json.dumps(entry) + "\n")
+        os.replace(vectors_tmp, self._vectors_path)  # The open mapping follows the file
+        os.replace(meta_tmp, self._meta_path)
+        os.remove(self._compact_marker)
+
+        with self._swap_lock:
+            self.meta, self._matrix = meta, matrix
+            self._rows = {self._key(m["kind"], m["ref"]): m["row"] for m in meta}
+            self._dead = frozenset()
+        print(f"[RETRIEVER] Compacted index to {len(live)} rows")
+
+    def idf(self) -> np.ndarray:
+        n = len(self)
+        return (np.log((1 + n) / (1 + self.df)) + 1).astype(np.float32)
+
+    def search(
+        self,
+        query: str,
+        k: int = config.RETRIEVER_TOP_K,
+        kinds: Optional[Iterable[str]] = None,
+        min_score: float = config.RETRIEVER_MIN_SCORE
+    ) -> List[Dict]:
+        """Top-k documents by cosine similarity, best first"""
+        with self._swap_lock:
+            meta, matrix, dead = self.meta, self._matrix, self._dead
+        n = len(meta)
+        if n == len(dead) or not query:
+            return []
+
+        q = self.embedder.embed(query, idf=self.idf())
+        # Queries touch only a few buckets: reading just those columns is several times faster
+        nz = np.flatnonzero(q)
+        if nz.size == 0:
+            return []
+        scores = np.asarray(matrix[:n, nz]) @ q[nz]
+        if dead:
+            scores[[row for row in dead if row < n]] = -1.0
+
+        if kinds is not None:
+            # A row's kind never changes, so the cache only needs extending until compaction replaces meta
+            cached = self._kinds
+            if cached is None or cached[0] is not meta or len(cached[1]) < n:
+                cached = self._kinds = (meta, np.array([m["kind"] for m in meta[:n]]))
+            scores = np.where(np.isin(cached[1][:n], list(kinds)), scores, -1.0)
+
+        k = min(k, n)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            {**{f: meta[i][f] for f in ("kind", "ref", "date", "text")}, "score": round(float(scores[i]), 3)}
+            for i in top
+            if scores[i] >= min_score and i not in dead
+        ]
+
+def email_document(row: Dict) -> Dict:
+    """Document for an email_cache row"""
+    received = row.get("received_at")
+    return {
+        "kind": "email",
+        "ref": row.get("email_id"),
+        "text": f"Email from {row.get('sender', '')}: {row.get('subject', '')}\n{row.get('snippet', '')}",
+        "date": received.date().isoformat() if isinstance(received, datetime) else None
+    }
+
+def assignment_document(row: Dict) -> Dict:
+    """Document for an assignment_cache row"""
+    due = row.get("due_date")
+    due_text = due.strftime("%B %d, %Y") if isinstance(due, datetime) else "no due date"
+    return {
+        "kind": "assignment",
+        "ref": row.get("assignment_id"),
+        "text": f"Assignment {row.get('title', '')} ({row.get('course_name', '')}), due {due_text}\n{row.get('description') or ''}",
+        "date": due.date().isoformat() if isinstance(due, datetime) else None
+    }
+
+def eod_report_document(report_date: str, content: str) -> Dict:
+    return {"kind": "eod_report", "ref": report_date, "text": content, "date": report_date}
+
+def chat_ref(user_id: Optional[str], timestamp: str) -> str:
+    """Ref of a chat turn; turns indexed before chats were per user have the bare timestamp"""
+    return f"{user_id}|{timestamp}" if user_id else timestamp
+
+def chat_ref_user(ref: str) -> str:
+    return ref.split("|", 1)[0] if "|" in ref else config.DEFAULT_USER_ID
+
+def chat_document(ref: str, timestamp: str, user: str, agent: str) -> Dict:
+    return {
+        "kind": "chat",
+        "ref": ref,
+        "text": f"User: {user or ''}\nAssistant: {agent or ''}",
+        "date": timestamp[:10] if timestamp else None
+    }
@@ -0,0 +1,101 @@
+from typing import Dict, List, Optional
+
+SOURCES = ("emails", "assignments", "meetings")
+
+# Derived fields that change on every refresh without the item itself changing
+VOLATILE_FIELDS = ("urgency_score", "received_epoch", "due_epoch", "start_epoch")
+
+def item_key(source: str, item: Dict) -> str:
+    """Stable identity of an item within a day's snapshot"""
+    if source == "emails":
+        return f"{item.get('sender', '')}|{item.get('subject', '')}|{item.get('received', '')}"
+    if source == "assignments":
+        return f"{item.get('course', '')}|{item.get('title', '')}"
+    return f"{item.get('title', '')}|{item.get('start', '')}"
+
+def _content(item: Dict) -> Dict:
+    return {k: v for k, v in item.items() if k not in VOLATILE_FIELDS}
+
+def diff_observations(old: Optional[Dict], new: Dict) -> Dict:
+    """
+    Per-source delta from old to new observations:
+    {"emails": {"added": [items], "removed": [keys], "changed": [items], "order": [keys]}, ...}
+    Sources without changes are omitted; "order" is only kept when applying
+    the delta would not reproduce the new ordering on its own.
+    """
+    old = old or {}
+    delta = {}
+
+    for source in SOURCES:
+        old_items = {item_key(source, i): i for i in old.get(source, [])}
+        new_list = new.get(source, [])
+        new_keys = [item_key(source, i) for i in new_list]
+
+        added = [i for k, i in zip(new_keys, new_list) if k not in old_items]
+        changed = [
+            i for k, i in zip(new_keys, new_list)
+            if k in old_items and _content(old_items[k]) != _content(i)
+        ]
+        new_key_set = set(new_keys)
+        removed = [k for k in old_items if k not in new_key_set]
+
+        entry = {}
+        if added:
+            entry["added"] = added
+        if changed:
+            entry["changed"] = changed
+        if removed:
+            entry["removed"] = removed
+
+        # Default ordering after apply: surviving old items, then additions
+        default_order = [k for k in old_items if k in new_key_set] + [item_key(source, i) for i in added]
+        if new_keys != default_order:
+            entry["order"] = new_keys
+
+        if entry:
+            delta[source] = entry
+
+    return delta
+
+def is_empty(delta: Dict) -> bool:
+    return not any(delta.get(source) for source in SOURCES)
+
+def apply_delta(state: Dict, delta: Dict) -> Dict:
+    """Apply a delta to observations, returning new observations"""
+    result = {k: v for k, v in state.items() if k not in SOURCES}
+
+    for source in SOURCES:
+        items = {item_key(source, i): i for i in state.get(source, [])}
+        entry = delta.get(source, {})
+
+        for key in entry.get("removed", []):
+            items.pop(key, None)
+        for item in entry.get("changed", []):
+            items[item_key(source, item)] = item
+        for item in entry.get("added", []):
+            items[item_key(source, item)] = item
+
+        if "order" in entry:
+            result[source] = [items[k] for k in entry["order"] if k in items]
+        else:
+            result[source] = list(items.values())
+
+    return result
+
+def replay(deltas: List[Dict]) -> Dict:
+    """Rebuild observations from a base delta followed by incremental deltas"""
+    state: Dict = {}
+    for delta in deltas:
+        state = apply_delta(state, delta)
+    return state
+
+def summarize_delta(delta: Dict) -> Dict[str, Dict[str, int]]:
+    """Counts of added, removed and changed items per source"""
+    return {
+        source: {
+            "added": len(delta.get(source, {}).get("added", [])),
+            "removed": len(delta.get(source, {}).get("removed", [])),
+            "changed": len(delta.get(source, {}).get("changed", []))
+        }
+        for source in SOURCES
+    }
@@ -0,0 +1,134 @@
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, List, Optional
+import asyncio
+
+BatchWriter = Callable[[List[Dict]], Awaitable[None]]
+
+class WriteBehindQueue:
+    """
+    Bounded in-process buffer that persists rows in the background.
+    Rows are written in batches once batch_size rows are waiting or every
+    flush_interval seconds. put() waits while the buffer is full, so a slow
+    database slows producers down instead of growing memory without limit.
+
+    A failing batch is retried with backoff. After max_retries failures its
+    rows are written one at a time and the ones that still fail are dropped
+    (kept in dead_letters), so one bad row cannot stall every producer.
+    """
+
+    def __init__(
+        self,
+        write_batch: BatchWriter,
+        max_size: int,
+        batch_size: int,
+        flush_interval: float,
+        max_retries: int = 5,
+        name: str = "write-behind"
+    ):
+        self.write_batch = write_batch
+        self.max_size = max(1, max_size)
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.max_retries = max(1, max_retries)
+        self.name = name
+        self.dead_letters: Deque[Dict] = deque(maxlen=100)  # Most recent dropped rows
+        self.dropped = 0
+        self._failures = 0  # Consecutive failed attempts at the head batch
+
+        self._buffer: Deque[Dict] = deque()
+        self._inflight: List[Dict] = []
+        self._task: Optional[asyncio.Task] = None
+        self._wake = asyncio.Event()
+        self._space = asyncio.Event()
+        self._write_lock = asyncio.Lock()
+        self._closed = False
+
+    async def put(self, row: Dict):
+        """Queue a row, waiting for space when the buffer is full"""
+        if self._closed:
+            await self.write_batch([row])
+            return
+
+        self._ensure_started()
+        if len(self._buffer) >= self.max_size:
+            print(f"[DB] {self.name} queue full ({self.max_size}), waiting for flush")
+            self._wake.set()
+        while len(self._buffer) >= self.max_size:
+            self._space.clear()
+            await self._space.wait()
+
+        self._buffer.append(row)
+        if len(self._buffer) >= self.batch_size:
+            self._wake.set()
+
+    def pending(self) -> List[Dict]:
+        """Rows accepted but not yet committed, oldest first"""
+        return list(self._inflight) + list(self._buffer)
+
+    async def flush(self):
+        """Write everything queued so far"""
+        async with self._write_lock:
+            while self._buffer:
+                batch = [self._buffer.popleft() for _ in range(min(self.batch_size, len(self._buffer)))]
+                self._inflight = batch
+                try:
+                    await self._write(batch)
+                except Exception:
+                    # Keep the rows for the next attempt
+                    self._buffer.extendleft(reversed(batch))
+                    raise
+                finally:
+                    self._inflight = []
+                    self._space.set()
+
+    async def _write(self, batch: List[Dict]):
+        try:
+            await self.write_batch(batch)
+            self._failures = 0
+            return
+        except Exception:
+            self._failures += 1
+            if self._failures < self.max_retries:
+                raise
+
+        # Still failing: isolate the rows that cannot be written and drop only those
+        self._failures = 0
+        for row in batch:
+            try:
+                await self.write_batch([row])
+            except Exception as e:
+                self.dead_letters.append(row)
+                self.dropped += 1
+                print(f"[DB ERROR] {self.name}: dropped a row after {self.max_retries} failed attempts: {e}")
+
+    async def close(self):
+        """Stop the background task and write the remaining rows"""
+        self._closed = True
+        if self._task:
+            self._wake.set()
+            await self._task
+            self._task = None
+        await self.flush()
+
+    def _ensure_started(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while not self._closed:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+            try:
+                await self.flush()
+            except Exception as e:
+                delay = min(self.flush_interval * 2 ** self._failures, 30.0)
+                print(f"[DB ERROR] {self.name} flush failed (attempt {self._failures}/{self.max_retries}), retrying in {delay:.1f}s: {e}")
+                # Wait on the wake event so close() does not sit out the backoff
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
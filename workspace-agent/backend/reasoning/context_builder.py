@@ -0,0 +1,213 @@
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+import asyncio
+import json
+import math
+
+from config import config
+from memory.db_manager import DatabaseManager
+from memory.retriever import VectorRetriever, chat_ref_user, tokenize
+from reasoning.summary_hierarchy import SummaryHierarchy
+from utils.dates import week_start
+
+# Always included, whatever the budget
+REQUIRED_SECTIONS = ("conversation_summary", "recent_turns")
+
+# How much relevance to the question, recency and the item's own priority count
+RELEVANCE_WEIGHT = 0.6
+RECENCY_WEIGHT = 0.25
+PRIORITY_WEIGHT = 0.15
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about 4 characters per token) plus one for the separator"""
+    return math.ceil(len(text) / 4) + 1
+
+def _age_days(iso_date: Optional[str], today: date) -> Optional[int]:
+    try:
+        return (today - date.fromisoformat(iso_date[:10])).days
+    except (TypeError, ValueError):
+        return None
+
+class ContextBuilder:
+    """
+    Assembles prompt context within a token budget.
+    Sources are read concurrently; every piece of data becomes a candidate
+    scored by relevance to the question, recency and priority, and the best
+    candidates are packed greedily until the budget is used up.
+    """
+
+    def __init__(
+        self,
+        db: DatabaseManager,
+        retriever: Optional[VectorRetriever] = None,
+        summaries: Optional[SummaryHierarchy] = None
+    ):
+        self.db = db
+        self.retriever = retriever
+        self.summaries = summaries
+
+    async def gather_chat_sources(self, query: str, user_id: str = config.DEFAULT_USER_ID) -> Dict:
+        """Everything chat() may need for one user's conversation, fetched in parallel"""
+        snapshot, past_summaries, chat_history, conversation_summary, recent_questions, related = await asyncio.gather(
+            self.db.get_snapshot_by_date(date.today()),
+            self.db.get_recent_summaries(days=3),
+            self.db.get_recent_chat_history(limit=config.CHAT_RAW_TURNS, user_id=user_id),
+            self.db.get_conversation_summary(user_id),
+            self.db.get_recent_user_queries(limit=5, user_id=user_id),
+            asyncio.to_thread(self._related_history, query, user_id)  # numpy search, kept off the event loop
+        )
+        return {
+            "today_snapshot": snapshot,
+            "past_summaries": past_summaries,
+            "chat_history": chat_history,
+            "conversation_summary": conversation_summary.get('content', '') if conversation_summary else '',
+            "recent_questions": recent_questions,
+            "related_history": related
+        }
+
+    def _related_history(self, query: str, user_id: str = config.DEFAULT_USER_ID) -> List[Dict]:
+        """Older items similar to the query (chat turns only from this user); today's data is already a source of its own"""
+        if self.retriever is None:
+            return []
+        today = date.today().isoformat()
+        try:
+            hits = self.retriever.search(query, k=config.RETRIEVER_TOP_K * 2)
+        except Exception as e:
+            print(f"[CONTEXT] Retrieval failed: {e}")
+            return []
+        return [
+            h for h in hits
+            if h.get('date') != today and (h.get('kind') != 'chat' or chat_ref_user(h['ref']) == user_id)
+        ][:config.RETRIEVER_TOP_K]
+
+    def _relevance(self, query_tokens: set, text: str) -> float:
+        if not query_tokens:
+            return 0.0
+        return len(query_tokens & set(tokenize(text))) / len(query_tokens)
+
+    def _candidate(self, section: str, index: int, text: str, relevance: float, recency: float, priority: float) -> Dict:
+        return {
+            "section": section,
+            "index": index,
+            "text": text,
+            "tokens": estimate_tokens(text),
+            "score": RELEVANCE_WEIGHT * relevance + RECENCY_WEIGHT * recency + PRIORITY_WEIGHT * priority
+        }
+
+    def chat_candidates(self, query: str, sources: Dict) -> List[Dict]:
+        """One candidate per turn, item, report and retrieved document"""
+        today = date.today()
+        query_tokens = set(tokenize(query))
+        candidates = []
+
+        if sources.get("conversation_summary"):
+            candidates.append(self._candidate("conversation_summary", 0, sources["conversation_summary"], 1, 1, 1))
+
+        for i, msg in enumerate((sources.get("chat_history") or [])[-config.CHAT_RAW_TURNS:]):
+            text = f"User: {msg.get('user') or ''}\nAssistant: {(msg.get('agent') or '')[:200]}..."
+            candidates.append(self._candidate("recent_turns", i, text, 1, 1, 1))
+
+        observations = (sources.get("today_snapshot") or {}).get("observations", {})
+        for section in ("emails", "assignments", "meetings"):
+            for i, item in enumerate(observations.get(section, [])):
+                text = json.dumps(item)
+                priority = (item.get("urgency_score") or 0) / 100
+                candidates.append(self._candidate(section, i, text, self._relevance(query_tokens, text), 1, priority))
+
+        for i, report in enumerate(sources.get("past_summaries") or []):
+            text = f"{report['date']}: {(report.get('content') or '')[:400]}"
+            age = _age_days(report.get("date"), today)
+            recency = math.exp(-age / 3) if age is not None else 0
+            candidates.append(self._candidate("past_reports", i, text, self._relevance(query_tokens, text), recency, 0.3))
+
+        for i, hit in enumerate(sources.get("related_history") or []):
+            text = f"[{hit.get('kind')}, {hit.get('date') or 'undated'}] {hit.get('text', '')[:300]}"
+            age = _age_days(hit.get("date"), today)
+            recency = math.exp(-age / 30) if age is not None else 0
+            candidates.append(self._candidate("related_history", i, text, hit.get("score", 0), recency, 0.3))
+
+        return candidates
+
+    def pack(self, candidates: List[Dict], budget: int, required: tuple = REQUIRED_SECTIONS) -> Dict:
+        """
+        Greedy packing: required sections first, then by score while they fit.
+        Returns the kept texts per section (in source order), token usage and
+        what was dropped.
+        """
+        ordered = sorted(candidates, key=lambda c: (c["section"] not in required, -c["score"]))
+        kept, dropped = [], {}
+        used = dropped_tokens = 0
+
+        for c in ordered:
+            if c["section"] in required or used + c["tokens"] <= budget:
+                kept.append(c)
+                used += c["tokens"]
+            else:
+                dropped[c["section"]] = dropped.get(c["section"], 0) + 1
+                dropped_tokens += c["tokens"]
+
+        sections: Dict[str, List[str]] = {}
+        for c in sorted(kept, key=lambda c: (c["section"], c["index"])):
+            sections.setdefault(c["section"], []).append(c["text"])
+
+        return {
+            "sections": sections,
+            "budget": budget,
+            "used_tokens": used,
+            "dropped": dropped,
+            "dropped_tokens": dropped_tokens
+        }
+
+    def build_chat_context(self, query: str, sources: Dict, budget: int = config.CHAT_CONTEXT_TOKENS) -> Dict:
+        """Packed chat context plus the full item counts of today's snapshot"""
+        context = self.pack(self.chat_candidates(query, sources), budget)
+        observations = (sources.get("today_snapshot") or {}).get("observations", {})
+        context["total_counts"] = {k: len(observations.get(k, [])) for k in ("emails", "assignments", "meetings")}
+        self._log("Chat", context)
+        return context
+
+    async def build_report_context(self, insights: Dict, budget: int = config.REPORT_CONTEXT_TOKENS) -> Dict:
+        """
+        History that fits next to today's analysis in the report prompt:
+        this week's daily reports, then weekly and monthly digests of the
+        weeks and months before it
+        """
+        today = date.today()
+        analysis_tokens = estimate_tokens(json.dumps(insights.get('analysis', {}), indent=2))
+
+        if self.summaries is None:
+            past_summaries = await self.db.get_recent_summaries(days=7)
+            digests = {"weekly": [], "monthly": []}
+        else:
+            past_summaries, digests = await asyncio.gather(
+                self.db.get_eod_reports_between(week_start(today), today - timedelta(days=1)),
+                self.summaries.get_context(today)
+            )
+
+        candidates = []
+        for i, report in enumerate(past_summaries):
+            age = _age_days(report.get("date"), today)
+            recency = math.exp(-age / 3) if age is not None else 0
+            text = f"{report['date']}: {(report.get('content') or '')[:300]}"
+            candidates.append(self._candidate("past_reports", i, text, 0, recency, 0.3))
+
+        # Older periods rank lower, so months are dropped before recent weeks
+        for section, level, scale in (("weekly_digests", "weekly", 14), ("monthly_digests", "monthly", 60)):
+            for i, digest in enumerate(digests[level]):
+                age = _age_days(digest.get("end"), today)
+                recency = math.exp(-age / scale) if age is not None else 0
+                content = " ".join((digest.get('content') or '').split())
+                text = f"{digest['start']} to {digest['end']}: {content[:600]}"
+                candidates.append(self._candidate(section, i, text, 0, recency, 0.3))
+
+        context = self.pack(candidates, max(0, budget - analysis_tokens), required=())
+        context["used_tokens"] += analysis_tokens
+        context["budget"] = budget
+        self._log("Report", context)
+        return context
+
+    @staticmethod
+    def _log(name: str, context: Dict):
+        dropped = sum(context["dropped"].values())
+        suffix = f", dropped {dropped} items ({context['dropped_tokens']} tokens): {context['dropped']}" if dropped else ""
+        print(f"[CONTEXT] {name} context {context['used_tokens']}/{context['budget']} tokens{suffix}")
@@ -14,7 +14,8 @@ class GeminiClient:
         """Generate text with fallback handling"""
         try:
             full_prompt = f"{system_prompt}\n\n{prompt}" if system_prompt else prompt
-            response = self.client.models.generate_content(
+            # Async client: a call in flight must not block the event loop
+            response = await self.client.aio.models.generate_content(
                 model=self.model,
                 contents=full_prompt
             )
@@ -0,0 +1,127 @@
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+import re
+
+from config import config
+from memory.db_manager import DatabaseManager
+from reasoning.gemini_client import GeminiClient
+from agent.prompts import PromptTemplates
+from utils.dates import week_start, month_start, month_end
+
+class SummaryHierarchy:
+    """
+    Daily EOD reports rolled up into weekly digests, and weekly digests into
+    monthly ones. Only complete periods are digested; each digest is generated
+    once and stored, and rebuilt only after a report inside it changed.
+    """
+
+    def __init__(self, db: DatabaseManager, gemini: GeminiClient, prompts: Optional[PromptTemplates] = None):
+        self.db = db
+        self.gemini = gemini
+        self.prompts = prompts or PromptTemplates()
+
+    async def get_context(
+        self,
+        today: Optional[date] = None,
+        weeks: int = config.SUMMARY_WEEKS,
+        months: int = config.SUMMARY_MONTHS
+    ) -> Dict[str, List[Dict]]:
+        """
+        Weekly digests of the last complete weeks, and monthly digests of the
+        complete months reaching back from the oldest of those weeks, newest first
+        """
+        today = today or date.today()
+        current_week = week_start(today)
+        week_starts = [current_week - timedelta(weeks=i) for i in range(1, weeks + 1)]
+
+        # The month holding the day before the oldest week may overlap it; that beats a gap
+        month_starts = []
+        cursor = month_start((week_starts[-1] if week_starts else current_week) - timedelta(days=1))
+        while len(month_starts) < months:
+            if month_end(cursor) < current_week:
+                month_starts.append(cursor)
+            cursor = month_start(cursor - timedelta(days=1))
+
+        weekly = await self._ensure_weeks(week_starts)
+        monthly = []
+        for start in month_starts:
+            digest = await self._ensure_month(start, current_week)
+            if digest:
+                monthly.append(digest)
+
+        return {"weekly": weekly, "monthly": monthly}
+
+    async def _ensure_weeks(self, starts: List[date]) -> List[Dict]:
+        if not starts:
+            return []
+        cached = await self.db.get_period_summaries("week", min(starts))
+        digests = []
+        for start in starts:
+            digest = cached.get(start)
+            if digest is None or digest["stale"]:
+                digest = await self._build_week(start)
+            if digest and digest["content"]:
+                digests.append(digest)
+        return digests
+
+    async def _build_week(self, start: date) -> Optional[Dict]:
+        end = start + timedelta(days=6)
+        reports = await self.db.get_eod_reports_between(start, end)
+        entries = [f"{r['date']}: {r['content']}" for r in reports]
+        return await self._store("week", start, end, entries)
+
+    async def _ensure_month(self, start: date, current_week: date) -> Optional[Dict]:
+        cached = (await self.db.get_period_summaries("month", start)).get(start)
+        if cached and not cached["stale"]:
+            return cached if cached["content"] else None
+
+        # Complete weeks that start inside the month roll up into it
+        end = month_end(start)
+        first_week = start + timedelta(days=(7 - start.weekday()) % 7)
+        week_starts = []
+        while first_week <= end and first_week < current_week:
+            week_starts.append(first_week)
+            first_week += timedelta(weeks=1)
+
+        weekly = await self._ensure_weeks(week_starts)
+        entries = [f"Week of {w['start']}: {w['content']}" for w in weekly]
+        # A month rolled up from fallback weeks is rebuilt once they are
+        digest = await self._store("month", start, end, entries, provisional=any(w["stale"] for w in weekly))
+        return digest if digest and digest["content"] else None
+
+    async def _store(self, level: str, start: date, end: date, entries: List[str], provisional: bool = False) -> Dict:
+        """
+        Generate and store a digest; empty periods are stored too so they are not
+        retried. Local fallbacks (and provisional digests) are stored stale, so
+        the next report tries Gemini again.
+        """
+        content = ""
+        stale = provisional
+        if entries:
+            prompt = self.prompts.period_summary_prompt(level, start.isoformat(), end.isoformat(), entries)
+            content = await self.gemini.generate(prompt, self.prompts.get_system_prompt())
+            if not content:
+                content = self._fallback_digest(entries)
+                stale = True
+            content = content.strip()
+
+        await self.db.store_period_summary(level, start, end, content, len(entries), stale=stale)
+        print(f"[SUMMARIES] Built {level} digest for {start.isoformat()} ({len(entries)} sources{', kept stale' if stale else ''})")
+        return {
+            "level": level,
+            "start": start.isoformat(),
+            "end": end.isoformat(),
+            "content": content,
+            "source_count": len(entries),
+            "stale": stale
+        }
+
+    @staticmethod
+    def _fallback_digest(entries: List[str]) -> str:
+        """First sentence of each source when Gemini is unavailable"""
+        parts = []
+        for entry in entries[:10]:
+            label, _, body = entry.partition(": ")
+            sentence = re.split(r"(?<=[.!?])\s", " ".join(body.split()), maxsplit=1)[0]
+            parts.append(f"{label}: {sentence[:200]}")
+        return " ".join(parts)
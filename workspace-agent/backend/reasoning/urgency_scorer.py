@@ -0,0 +1,144 @@
+import numpy as np
+import re
+import time
+from typing import Dict, List, Optional
+
+from agent.views import assignment_due_epoch
+from utils.dates import parse_iso_epoch
+
+URGENT_THRESHOLD = 70
+IMPORTANT_THRESHOLD = 40
+
+URGENT_KEYWORDS = ('urgent', 'asap', 'deadline', 'action required', 'important', 'due', 'overdue', 'reminder', 'final')
+LOW_VALUE_SENDERS = ('linkedin', 'noreply', 'no-reply', 'newsletter', 'notification', 'facebook', 'twitter', 'instagram', 'marketing')
+HIGH_VALUE_SENDERS = ('.edu', 'classroom.google.com', 'professor', 'teacher')
+
+# Whole words only ("due" is not in "residue"), plurals included; senders match anywhere in the address
+URGENT_RE = re.compile(r"\b(" + "|".join(re.escape(k) for k in URGENT_KEYWORDS) + r")s?\b")
+LOW_VALUE_SENDER_RE = re.compile("|".join(re.escape(s) for s in LOW_VALUE_SENDERS))
+HIGH_VALUE_SENDER_RE = re.compile("|".join(re.escape(s) for s in HIGH_VALUE_SENDERS))
+
+EMAIL, ASSIGNMENT, MEETING = 0, 1, 2
+SOURCES = (("emails", EMAIL, "email"), ("assignments", ASSIGNMENT, "assignment"), ("meetings", MEETING, "meeting"))
+
+def keyword_hits(texts: List[str]) -> np.ndarray:
+    """Number of distinct urgent keywords in each (lowercased) text"""
+    return np.array([len(set(URGENT_RE.findall(text))) for text in texts], dtype=float)
+
+def _column(values: List, start: int, size: int, fill: float = np.nan) -> np.ndarray:
+    """Feature column for all items, with values for one source placed at its offset"""
+    column = np.full(size, fill)
+    column[start:start + len(values)] = np.array(values, dtype=float)
+    return column
+
+class UrgencyScorer:
+    """
+    Rule-based urgency scores (0-100) for every item in a snapshot.
+    Items are turned into feature arrays and scored in one vectorized pass.
+    """
+
+    def features(self, observations: Dict, now: Optional[float] = None) -> Dict[str, np.ndarray]:
+        """Build one feature row per email, assignment and meeting"""
+        if now is None:
+            now = time.time()
+
+        emails, assignments, meetings = (observations.get(key, []) for key, _, _ in SOURCES)
+        size = len(emails) + len(assignments) + len(meetings)
+        first_assignment, first_meeting = len(emails), len(emails) + len(assignments)
+        texts = [
+            f"{item.get('subject', '')} {item.get('title', '')} {item.get('snippet', '')}".lower()
+            for item in (*emails, *assignments, *meetings)
+        ]
+        senders = [item.get('sender', '').lower() for item in emails]
+        low_value = [LOW_VALUE_SENDER_RE.search(sender) is not None for sender in senders]
+        high_value = [HIGH_VALUE_SENDER_RE.search(sender) is not None for sender in senders]
+
+        received = [e.get('received_epoch') or parse_iso_epoch(e.get('received', '')) for e in emails]
+        due = [assignment_due_epoch(a) for a in assignments]
+        start = [m.get('start_epoch') or parse_iso_epoch(m.get('start', '')) for m in meetings]
+
+        return {
+            "kind": np.repeat(np.array([EMAIL, ASSIGNMENT, MEETING], dtype=np.int8), [len(emails), len(assignments), len(meetings)]),
+            "hours_since_received": (now - _column(received, 0, size)) / 3600,
+            "unread": _column([1.0 if e.get('is_unread') else 0.0 for e in emails], 0, size, 0.0),
+            "sender_weight": _column(np.where(low_value, -20.0, np.where(high_value, 15.0, 0.0)), 0, size, 0.0),
+            "keyword_hits": keyword_hits(texts),
+            "hours_to_due": (_column(due, first_assignment, size) - now) / 3600,
+            "points": _column([float(a.get('points') or 0) for a in assignments], first_assignment, size, 0.0),
+            "hours_to_start": (_column(start, first_meeting, size) - now) / 3600
+        }
+
+    def score(self, observations: Dict, now: Optional[float] = None) -> np.ndarray:
+        """Score every item in source order (emails, assignments, meetings)"""
+        f = self.features(observations, now)
+        if f["kind"].size == 0:
+            return np.zeros(0, dtype=np.int64)
+
+        with np.errstate(invalid='ignore', over='ignore'):
+            # Emails: unread, urgent wording, who sent it and how fresh it is
+            recency = np.nan_to_num(np.exp(-np.clip(f["hours_since_received"], 0, None) / 24))
+            email = (
+                20 * f["unread"]
+                + 15 * np.minimum(f["keyword_hits"], 2)
+                + f["sender_weight"]
+                + 30 * recency
+            )
+
+            # Assignments: closeness of the deadline and how much it is worth
+            h = f["hours_to_due"]
+            deadline = np.select(
+                [np.isnan(h), h >= 0, h > -72],
+                [0, 80 * np.exp(-np.clip(h, 0, None) / 120), 40],
+                default=5
+            )
+            assignment = deadline + 20 * np.minimum(f["points"] / 100, 1) + 10 * np.minimum(f["keyword_hits"], 1)
+
+            # Meetings: how soon they start
+            s = f["hours_to_start"]
+            meeting = np.select(
+                [np.isnan(s), s >= 0],
+                [20, 20 + 60 * np.exp(-np.clip(s, 0, None) / 6)],
+                default=5
+            )
+
+            scores = np.select(
+                [f["kind"] == EMAIL, f["kind"] == ASSIGNMENT],
+                [email, assignment],
+                default=meeting
+            )
+
+        return np.clip(np.rint(scores), 0, 100).astype(np.int64)
+
+    def annotate(self, observations: Dict, now: Optional[float] = None) -> Dict:
+        """Write urgency_score onto every item of the observations"""
+        scores = self.score(observations, now)
+        i = 0
+        for key, _, _ in SOURCES:
+            for item in observations.get(key, []):
+                item['urgency_score'] = int(scores[i])
+                i += 1
+        return observations
+
+    def rank(self, observations: Dict, now: Optional[float] = None) -> List[Dict]:
+        """All items, highest urgency first"""
+        scores = self.score(observations, now)
+        items = [
+            {"type": item_type, "item": item}
+            for key, _, item_type in SOURCES
+            for item in observations.get(key, [])
+        ]
+        for entry, score in zip(items, scores):
+            entry["score"] = int(score)
+
+        order = np.argsort(-scores, kind='stable')
+        return [items[i] for i in order]
+
+    def top_observations(self, observations: Dict, max_items: int, now: Optional[float] = None) -> Dict:
+        """Keep only the max_items most urgent items, preserving the observation layout"""
+        top = {"emails": [], "assignments": [], "meetings": []}
+        keys = {item_type: key for key, _, item_type in SOURCES}
+        for entry in self.rank(observations, now)[:max_items]:
+            top[keys[entry["type"]]].append(entry["item"])
+
+        top["total_counts"] = {key: len(observations.get(key, [])) for key, _, _ in SOURCES}
+        return top
@@ -1,5 +1,7 @@
 from pydantic import BaseModel
-from datetime import datetime
+from datetime import datetime, timezone
+
+from utils.dates import to_utc_epoch
 
 class Assignment(BaseModel):
     id: str
@@ -10,11 +12,32 @@ class Assignment(BaseModel):
     status: str
     points_possible: int
     
+    @property
+    def due_epoch(self) -> int:
+        """Due date as UTC epoch seconds (Classroom due dates are UTC)"""
+        return to_utc_epoch(self.due_date)
+    
+    def to_cache_row(self):
+        """Row for the assignment_cache table (due_date as naive UTC)"""
+        due = self.due_date
+        if due.tzinfo is not None:
+            due = due.astimezone(timezone.utc).replace(tzinfo=None)
+        return {
+            "assignment_id": self.id,
+            "course_name": self.course_name,
+            "title": self.title,
+            "description": self.description,
+            "due_date": due,
+            "status": self.status,
+            "points_possible": self.points_possible
+        }
+    
     def to_dict(self):
         return {
             "course": self.course_name,
             "title": self.title,
             "due": self.due_date.isoformat(),
+            "due_epoch": self.due_epoch,
             "status": self.status,
             "points": self.points_possible
         }
\ No newline at end of file
@@ -1,7 +1,9 @@
 from pydantic import BaseModel
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import List
 
+from utils.dates import to_utc_epoch
+
 class Email(BaseModel):
     id: str
     sender: str
@@ -12,11 +14,27 @@ class Email(BaseModel):
     labels: List[str]
     urgency_score: int = 0
     
+    def to_cache_row(self):
+        """Row for the email_cache table (received_at as naive UTC)"""
+        received = self.received_at
+        if received.tzinfo is not None:
+            received = received.astimezone(timezone.utc).replace(tzinfo=None)
+        return {
+            "email_id": self.id,
+            "sender": self.sender,
+            "subject": self.subject,
+            "snippet": self.snippet,
+            "received_at": received,
+            "labels": self.labels
+        }
+    
     def to_dict(self):
         return {
             "sender": self.sender,
             "subject": self.subject,
             "snippet": self.snippet[:200],
             "received": self.received_at.isoformat(),
-            "is_unread": self.is_unread
+            "received_epoch": to_utc_epoch(self.received_at),
+            "is_unread": self.is_unread,
+            "urgency_score": self.urgency_score
         }
\ No newline at end of file
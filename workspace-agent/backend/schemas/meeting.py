@@ -2,6 +2,8 @@ from pydantic import BaseModel
 from datetime import datetime
 from typing import List
 
+from utils.dates import to_utc_epoch
+
 class Meeting(BaseModel):
     id: str
     title: str
@@ -16,6 +18,7 @@ class Meeting(BaseModel):
         return {
             "title": self.title,
             "start": self.start_time.isoformat(),
+            "start_epoch": to_utc_epoch(self.start_time),
             "duration_minutes": duration,
             "attendees_count": len(self.attendees)
         }
\ No newline at end of file
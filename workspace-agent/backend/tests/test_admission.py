@@ -0,0 +1,108 @@
+import asyncio
+
+import pytest
+
+from agent.admission import AdmissionController, AdmissionRejected
+
+async def settle():
+    """Let queued tasks reach their wait"""
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+def test_concurrency_is_capped():
+    async def main():
+        controller = AdmissionController(max_concurrent=2, max_queue=10, max_queue_per_client=10, max_wait=5)
+        peak = 0
+
+        async def call(n):
+            nonlocal peak
+            async with controller.slot(f"client{n}"):
+                peak = max(peak, controller.running)
+                await asyncio.sleep(0.01)
+
+        await asyncio.gather(*(call(n) for n in range(6)))
+        return peak, controller.stats()
+
+    peak, stats = asyncio.run(main())
+    assert peak == 2
+    assert stats["admitted"] == 6
+    assert stats["running"] == 0 and stats["queued"] == 0
+
+def test_queue_limits():
+    async def main():
+        controller = AdmissionController(max_concurrent=1, max_queue=4, max_queue_per_client=2, max_wait=5)
+        await controller.acquire("a")
+        waiting = [asyncio.create_task(controller.acquire(c)) for c in ("a", "a", "b")]
+        await settle()
+        with pytest.raises(AdmissionRejected, match="too many queued requests"):
+            await controller.acquire("a")
+
+        waiting.append(asyncio.create_task(controller.acquire("c")))
+        await settle()
+        with pytest.raises(AdmissionRejected, match="queue full"):
+            await controller.acquire("d")
+        stats = controller.stats()
+
+        for _ in range(5):
+            controller.release()
+            await settle()
+        await asyncio.gather(*waiting)
+        return stats, controller.stats()
+
+    full, drained = asyncio.run(main())
+    assert full["queued"] == 4 and full["queued_by_client"] == {"a": 2, "b": 1, "c": 1}
+    assert full["rejected_client_full"] == 1 and full["rejected_queue_full"] == 1
+    assert drained["running"] == 0 and drained["queued"] == 0 and drained["admitted"] == 5
+
+def test_wait_times_out():
+    async def main():
+        controller = AdmissionController(max_concurrent=1, max_queue=5, max_queue_per_client=5, max_wait=0.05)
+        await controller.acquire("a")
+        with pytest.raises(AdmissionRejected, match="waited over 0.05s"):
+            await controller.acquire("b")
+        stats = controller.stats()
+
+        # The slot is not handed to the request that gave up
+        controller.release()
+        return stats, controller.stats()
+
+    waiting, released = asyncio.run(main())
+    assert waiting["rejected_timeout"] == 1 and waiting["queued"] == 0
+    assert released["running"] == 0
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def main():
+        controller = AdmissionController(max_concurrent=1, max_queue=5, max_queue_per_client=5, max_wait=5)
+        await controller.acquire("a")
+        waiter = asyncio.create_task(controller.acquire("b"))
+        await settle()
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        queued = controller.stats()["queued"]
+        controller.release()
+        return queued, controller.stats()
+
+    queued, stats = asyncio.run(main())
+    assert queued == 0
+    assert stats["running"] == 0 and stats["admitted"] == 1
+
+def test_slots_go_round_robin_across_clients():
+    async def main():
+        controller = AdmissionController(max_concurrent=1, max_queue=10, max_queue_per_client=10, max_wait=5)
+        order = []
+
+        async def call(client):
+            async with controller.slot(client):
+                order.append(client)
+                await asyncio.sleep(0)
+
+        await controller.acquire("holder")
+        # One client bursts before another arrives
+        tasks = [asyncio.create_task(call(c)) for c in ("a", "a", "a", "b", "c")]
+        await settle()
+        controller.release()
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(main()) == ["a", "b", "c", "a", "a"]
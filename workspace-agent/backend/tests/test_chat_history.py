@@ -0,0 +1,121 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import text
+
+START = datetime(2024, 5, 1, 9, 0)
+
+def turns(count: int, user_id: str = "default") -> list:
+    # Pairs of turns share a timestamp so the id has to break ties
+    return [
+        {
+            "timestamp": START + timedelta(minutes=n // 2),
+            "user_query": f"q{n}",
+            "agent_response": f"a{n}",
+            "user_id": user_id
+        }
+        for n in range(count)
+    ]
+
+def test_pages_backwards_and_forwards(run_db):
+    async def scenario(db):
+        await db.store_chat_turns(turns(11))
+        back = [await db.get_chat_history_page(limit=4)]
+        while back[-1]["has_more"]:
+            back.append(await db.get_chat_history_page(limit=4, before=back[-1]["before"]))
+
+        forward = [await db.get_chat_history_page(limit=4, after=back[-1]["after"])]
+        while forward[-1]["has_more"]:
+            forward.append(await db.get_chat_history_page(limit=4, after=forward[-1]["after"]))
+        return back, forward
+
+    back, forward = run_db(scenario)
+    # Latest page first; turns inside a page are oldest first
+    assert [[t["user"] for t in p["turns"]] for p in back] == [
+        ["q7", "q8", "q9", "q10"], ["q3", "q4", "q5", "q6"], ["q0", "q1", "q2"]
+    ]
+    assert back[-1]["before"] is None
+
+    forward_users = [t["user"] for p in forward for t in p["turns"]]
+    assert forward_users == [f"q{n}" for n in range(3, 11)]
+    assert [len(p["turns"]) for p in forward] == [4, 4]
+
+def test_after_latest_page_is_empty(run_db):
+    async def scenario(db):
+        await db.store_chat_turns(turns(3))
+        latest = await db.get_chat_history_page(limit=10)
+        return latest, await db.get_chat_history_page(after=latest["after"])
+
+    latest, newer = run_db(scenario)
+    assert not latest["has_more"] and latest["before"] is None
+    assert newer["turns"] == [] and not newer["has_more"]
+    # Polling again from the same cursor stays put
+    assert newer["after"] == latest["after"]
+
+def test_fields_and_users(run_db):
+    async def scenario(db):
+        await db.store_chat_turns(turns(3, "alice") + turns(2, "bob"))
+        return (
+            await db.get_chat_history_page(fields=["id", "user"], user_id="alice"),
+            await db.get_chat_history_page(user_id="bob")
+        )
+
+    alice, bob = run_db(scenario)
+    assert [t["user"] for t in alice["turns"]] == ["q0", "q1", "q2"]
+    assert all(set(t) == {"id", "user"} for t in alice["turns"])
+    assert [(t["user"], t["agent"]) for t in bob["turns"]] == [("q0", "a0"), ("q1", "a1")]
+    assert set(bob["turns"][0]) == {"id", "timestamp", "user", "agent"}
+
+def test_invalid_requests(run_db):
+    async def scenario(db):
+        latest = await db.get_chat_history_page()
+        with pytest.raises(ValueError):
+            await db.get_chat_history_page(before="x", after="y")
+        with pytest.raises(ValueError):
+            await db.get_chat_history_page(fields=["user", "password"])
+        return latest
+
+    assert run_db(scenario) == {"turns": [], "before": None, "after": None, "has_more": False}
+
+def test_per_user_pages_use_the_index(run_db):
+    async def scenario(db):
+        if db.engine.dialect.name != "sqlite":
+            pytest.skip("Checks the SQLite query plan")
+        await db.store_chat_turns(turns(20, "alice") + turns(20, "bob"))
+        async with db.engine.connect() as conn:
+            plan = await conn.execute(text(
+                "EXPLAIN QUERY PLAN SELECT id FROM chat_history WHERE user_id = 'alice' "
+                "AND (timestamp < :ts OR (timestamp = :ts AND id < :id)) "
+                "ORDER BY timestamp DESC, id DESC LIMIT 6"
+            ), {"ts": START, "id": 100})
+            return [row[-1] for row in plan]
+
+    details = run_db(scenario)
+    assert any("ix_chat_history_user_id_timestamp_id" in d for d in details)
+    assert not any("TEMP B-TREE" in d for d in details)
+
+def test_turns_being_written_are_listed_once(run_db):
+    async def scenario(db):
+        committed, release = asyncio.Event(), asyncio.Event()
+        store = db.chat_writer.write_batch
+
+        async def slow_store(batch):
+            # Committed, but the queue still reports the rows as pending
+            await store(batch)
+            committed.set()
+            await release.wait()
+
+        db.chat_writer.write_batch = slow_store
+        await db.queue_chat_turn("any emails?", "Two new", user_id="alice")
+        flushing = asyncio.create_task(db.chat_writer.flush())
+        await committed.wait()
+        history = await db.get_recent_chat_history(user_id="alice")
+        queries = await db.get_recent_user_queries(user_id="alice")
+        release.set()
+        await flushing
+        return history, queries
+
+    history, queries = run_db(scenario)
+    assert [(t["user"], t["id"] is not None) for t in history] == [("any emails?", True)]
+    assert queries == ["any emails?"]
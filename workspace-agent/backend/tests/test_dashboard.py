@@ -0,0 +1,22 @@
+import copy
+import time
+
+from api.routes import _dashboard
+
+def test_due_fields_are_refreshed_on_copies():
+    due = int(time.time()) + 3 * 86400 + 3600
+    view = {
+        "date": "2024-05-01",
+        "emails": [],
+        "assignments": [{"title": "Lab", "due_date": "", "due_epoch": due, "days_until_due": 10, "urgency": "low"}],
+        "meetings": []
+    }
+    snapshot = {"date": "2024-05-01", "views": {"dashboard": view}}
+    rendered = copy.deepcopy(view)
+
+    payload = _dashboard(snapshot)
+
+    assert payload["assignments"][0]["days_until_due"] == 3
+    assert "due_epoch" not in payload["assignments"][0]
+    # The cached view is shared between requests and must stay as rendered
+    assert view == rendered
@@ -0,0 +1,101 @@
+from datetime import datetime
+
+import pytest
+from sqlalchemy import delete, text
+
+from memory.models import EmailCache
+
+def cached_email(email_id: str, subject: str, snippet: str = "", sender: str = "prof@uni.edu", day: int = 1) -> dict:
+    return {
+        "email_id": email_id,
+        "sender": sender,
+        "subject": subject,
+        "snippet": snippet,
+        "received_at": datetime(2024, 5, day, 9, 0),
+        "labels": ["INBOX"]
+    }
+
+def found(results) -> list:
+    return sorted(r["subject"] for r in results)
+
+@pytest.fixture
+def run_fts(run_db):
+    def run(scenario):
+        async def checked(db):
+            if not db.fts_enabled:
+                pytest.skip("SQLite build without FTS5")
+            return await scenario(db)
+        return run_db(checked)
+    return run
+
+def test_index_follows_inserts_updates_and_deletes(run_fts):
+    async def scenario(db):
+        await db.upsert_email_cache([
+            cached_email("1", "Midterm schedule", "Room 101 on Friday"),
+            cached_email("2", "Lab report feedback", "See comments", sender="ta@uni.edu")
+        ])
+        inserted = (await db.search_emails(["midterm"]), await db.search_emails(["ta"]))
+
+        await db.upsert_email_cache([cached_email("1", "Final exam schedule", "Room 202 on Monday")])
+        updated = (await db.search_emails(["midterm"]), await db.search_emails(["final"]))
+
+        async with db.async_session() as session:
+            async with session.begin():
+                await session.execute(delete(EmailCache).where(EmailCache.email_id == "2"))
+        deleted = await db.search_emails(["lab"])
+
+        # Raises if the index no longer matches email_cache
+        async with db.engine.begin() as conn:
+            await conn.execute(text(
+                "INSERT INTO email_cache_fts(email_cache_fts, rank) VALUES ('integrity-check', 1)"
+            ))
+        return inserted, updated, deleted
+
+    (midterm, ta), (old, final), lab = run_fts(scenario)
+    assert found(midterm) == ["Midterm schedule"]
+    assert found(ta) == ["Lab report feedback"]
+    assert old == [] and found(final) == ["Final exam schedule"]
+    assert lab == []
+
+def test_prefix_matching_and_ranking(run_fts):
+    async def scenario(db):
+        await db.upsert_email_cache([
+            cached_email("1", "Weekly digest", "Includes an assignment reminder", day=3),
+            cached_email("2", "Assignment 3 released", "Due next week", day=1),
+            cached_email("3", "Cafeteria menu", "Nothing relevant", day=2)
+        ])
+        return await db.search_emails(["assign"]), await db.search_emails(["!!"])
+
+    results, nothing = run_fts(scenario)
+    # Subject matches rank above snippet matches
+    assert [r["subject"] for r in results] == ["Assignment 3 released", "Weekly digest"]
+    assert nothing == []
+
+def test_existing_rows_are_backfilled(run_fts):
+    async def scenario(db):
+        await db.upsert_email_cache([cached_email("1", "Office hours moved")])
+        async with db.engine.begin() as conn:
+            for name in ("email_cache_fts_ai", "email_cache_fts_ad", "email_cache_fts_au"):
+                await conn.execute(text(f"DROP TRIGGER {name}"))
+            await conn.execute(text("DROP TABLE email_cache_fts"))
+
+        await db._init_email_fts()
+        return await db.search_emails(["office"])
+
+    assert found(run_fts(scenario)) == ["Office hours moved"]
+
+def test_like_search_without_fts(run_db):
+    # The only search on PostgreSQL, and on SQLite builds without FTS5
+    async def scenario(db):
+        db.fts_enabled = False
+        await db.upsert_email_cache([
+            cached_email("1", "MIDTERM schedule", "Room 101", day=1),
+            cached_email("2", "Lab report", "midterm review session", day=2),
+            cached_email("3", "Cafeteria menu", "Nothing relevant", day=3)
+        ])
+        return await db.search_emails(["Midterm"]), await db.search_emails(["midterm"], limit=1)
+
+    results, first = run_db(scenario)
+    # Case-insensitive on every backend, newest first
+    assert [r["subject"] for r in results] == ["Lab report", "MIDTERM schedule"]
+    assert [r["subject"] for r in first] == ["Lab report"]
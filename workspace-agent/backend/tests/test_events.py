@@ -0,0 +1,24 @@
+import asyncio
+
+from agent.events import EventBroker
+
+def test_close_ends_every_stream():
+    async def main():
+        broker = EventBroker()
+
+        async def read(stream):
+            return [chunk async for chunk in stream]
+
+        streams = [asyncio.create_task(read(broker.stream(heartbeat=60))) for _ in range(2)]
+        while broker.stats()["subscribers"] < 2:
+            await asyncio.sleep(0.01)
+        broker.publish("snapshot", {"version": 1})
+        broker.close()
+        received = await asyncio.wait_for(asyncio.gather(*streams), timeout=5)
+        late = await asyncio.wait_for(read(broker.stream(heartbeat=60)), timeout=5)
+        return received, late, broker.stats()
+
+    received, late, stats = asyncio.run(main())
+    assert all(chunks[0].startswith("retry:") for chunks in received)
+    assert late == []
+    assert stats["subscribers"] == 0
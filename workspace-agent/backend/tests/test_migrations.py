@@ -0,0 +1,169 @@
+import asyncio
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import JSON, Column, Date, DateTime, Integer, MetaData, String, Table, Text, inspect, select
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+
+from memory.migrations import MIGRATIONS, run_migrations
+from memory.models import Base, SchemaMigration
+
+LATEST = MIGRATIONS[-1][0]
+
+def baseline_tables(metadata: MetaData):
+    """The original schema, as created before versioned migrations existed"""
+    Table(
+        "daily_snapshots", metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("date", Date, unique=True, index=True),
+        Column("observations", JSON),
+        Column("insights", JSON),
+        Column("created_at", DateTime)
+    )
+    Table(
+        "eod_reports", metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("date", Date, unique=True, index=True),
+        Column("content", Text),
+        Column("created_at", DateTime)
+    )
+    Table(
+        "chat_history", metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("timestamp", DateTime, index=True),
+        Column("user_query", Text),
+        Column("agent_response", Text)
+    )
+    Table(
+        "email_cache", metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("email_id", String, unique=True, index=True),
+        Column("sender", String),
+        Column("subject", String),
+        Column("snippet", Text),
+        Column("received_at", DateTime),
+        Column("labels", JSON),
+        Column("stored_at", DateTime)
+    )
+    Table(
+        "assignment_cache", metadata,
+        Column("id", Integer, primary_key=True, index=True),
+        Column("assignment_id", String, unique=True, index=True),
+        Column("course_name", String),
+        Column("title", String),
+        Column("description", Text),
+        Column("due_date", DateTime, index=True),
+        Column("status", String),
+        Column("points_possible", Integer),
+        Column("stored_at", DateTime)
+    )
+
+def describe(conn) -> dict:
+    """Columns and indexes of every table, comparable across databases"""
+    inspector = inspect(conn)
+    return {
+        table: (
+            sorted((c["name"], str(c["type"]), c["nullable"]) for c in inspector.get_columns(table)),
+            sorted((i["name"], tuple(i["column_names"]), bool(i["unique"])) for i in inspector.get_indexes(table))
+        )
+        for table in inspector.get_table_names()
+    }
+
+def drop_everything(conn):
+    metadata = MetaData()
+    metadata.reflect(conn)
+    metadata.drop_all(conn)
+
+def test_migrated_schema_matches_models(database_url):
+    async def build():
+        engine = create_async_engine(database_url, poolclass=NullPool)
+        try:
+            version = await run_migrations(engine)
+            async with engine.begin() as conn:
+                migrated = await conn.run_sync(describe)
+                await conn.run_sync(drop_everything)
+                await conn.run_sync(Base.metadata.create_all)
+                return version, migrated, await conn.run_sync(describe)
+        finally:
+            await engine.dispose()
+
+    version, migrated, models = asyncio.run(build())
+    assert version == LATEST
+    assert migrated == models
+
+def test_migrations_are_applied_once(database_url):
+    async def migrate_twice():
+        engine = create_async_engine(database_url, poolclass=NullPool)
+        try:
+            first = await run_migrations(engine)
+            second = await run_migrations(engine)
+            async with engine.connect() as conn:
+                applied = (await conn.execute(select(SchemaMigration.version))).scalars().all()
+            return first, second, applied
+        finally:
+            await engine.dispose()
+
+    first, second, applied = asyncio.run(migrate_twice())
+    assert first == second == LATEST
+    assert sorted(applied) == [number for number, _, _ in MIGRATIONS]
+
+def test_concurrent_instances_migrate_once(database_url):
+    if not database_url.startswith("postgresql"):
+        pytest.skip("Advisory locks are PostgreSQL only")
+
+    async def migrate_together():
+        engines = [create_async_engine(database_url, poolclass=NullPool) for _ in range(3)]
+        try:
+            versions = await asyncio.gather(*(run_migrations(engine) for engine in engines))
+            async with engines[0].connect() as conn:
+                applied = (await conn.execute(select(SchemaMigration.version))).scalars().all()
+            return versions, applied
+        finally:
+            for engine in engines:
+                await engine.dispose()
+
+    versions, applied = asyncio.run(migrate_together())
+    assert versions == [LATEST] * 3
+    assert sorted(applied) == [number for number, _, _ in MIGRATIONS]
+
+def test_upgrade_from_baseline_schema(database_url, run_db):
+    async def create_baseline():
+        metadata = MetaData()
+        baseline_tables(metadata)
+        engine = create_async_engine(database_url, poolclass=NullPool)
+        try:
+            async with engine.begin() as conn:
+                await conn.run_sync(metadata.create_all)
+                await conn.execute(metadata.tables["chat_history"].insert().values(
+                    timestamp=datetime(2024, 5, 1, 10, 0), user_query="any emails?", agent_response="Two new emails"
+                ))
+                await conn.execute(metadata.tables["eod_reports"].insert().values(
+                    date=date(2024, 5, 1), content="Quiet day"
+                ))
+        finally:
+            await engine.dispose()
+
+    asyncio.run(create_baseline())
+
+    async def scenario(db):
+        page = await db.get_chat_history_page(user_id="default")
+        reports = await db.get_eod_reports_between(date(2024, 1, 1), date(2024, 12, 31))
+        await db.queue_chat_turn("and now?", "Nothing new", user_id="alice")
+        await db.chat_writer.flush()
+        alice = await db.get_chat_history_page(user_id="alice")
+        async with db.engine.begin() as conn:
+            version = await conn.scalar(select(SchemaMigration.version).order_by(SchemaMigration.version.desc()))
+            upgraded = await conn.run_sync(describe)
+            await conn.run_sync(drop_everything)
+            await conn.run_sync(Base.metadata.create_all)
+            models = await conn.run_sync(describe)
+        return page, reports, alice, version, upgraded, models
+
+    page, reports, alice, version, upgraded, models = run_db(scenario)
+    assert [(t["user"], t["agent"]) for t in page["turns"]] == [("any emails?", "Two new emails")]
+    assert [r["content"] for r in reports] == ["Quiet day"]
+    assert [t["user"] for t in alice["turns"]] == ["and now?"]
+    assert version == LATEST
+    # Same tables, column types and indexes as a fresh database (FTS5 tables are not models)
+    assert {t: d for t, d in upgraded.items() if not t.startswith("email_cache_fts")} == models
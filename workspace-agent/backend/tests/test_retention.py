@@ -0,0 +1,99 @@
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import func, select
+
+from memory.models import ChatHistory, CompressedSnapshot, SnapshotDelta, SnapshotEmail
+from memory.retention import RetentionManager
+from tests.conftest import email, observations
+
+TODAY = date(2024, 6, 30)
+RECENT = TODAY - timedelta(days=2)
+OLDER = TODAY - timedelta(days=10)
+ANCIENT = TODAY - timedelta(days=40)
+
+def retention(db) -> RetentionManager:
+    return RetentionManager(db, detail_days=7, archive_days=30, codec="zlib")
+
+async def count(db, model, *where) -> int:
+    async with db.async_session() as session:
+        return await session.scalar(select(func.count()).select_from(model).where(*where))
+
+async def store_days(db):
+    for day in (RECENT, OLDER, ANCIENT):
+        obs = observations(email(f"{day} A"), email(f"{day} B", is_unread=False))
+        await db.store_daily_snapshot({"date": day, "observations": obs, "insights": {"note": str(day)}})
+        await db.store_eod_report({"date": day, "content": f"Report for {day}"})
+
+def test_snapshots_round_trip(run_db):
+    async def scenario(db):
+        await store_days(db)
+        # Compare against what is read back from the tables, not the write cache
+        db._snapshot_cache.clear()
+        originals = {day: (await db.get_snapshot_by_date(day))["observations"] for day in (RECENT, OLDER, ANCIENT)}
+        stats = await retention(db).run(TODAY)
+        db._snapshot_cache.clear()
+
+        loaded = {day: await db.get_snapshot_by_date(day) for day in (RECENT, OLDER, ANCIENT)}
+        details = {
+            day: (await count(db, SnapshotEmail, SnapshotEmail.snapshot_date == day),
+                  await count(db, SnapshotDelta, SnapshotDelta.snapshot_date == day),
+                  await count(db, CompressedSnapshot, CompressedSnapshot.snapshot_date == day))
+            for day in (RECENT, OLDER, ANCIENT)
+        }
+        return originals, stats, loaded, details, await retention(db).run(TODAY)
+
+    originals, stats, loaded, details, again = run_db(scenario)
+    assert stats["snapshots_compressed"] == 1 and stats["snapshots_archived"] == 1
+    for day in (RECENT, OLDER, ANCIENT):
+        assert loaded[day]["observations"] == originals[day]
+        assert loaded[day]["insights"] == {"note": str(day)}
+
+    # Recent days keep their detail, older ones only the compressed blob, archived ones nothing
+    assert details[RECENT] == (2, 1, 0)
+    assert details[OLDER] == (0, 0, 1)
+    assert details[ANCIENT] == (0, 0, 0)
+    # Rendered views go with the detail
+    assert loaded[RECENT]["version"] == 1
+    assert all(loaded[day]["views"] == {} and loaded[day]["version"] == 0 for day in (OLDER, ANCIENT))
+
+    # A second run has nothing left to do
+    assert again["snapshots_compressed"] == again["snapshots_archived"] == again["eod_reports_archived"] == 0
+
+def test_eod_reports_round_trip(run_db):
+    async def scenario(db):
+        await store_days(db)
+        stats = await retention(db).run(TODAY)
+        return (
+            stats,
+            await db.get_eod_reports_between(ANCIENT, TODAY),
+            await db.get_archived_record("eod_report", ANCIENT)
+        )
+
+    stats, kept, archived = run_db(scenario)
+    assert stats["eod_reports_archived"] == 1
+    assert [r["date"] for r in kept] == [OLDER.isoformat(), RECENT.isoformat()]
+    assert archived["date"] == ANCIENT.isoformat()
+    assert archived["content"] == f"Report for {ANCIENT}"
+
+def test_chat_turns_round_trip(run_db, monkeypatch):
+    # Days spanning several batches are appended to, not overwritten
+    monkeypatch.setattr("memory.retention.CHAT_ARCHIVE_BATCH", 2)
+    old_day = datetime.combine(ANCIENT, datetime.min.time())
+
+    async def scenario(db):
+        await db.store_chat_turns([
+            {"timestamp": old_day + timedelta(hours=n), "user_query": f"q{n}", "agent_response": f"a{n}", "user_id": user}
+            for n, user in enumerate(("alice", "bob", "alice"))
+        ] + [
+            {"timestamp": datetime.combine(RECENT, datetime.min.time()), "user_query": "recent",
+             "agent_response": "kept", "user_id": "alice"}
+        ])
+        stats = await retention(db).run(TODAY)
+        return stats, await db.get_archived_record("chat", ANCIENT), await count(db, ChatHistory)
+
+    stats, archived, remaining = run_db(scenario)
+    assert stats["chat_turns_archived"] == 3
+    assert [(t["user"], t["agent"], t["user_id"]) for t in archived] == [
+        ("q0", "a0", "alice"), ("q1", "a1", "bob"), ("q2", "a2", "alice")
+    ]
+    assert remaining == 1
@@ -0,0 +1,84 @@
+import os
+from datetime import date, datetime
+
+from memory.retention import RetentionManager
+from memory.retriever import VectorRetriever, chat_document, chat_ref, eod_report_document
+
+DIM = 256
+
+def reports(*days: str):
+    return [eod_report_document(day, f"Report for {day}: finished the {day} physics lab") for day in days]
+
+def refs(hits):
+    return sorted(h["ref"] for h in hits)
+
+def test_removed_documents_are_not_found(tmp_path):
+    retriever = VectorRetriever(str(tmp_path), dim=DIM)
+    retriever.add_many(reports("2024-05-01", "2024-05-02", "2024-05-03", "2024-05-04", "2024-05-05"))
+
+    assert retriever.remove_many([("eod_report", "2024-05-02"), ("eod_report", "missing")]) == 1
+    assert len(retriever) == 4
+    assert "2024-05-02" not in refs(retriever.search("physics lab report", k=10, min_score=0))
+
+    # Tombstones survive a restart, and the document can be indexed again
+    reopened = VectorRetriever(str(tmp_path), dim=DIM)
+    assert len(reopened) == 4
+    assert "2024-05-02" not in refs(reopened.search("physics lab report", k=10, min_score=0))
+    reopened.add_many(reports("2024-05-02"))
+    assert "2024-05-02" in refs(reopened.search("physics lab report", k=10, min_score=0))
+
+def test_remove_before_only_touches_given_kinds(tmp_path):
+    retriever = VectorRetriever(str(tmp_path), dim=DIM)
+    retriever.add_many(reports("2024-04-01", "2024-06-01") + [
+        chat_document(chat_ref("alice", "2024-04-01T10:00:00"), "2024-04-01T10:00:00", "physics lab?", "Due Friday"),
+        {"kind": "email", "ref": "m1", "text": "physics lab moved", "date": "2024-04-01"}
+    ])
+
+    assert retriever.remove_before("2024-05-01", ("eod_report", "chat")) == 2
+    hits = retriever.search("physics lab", k=10, min_score=0)
+    assert sorted((h["kind"], h["ref"]) for h in hits) == [("email", "m1"), ("eod_report", "2024-06-01")]
+
+def test_compaction_reclaims_removed_rows(tmp_path):
+    retriever = VectorRetriever(str(tmp_path), dim=DIM)
+    days = [f"2024-05-{d:02d}" for d in range(1, 9)]
+    retriever.add_many(reports(*days))
+
+    # Two of eight rows is the 25% threshold
+    retriever.remove_many([("eod_report", days[0]), ("eod_report", days[1])])
+    assert len(retriever.meta) == 6 and not retriever._dead
+    assert retriever.search("physics lab 2024-05-08", k=1, min_score=0)[0]["ref"] == "2024-05-08"
+    assert retriever.search("physics lab", k=10, kinds=["eod_report"], min_score=0)
+
+    with open(tmp_path / "meta.jsonl") as f:
+        assert sum(1 for _ in f) == 6
+    reopened = VectorRetriever(str(tmp_path), dim=DIM)
+    assert refs(reopened.search("physics lab", k=10, min_score=0)) == days[2:]
+
+def test_interrupted_compaction_starts_empty(tmp_path):
+    VectorRetriever(str(tmp_path), dim=DIM).add_many(reports("2024-05-01"))
+    open(tmp_path / "compacting", "w").close()
+
+    retriever = VectorRetriever(str(tmp_path), dim=DIM)
+    assert len(retriever) == 0
+    assert not os.path.exists(tmp_path / "compacting")
+
+def test_retention_unindexes_archived_records(run_db, tmp_path):
+    retriever = VectorRetriever(str(tmp_path), dim=DIM)
+    old, recent = date(2024, 4, 1), date(2024, 6, 28)
+
+    async def scenario(db):
+        for day in (old, recent):
+            await db.store_eod_report({"date": day, "content": f"Report for {day}: physics lab"})
+        await db.store_chat_turns([{
+            "timestamp": datetime(2024, 4, 1, 9), "user_query": "physics lab?",
+            "agent_response": "Due Friday", "user_id": "alice"
+        }])
+        retriever.add_many(reports(old.isoformat(), recent.isoformat()) + [
+            chat_document(chat_ref("alice", "2024-04-01T09:00:00"), "2024-04-01T09:00:00", "physics lab?", "Due Friday")
+        ])
+        return await RetentionManager(db, detail_days=7, archive_days=30, codec="zlib", retriever=retriever).run(date(2024, 6, 30))
+
+    stats = run_db(scenario)
+    assert stats["eod_reports_archived"] == 1 and stats["chat_turns_archived"] == 1
+    assert stats["documents_unindexed"] == 2
+    assert refs(retriever.search("physics lab", k=10, min_score=0)) == [recent.isoformat()]
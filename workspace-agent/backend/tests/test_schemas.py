@@ -0,0 +1,33 @@
+import time
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from schemas.assignment import Assignment
+from schemas.email import Email
+from schemas.meeting import Meeting
+
+EPOCH = 1714557600  # 2024-05-01 10:00 UTC
+NAIVE = datetime(2024, 5, 1, 10, 0)
+AWARE = datetime(2024, 5, 1, 12, 0, tzinfo=timezone(timedelta(hours=2)))
+
+@pytest.fixture
+def local_tz(monkeypatch):
+    # Far from UTC, so reading naive datetimes as local time would show
+    monkeypatch.setenv("TZ", "America/Los_Angeles")
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+@pytest.mark.parametrize("moment", [NAIVE, AWARE])
+def test_epochs_read_naive_datetimes_as_utc(local_tz, moment):
+    email = Email(id="m1", sender="a@b.c", subject="s", snippet="", received_at=moment, is_unread=True, labels=[])
+    meeting = Meeting(id="e1", title="t", start_time=moment, end_time=moment + timedelta(hours=1),
+                      attendees=[], description="", location="")
+    assignment = Assignment(id="a1", course_name="c", title="t", description="", due_date=moment,
+                            status="assigned", points_possible=10)
+
+    assert email.to_dict()["received_epoch"] == EPOCH
+    assert meeting.to_dict()["start_epoch"] == EPOCH
+    assert assignment.due_epoch == EPOCH
@@ -0,0 +1,154 @@
+import asyncio
+from datetime import date, datetime, timedelta
+
+import pytest
+from sqlalchemy import select
+
+from config import config
+from memory.models import SnapshotDelta, SnapshotEmail
+from memory.snapshot_history import diff_observations, replay
+from tests.conftest import email, observations
+
+DAY = date(2024, 5, 1)
+
+def subjects(obs) -> list:
+    return [e["subject"] for e in obs["emails"]]
+
+async def deltas_of(db, snapshot_date=DAY) -> list:
+    async with db.async_session() as session:
+        result = await session.execute(
+            select(SnapshotDelta).where(SnapshotDelta.snapshot_date == snapshot_date).order_by(SnapshotDelta.seq)
+        )
+        return result.scalars().all()
+
+async def email_rows(db, snapshot_date=DAY) -> dict:
+    """subject -> (id, position, is_unread) of a day's snapshot_emails rows"""
+    async with db.async_session() as session:
+        result = await session.execute(select(SnapshotEmail).where(SnapshotEmail.snapshot_date == snapshot_date))
+        return {r.subject: (r.id, r.position, r.is_unread) for r in result.scalars().all()}
+
+async def store(db, *emails, snapshot_date=DAY) -> int:
+    return await db.store_daily_snapshot({"date": snapshot_date, "observations": observations(*emails)})
+
+async def tick() -> datetime:
+    """A point in time strictly between two stores"""
+    await asyncio.sleep(0.01)
+    at = datetime.utcnow()
+    await asyncio.sleep(0.01)
+    return at
+
+def test_replay_reproduces_every_refresh():
+    refreshes = [
+        observations(email("A"), email("B")),
+        observations(email("B"), email("A"), email("C")),
+        observations(email("C", is_unread=False)),
+        observations()
+    ]
+    deltas, previous = [], None
+    for obs in refreshes:
+        deltas.append(diff_observations(previous, obs))
+        previous = obs
+    for n, obs in enumerate(refreshes, 1):
+        assert replay(deltas[:n]) == obs
+
+def test_versions_and_deltas(run_db):
+    async def scenario(db):
+        versions = [await store(db, email("A"))]
+        versions.append(await store(db, email("A"), email("B")))
+        versions.append(await store(db, email("A"), email("B")))
+        snapshot = await db.get_snapshot_by_date(DAY)
+        return versions, snapshot, await deltas_of(db)
+
+    versions, snapshot, deltas = run_db(scenario)
+    assert versions == [1, 2, 3]
+    assert snapshot["version"] == 3
+    assert subjects(snapshot["observations"]) == ["A", "B"]
+    # The unchanged third refresh bumps the version but records no delta
+    assert [d.seq for d in deltas] == [0, 1]
+    assert [e["subject"] for e in deltas[1].delta["emails"]["added"]] == ["B"]
+
+def test_point_in_time_and_changes(run_db):
+    async def scenario(db):
+        before_first = datetime.utcnow() - timedelta(seconds=1)
+        await store(db, email("A"), email("B"))
+        after_first = await tick()
+        await store(db, email("B", is_unread=False), email("C"))
+        return (
+            await db.get_snapshot_at(DAY, before_first),
+            await db.get_snapshot_at(DAY, after_first),
+            await db.get_snapshot_at(DAY, datetime.utcnow()),
+            await db.get_snapshot_changes(after_first, DAY)
+        )
+
+    nothing, first, latest, changes = run_db(scenario)
+    assert nothing is None
+    assert subjects(first) == ["A", "B"]
+    assert subjects(latest) == ["B", "C"]
+    assert changes["refreshes"] == 1
+    assert changes["summary"]["emails"] == {"added": 1, "removed": 1, "changed": 1}
+    assert changes["changes"]["emails"]["removed"] == [f"prof@uni.edu|A|{email('A')['received']}"]
+
+def test_store_keeps_delta_cap(run_db, monkeypatch):
+    monkeypatch.setattr(config, "SNAPSHOT_MAX_DELTAS", 4)
+
+    async def scenario(db):
+        before_first = datetime.utcnow() - timedelta(seconds=1)
+        await store(db, email("0"))
+        after_first = await tick()
+        for n in range(1, 10):
+            await store(db, *[email(str(i)) for i in range(n + 1)])
+            await tick()
+        deltas = await deltas_of(db)
+
+        # Instants inside the folded span are refused instead of showing later state
+        with pytest.raises(ValueError, match="compacted"):
+            await db.get_snapshot_at(DAY, after_first)
+        with pytest.raises(ValueError, match="compacted"):
+            await db.get_snapshot_changes(after_first, DAY)
+        return (
+            deltas,
+            after_first,
+            await db.get_snapshot_at(DAY, deltas[0].folded_until),
+            await db.get_snapshot_changes(deltas[0].folded_until, DAY),
+            await db.get_snapshot_changes(before_first, DAY)
+        )
+
+    deltas, after_first, folded, since_fold, since_start = run_db(scenario)
+    assert len(deltas) == 4
+    assert [d.seq for d in deltas] == [0, 7, 8, 9]
+    assert subjects(replay([d.delta for d in deltas])) == [str(i) for i in range(10)]
+    # The base keeps the time of the first refresh and records the last one folded into it
+    assert deltas[0].created_at <= after_first < deltas[0].folded_until < deltas[1].created_at
+    assert subjects(folded) == [str(i) for i in range(7)]
+    assert since_fold["refreshes"] == 3 and since_fold["summary"]["emails"]["added"] == 3
+    assert since_start["summary"]["emails"]["added"] == 10
+
+def test_compaction_folds_past_days(run_db):
+    yesterday = date.today() - timedelta(days=1)
+
+    async def scenario(db):
+        for n in range(1, 4):
+            await store(db, *[email(str(i)) for i in range(n)], snapshot_date=yesterday)
+        await store(db, email("today"), snapshot_date=date.today())
+        first_base = (await deltas_of(db, yesterday))[0].created_at
+        removed = await db.compact_snapshot_history()
+        return removed, first_base, await deltas_of(db, yesterday), await deltas_of(db, date.today())
+
+    removed, first_base, past, today = run_db(scenario)
+    assert removed == 2
+    assert len(past) == 1 and past[0].created_at == first_base < past[0].folded_until
+    assert subjects(replay([past[0].delta])) == ["0", "1", "2"]
+    assert len(today) == 1
+
+def test_refresh_only_touches_changed_item_rows(run_db):
+    async def scenario(db):
+        await store(db, email("A"), email("B"), email("C"))
+        before = await email_rows(db)
+        await store(db, email("C"), email("A", is_unread=False), email("D"))
+        return before, await email_rows(db)
+
+    before, after = run_db(scenario)
+    # A and C keep their rows (moved or updated in place), B is deleted, D is new
+    assert after["A"][0] == before["A"][0] and after["A"][1:] == (1, False)
+    assert after["C"][0] == before["C"][0] and after["C"][1] == 0
+    assert "B" not in after and after["D"][0] not in {row[0] for row in before.values()}
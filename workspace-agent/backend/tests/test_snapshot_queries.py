@@ -0,0 +1,35 @@
+import time
+from datetime import date
+
+from tests.conftest import email
+
+DAY = 24 * 3600
+
+def assignment(title: str, due_in_days: float) -> dict:
+    due_epoch = int(time.time() + due_in_days * DAY)
+    return {"course": "ML", "title": title, "due": str(due_epoch), "due_epoch": due_epoch, "status": "PUBLISHED", "points": 10}
+
+def meeting(title: str) -> dict:
+    return {"title": title, "start": "2024-05-01T10:00:00+00:00", "duration_minutes": 30, "attendees_count": 2}
+
+def test_counts_and_due_soon(run_db):
+    async def scenario(db):
+        await db.store_daily_snapshot({"date": date.today(), "observations": {
+            "emails": [email("A"), email("B", is_unread=False), email("C")],
+            "assignments": [
+                assignment("overdue", -3), assignment("tomorrow", 1), assignment("friday", 5), assignment("next month", 30)
+            ],
+            "meetings": [meeting("Standup")]
+        }})
+        return (
+            await db.get_snapshot_counts(date.today()),
+            await db.get_assignments_due_within(7),
+            await db.get_assignments_due_within(2, include_overdue=True),
+            await db.get_snapshot_counts(date(2000, 1, 1))
+        )
+
+    counts, week, urgent, empty = run_db(scenario)
+    assert counts == {"emails": 3, "assignments": 4, "meetings": 1, "unread_emails": 2}
+    assert [a["title"] for a in week] == ["tomorrow", "friday"]
+    assert [a["title"] for a in urgent] == ["overdue", "tomorrow"]
+    assert empty == {"emails": 0, "assignments": 0, "meetings": 0, "unread_emails": 0}
@@ -0,0 +1,35 @@
+from reasoning.urgency_scorer import ASSIGNMENT, EMAIL, MEETING, UrgencyScorer, keyword_hits
+
+NOW = 1714557600.0
+
+def test_keywords_match_whole_words():
+    assert keyword_hits([
+        "residue in the lab",           # "due" inside another word
+        "overdue: lab report overdue",  # one keyword, however often
+        "deadlines and reminders",      # plurals
+        "action required, due friday",
+        "finally, a newsletter"
+    ]).tolist() == [0, 1, 2, 2, 0]
+
+def test_features_follow_source_order():
+    observations = {
+        "emails": [
+            {"subject": "Urgent", "snippet": "", "sender": "prof@uni.edu", "received_epoch": NOW - 3600, "is_unread": True},
+            {"subject": "Weekly digest", "snippet": "", "sender": "newsletter@shop.com", "received_epoch": NOW}
+        ],
+        "assignments": [{"title": "Lab", "due_epoch": NOW + 7200, "points": 50}],
+        "meetings": [{"title": "Standup", "start_epoch": NOW + 1800}]
+    }
+    f = UrgencyScorer().features(observations, NOW)
+
+    assert f["kind"].tolist() == [EMAIL, EMAIL, ASSIGNMENT, MEETING]
+    assert f["sender_weight"].tolist() == [15, -20, 0, 0]
+    assert f["unread"].tolist() == [1, 0, 0, 0]
+    assert f["keyword_hits"].tolist() == [1, 0, 0, 0]
+    assert f["hours_since_received"][:2].tolist() == [1, 0]
+    assert f["hours_to_due"][2] == 2 and f["points"].tolist() == [0, 0, 50, 0]
+    assert f["hours_to_start"][3] == 0.5
+    assert UrgencyScorer().score(observations, NOW).shape == (4,)
+
+def test_no_items():
+    assert UrgencyScorer().score({}, NOW).size == 0
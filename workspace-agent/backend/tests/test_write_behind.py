@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+
+from memory.write_behind import WriteBehindQueue
+
+class Sink:
+    """Batch writer that records what it wrote and can fail on demand"""
+
+    def __init__(self, bad=(), outage: int = 0):
+        self.bad = set(bad)
+        self.outage = outage  # Calls that fail before the database comes back
+        self.batches = []
+        self.calls = 0
+
+    async def __call__(self, batch):
+        self.calls += 1
+        if self.calls <= self.outage or any(row["n"] in self.bad for row in batch):
+            raise RuntimeError("write failed")
+        self.batches.append([row["n"] for row in batch])
+
+    @property
+    def written(self):
+        return [n for batch in self.batches for n in batch]
+
+def test_rows_are_written_in_batches_on_close():
+    async def main():
+        sink = Sink()
+        queue = WriteBehindQueue(sink, max_size=100, batch_size=3, flush_interval=60)
+        for n in range(7):
+            await queue.put({"n": n})
+        pending = [row["n"] for row in queue.pending()]
+        await queue.close()
+        return sink, pending
+
+    sink, pending = asyncio.run(main())
+    assert sink.written == list(range(7))
+    assert all(len(batch) <= 3 for batch in sink.batches)
+    # Rows stay queued until the background task gets to run
+    assert pending == list(range(7))
+
+def test_failed_flush_keeps_rows_until_the_database_recovers():
+    async def main():
+        sink = Sink(outage=2)
+        # The interval is long enough that only explicit flushes write
+        queue = WriteBehindQueue(sink, max_size=100, batch_size=10, flush_interval=60, max_retries=5)
+        for n in range(3):
+            await queue.put({"n": n})
+        for _ in range(2):
+            with pytest.raises(RuntimeError):
+                await queue.flush()
+        kept = [row["n"] for row in queue.pending()]
+        await queue.flush()
+        await queue.close()
+        return sink, kept, queue
+
+    sink, kept, queue = asyncio.run(main())
+    assert kept == [0, 1, 2]
+    assert sink.written == [0, 1, 2]
+    assert queue.dropped == 0 and queue.pending() == []
+
+def test_only_failing_rows_are_dropped_after_max_retries():
+    async def main():
+        sink = Sink(bad={2})
+        queue = WriteBehindQueue(sink, max_size=100, batch_size=10, flush_interval=60, max_retries=3)
+        for n in range(5):
+            await queue.put({"n": n})
+        for _ in range(2):
+            with pytest.raises(RuntimeError):
+                await queue.flush()
+        await queue.flush()
+        await queue.close()
+        return sink, queue
+
+    sink, queue = asyncio.run(main())
+    assert sink.written == [0, 1, 3, 4]
+    assert queue.dropped == 1 and [row["n"] for row in queue.dead_letters] == [2]
+    assert queue.pending() == []
+
+def test_close_interrupts_the_retry_backoff():
+    async def main():
+        sink = Sink(outage=1)
+        # A full batch wakes the background task; its failure backs off for the 30s maximum
+        queue = WriteBehindQueue(sink, max_size=100, batch_size=1, flush_interval=60)
+        await queue.put({"n": 0})
+        while sink.calls == 0:
+            await asyncio.sleep(0.01)
+        await asyncio.wait_for(queue.close(), timeout=5)
+        return sink
+
+    sink = asyncio.run(main())
+    assert sink.written == [0]
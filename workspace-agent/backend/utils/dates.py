@@ -0,0 +1,53 @@
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional
+
+def to_utc_epoch(dt: datetime) -> int:
+    """Convert a datetime to UTC epoch seconds (naive datetimes are treated as UTC)"""
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp())
+
+def from_utc_epoch(epoch: Optional[int]) -> Optional[datetime]:
+    """Convert UTC epoch seconds to a naive UTC datetime (as stored in the database)"""
+    if epoch is None:
+        return None
+    return datetime.fromtimestamp(epoch, tz=timezone.utc).replace(tzinfo=None)
+
+def week_start(d: date) -> date:
+    """Monday of the week containing d"""
+    return d - timedelta(days=d.weekday())
+
+def month_start(d: date) -> date:
+    return d.replace(day=1)
+
+def month_end(d: date) -> date:
+    """Last day of the month containing d"""
+    return (month_start(d) + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+
+def parse_iso_epoch(value: str) -> Optional[int]:
+    """Parse an ISO (or "YYYY-MM-DD HH:MM") timestamp into UTC epoch seconds"""
+    if not value:
+        return None
+
+    try:
+        return to_utc_epoch(datetime.fromisoformat(value.replace('Z', '+00:00')))
+    except ValueError:
+        pass
+
+    try:
+        # Handle format like "2026-02-09 18:59"
+        return to_utc_epoch(datetime.strptime(value.split('+')[0].strip(), '%Y-%m-%d %H:%M'))
+    except ValueError:
+        return None
+
+def parse_iso_utc(value: str) -> Optional[datetime]:
+    """Parse an ISO timestamp into a naive UTC datetime, keeping sub-second precision"""
+    if not value:
+        return None
+    try:
+        dt = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt
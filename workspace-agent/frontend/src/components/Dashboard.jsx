@@ -13,14 +13,21 @@ function Dashboard() {
 
   useEffect(() => {
     fetchData()
+
+    // Refetch only when the server reports a new snapshot or report
+    const events = new EventSource(`${API_BASE}/events`)
+    const onChange = () => fetchData()
+    events.addEventListener('snapshot', onChange)
+    events.addEventListener('report', onChange)
+    events.addEventListener('resync', onChange)
+    return () => events.close()
   }, [])
   const refreshData = async () => {
     setLoading(true)
     try {
-      // Trigger fresh data collection
-      await fetch(`${API_BASE}/eod-report/generate`, { method: 'POST' })
-      // Wait for it to complete
-      setTimeout(fetchData, 2000)
+      // Trigger fresh data collection and wait for the job to complete
+      await runReportJob()
+      await fetchData()
     } catch (error) {
       console.error('Error refreshing:', error)
     } finally {
@@ -52,11 +59,22 @@ function Dashboard() {
     }
   }
 
+  // Report generation runs as a background job: start it, then poll its status
+  const runReportJob = async () => {
+    const res = await fetch(`${API_BASE}/eod-report/generate`, { method: 'POST' })
+    const { job_id } = await res.json()
+    while (true) {
+      await new Promise(resolve => setTimeout(resolve, 1000))
+      const job = await (await fetch(`${API_BASE}/jobs/${job_id}`)).json()
+      if (!['queued', 'running'].includes(job.status)) return job
+    }
+  }
+
   const triggerReport = async () => {
     setGenerating(true)
     try {
-      await fetch(`${API_BASE}/eod-report/generate`, { method: 'POST' })
-      setTimeout(fetchData, 2000)
+      await runReportJob()
+      await fetchData()
     } catch (error) {
       console.error('Error generating report:', error)
     } finally {